@@ -0,0 +1,107 @@
+# backend/analytics.py
+# 期間別・部位別のトレーニング量（/analytics/volume）
+# training_volumes（rollups.py が書き込み時に足し込む集計）だけを読み、workout_sets は読まない
+# 部位は読み取り時に exercises と結合して決めるので、種目の部位を変えても作り直しは要らない
+from datetime import date
+from typing import List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import Exercise, TrainingVolume
+from rollups import VOLUME_GRANULARITIES, period_start
+
+MUSCLE_GROUPS = ("chest", "back", "legs", "shoulders", "arms", "core")
+# /analytics/volume の by=（種目ごと / 部位ごと）
+VOLUME_GROUPINGS = ("exercise", "muscle_group")
+
+
+def check_muscle_group(value: Optional[str]) -> Optional[str]:
+    """種目の部位を正規化する（None・空文字は未設定）"""
+    if value is None or not value.strip():
+        return None
+    value = value.strip().lower()
+    if value not in MUSCLE_GROUPS:
+        raise HTTPException(
+            status_code=400, detail=f"muscle_group must be one of {', '.join(MUSCLE_GROUPS)}"
+        )
+    return value
+
+
+def volume_stmt(
+    user_id: int,
+    granularity: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    by: str = "exercise",
+):
+    """uq_training_volume の (user_id, granularity, period_start) 範囲スキャン＋種目の主キー引き"""
+    where = [TrainingVolume.user_id == user_id, TrainingVolume.granularity == granularity]
+    if date_from is not None:
+        # 期間の途中の日を渡されても、その期間を含める
+        where.append(TrainingVolume.period_start >= period_start(date_from, granularity))
+    if date_to is not None:
+        where.append(TrainingVolume.period_start <= date_to)
+
+    if by == "muscle_group":
+        return (
+            select(
+                TrainingVolume.period_start,
+                Exercise.muscle_group,
+                func.sum(TrainingVolume.set_count),
+                func.sum(TrainingVolume.reps),
+                func.sum(TrainingVolume.tonnage),
+            )
+            .join(Exercise, Exercise.id == TrainingVolume.exercise_id)
+            .where(*where)
+            .group_by(TrainingVolume.period_start, Exercise.muscle_group)
+            .order_by(TrainingVolume.period_start, Exercise.muscle_group)
+        )
+    return (
+        select(
+            TrainingVolume.period_start,
+            TrainingVolume.exercise_id,
+            Exercise.name,
+            Exercise.muscle_group,
+            TrainingVolume.set_count,
+            TrainingVolume.reps,
+            TrainingVolume.tonnage,
+        )
+        .join(Exercise, Exercise.id == TrainingVolume.exercise_id)
+        .where(*where)
+        .order_by(TrainingVolume.period_start, TrainingVolume.exercise_id)
+    )
+
+
+def volume(
+    db: Session,
+    user_id: int,
+    granularity: str,
+    date_from: Optional[date],
+    date_to: Optional[date],
+    by: str,
+) -> dict:
+    """期間の古い順。by=muscle_group のとき部位未設定の種目は muscle_group=None にまとめる"""
+    if granularity not in VOLUME_GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity must be day, week or month")
+    if by not in VOLUME_GROUPINGS:
+        raise HTTPException(status_code=400, detail="by must be exercise or muscle_group")
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise HTTPException(status_code=400, detail="from must be on or before to")
+
+    rows: List[dict] = []
+    result = db.execute(volume_stmt(user_id, granularity, date_from, date_to, by))
+    if by == "muscle_group":
+        for period, group, count, reps, tonnage in result:
+            rows.append({
+                "period": period, "muscle_group": group,
+                "set_count": count, "reps": reps, "tonnage": round(tonnage, 1),
+            })
+    else:
+        for period, ex_id, name, group, count, reps, tonnage in result:
+            rows.append({
+                "period": period, "exercise_id": ex_id, "exercise_name": name, "muscle_group": group,
+                "set_count": count, "reps": reps, "tonnage": round(tonnage, 1),
+            })
+    return {"granularity": granularity, "by": by, "rows": rows}
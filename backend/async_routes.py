@@ -0,0 +1,170 @@
+# backend/async_routes.py
+# 非同期DBモード（MUSCLE_DB_ASYNC=1）で使う、よく読まれる GET の async 版
+# main.py で同期版より先に登録するので、同じパスにはこちらが応答する
+# （クエリは series.py / pagination.py / serializers.py の文を同期版と共有する）
+from datetime import date
+from typing import List, Optional, Union
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import pagination
+import series as series_engine
+import serializers
+import versions
+from auth import get_current_user_async
+from db import get_async_db
+from models import Exercise, Friendship, User
+from schemas import FriendOut, LiftSeriesListOut, LiftSeriesOut, RecordOut, SeriesPoint, WorkoutSessionOut
+
+router = APIRouter()
+
+
+async def _etag(db: AsyncSession, *keys) -> str:
+    return versions.etag_from_rows(keys, await db.execute(versions.versions_stmt(keys)))
+
+
+@router.get("/workouts", response_model=list[WorkoutSessionOut])
+async def list_my_workouts(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    cached = versions.not_modified(request, response, await _etag(db, (versions.USER, current_user.id)))
+    if cached:
+        return cached
+    stmt, limit = serializers.workouts_page_stmt(current_user.id, cursor, limit)
+    rows = (await db.execute(stmt)).all()
+    ids = serializers.page_session_ids(rows, limit)
+    set_rows = (await db.execute(serializers.sets_stmt(ids))).all() if ids else ()
+    body, next_cursor = serializers.encode_workouts_page(rows, limit, set_rows)
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return serializers.json_response(body, response)
+
+
+@router.get("/records", response_model=List[RecordOut])
+async def list_records(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    cached = versions.not_modified(request, response, await _etag(db, (versions.USER, current_user.id)))
+    if cached:
+        return cached
+    stmt, limit = serializers.records_page_stmt(current_user.id, cursor, limit)
+    body, next_cursor = serializers.encode_records_page((await db.execute(stmt)).all(), limit)
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return serializers.json_response(body, response)
+
+
+@router.get("/lifts/series", response_model=Union[LiftSeriesOut, LiftSeriesListOut])
+async def lift_series(
+    request: Request,
+    response: Response,
+    exercise_id: Optional[int] = None,
+    exercise_ids: Optional[str] = None,
+    fmt: str = Query("json", alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    serializers.check_series_format(fmt)
+    if (exercise_id is None) == (exercise_ids is None):
+        raise HTTPException(status_code=400, detail="Specify either exercise_id or exercise_ids")
+    ids = series_engine.parse_exercise_ids(exercise_ids) if exercise_ids is not None else None
+    cached = versions.not_modified(
+        request, response,
+        await _etag(db, (versions.USER, current_user.id), versions.CATALOG_ALL),
+    )
+    if cached:
+        return cached
+    if ids is not None:
+        names = dict((await db.execute(series_engine.exercise_names_stmt(ids))).all())
+        if len(names) < len(ids):
+            raise HTTPException(status_code=404, detail="Exercise not found")
+        rows = await db.execute(series_engine.lift_series_many_stmt(current_user.id, ids))
+        return serializers.lift_series_many_response(
+            fmt, series_engine.group_lift_series(rows, ids), names, response
+        )
+    ex = await db.get(Exercise, exercise_id)
+    if not ex:
+        raise HTTPException(status_code=404, detail="Exercise not found")
+
+    rows = (await db.execute(series_engine.lift_series_stmt(current_user.id, exercise_id))).all()
+    if fmt != "json":
+        return serializers.lift_series_response(
+            fmt, {"exercise_id": exercise_id, "exercise_name": ex.name},
+            [series_engine.epoch_day(day) for day, _ in rows],
+            [round(val, 1) for _, val in rows],
+            response,
+        )
+    return LiftSeriesOut(
+        exercise_id=exercise_id,
+        exercise_name=ex.name,
+        series=[SeriesPoint(t=day, v=round(val, 1)) for day, val in rows],
+    )
+
+
+@router.get("/teams/{team_id}/series")
+async def team_series(
+    request: Request,
+    response: Response,
+    team_id: int,
+    metric: str = "level",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    fmt: str = Query("json", alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    serializers.check_series_format(fmt)
+    row = (await db.execute(series_engine.team_access_stmt(team_id, current_user.id))).first()
+    team_exists, is_member = series_engine.team_access_result(row)
+    if not team_exists:
+        raise HTTPException(status_code=404, detail="Team not found")
+    if not is_member:
+        raise HTTPException(status_code=403, detail="Not a team member")
+
+    if metric not in series_engine.TEAM_METRICS:
+        raise HTTPException(status_code=400, detail="Invalid metric")
+
+    cached = versions.not_modified(request, response, await _etag(db, (versions.TEAM, team_id)))
+    if cached:
+        return cached
+
+    builder = series_engine.TeamSeriesBuilder(columnar=fmt != "json")
+    result = await db.stream(series_engine.team_series_stmt(team_id, metric, date_from, date_to))
+    async for row in result:
+        builder.add(row)
+    if fmt != "json":
+        return serializers.grouped_series_response(
+            fmt, {"team_id": team_id, "metric": metric}, builder.series, response
+        )
+
+    return {
+        "team_id": team_id,
+        "metric": metric,
+        "series": builder.series,
+    }
+
+
+@router.get("/friends", response_model=list[FriendOut])
+async def list_friends(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
+):
+    me = current_user.id
+    rows = await db.execute(
+        select(Friendship).where(
+            or_(Friendship.user_id == me, Friendship.friend_user_id == me)
+        )
+    )
+    return rows.scalars().all()
@@ -1,16 +1,23 @@
 # backend/auth.py
+import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
-from db import get_db, init_db
+from starlette.concurrency import run_in_threadpool
+
+from db import get_async_db, get_db, init_db, write_session
 import models
 import schemas
+from hashing import HashingPool, HashingPoolSaturated
+from principal_cache import PrincipalCache
 
 # ここで DB テーブルを初期化（User テーブルが作られる）
 init_db()
@@ -28,8 +35,23 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24時間
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# ==== bcrypt 専用プール（ログイン集中時は待たせずに 503 を返す）====
+HASH_POOL_WORKERS = int(os.environ.get("HASH_POOL_WORKERS", os.cpu_count() or 2))
+HASH_POOL_MAX_QUEUE = int(os.environ.get("HASH_POOL_MAX_QUEUE", 32))
+
+hash_pool = HashingPool(workers=HASH_POOL_WORKERS, max_queue=HASH_POOL_MAX_QUEUE)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# ==== 認証済みユーザーのキャッシュ ====
+PRINCIPAL_CACHE_MAXSIZE = 10000
+PRINCIPAL_CACHE_TTL_SECONDS = 300
+
+principal_cache = PrincipalCache(
+    maxsize=PRINCIPAL_CACHE_MAXSIZE,
+    ttl_seconds=PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -43,11 +65,26 @@ def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
-    user = get_user_by_email(db, email)
+async def run_hash(fn, *args):
+    """
+    bcrypt をプールで実行する。混んでいたらすぐ 503
+    """
+    try:
+        return await hash_pool.run(fn, *args)
+    except HashingPoolSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="混み合っています。しばらくしてから再度お試しください。",
+            headers={"Retry-After": "1"},
+        )
+
+
+async def authenticate_user(db: Session, email: str, password: str) -> Optional[models.User]:
+    # async ハンドラから呼ばれるので、同期の DB アクセスはスレッドプールへ
+    user = await run_in_threadpool(get_user_by_email, db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await run_hash(verify_password, password, user.hashed_password):
         return None
     return user
 
@@ -60,40 +97,112 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-) -> models.User:
-    credentials_exception = HTTPException(
+def _principal_snapshot(user: models.User) -> models.User:
+    """
+    セッションから切り離したユーザーのコピー（キャッシュ保存用）
+    hashed_password は持たない（必要になったらその時だけ DB から読む）
+    """
+    snapshot = models.User(id=user.id, email=user.email, username=user.username)
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+def invalidate_user_principals(user_id: int) -> None:
+    """
+    ユーザー情報を更新・削除したら呼ぶ（キャッシュ済みトークンを捨てる）
+    """
+    principal_cache.invalidate_user(user_id)
+
+
+def revoke_token(token: str) -> None:
+    """トークン失効時に呼ぶ"""
+    principal_cache.invalidate_token(token)
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="認証に失敗しました。",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _verify_token(token: str) -> Tuple[int, Optional[float]]:
+    """署名を検証して (user_id, exp) を返す"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: Optional[int] = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+    return int(user_id), payload.get("exp")
+
 
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+) -> models.User:
+    # 検証済みのトークンなら、署名チェックも SELECT も省略する
+    cached = principal_cache.get(token)
+    if cached is not None:
+        # load=False なので SQL は発行されず、このリクエストのセッションに載るだけ
+        return db.merge(cached, load=False)
+
+    user_id, exp = _verify_token(token)
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+
+    principal_cache.put(token, user.id, _principal_snapshot(user), exp)
     return user
 
 
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> models.User:
+    """
+    非同期ルート用。キャッシュ済みならセッションから切り離したスナップショットをそのまま返す
+    （async 側では遅延ロードしないので、id / email / username だけ使う）
+    """
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached
+
+    user_id, exp = _verify_token(token)
+
+    user = await db.get(models.User, user_id)
+    if user is None:
+        raise _credentials_exception()
+
+    snapshot = _principal_snapshot(user)
+    principal_cache.put(token, user.id, snapshot, exp)
+    return snapshot
+
+
 # ==== エンドポイント ====
 
 
+def _insert_user(db: Session, new_user: models.User) -> bool:
+    """False: 同じメールが先に登録された（確認と insert の間に割り込まれた）"""
+    db.add(new_user)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return False
+    return True
+
+
 @router.post("/register")
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.User).filter(models.User.email == user.email).first()
-    if existing:
+async def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    # 重複確認は読み取り用セッションで。bcrypt（〜300ms）の間は単一ライターの枠を持たない
+    if await run_in_threadpool(get_user_by_email, db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_pw = get_password_hash(user.password)
+    hashed_pw = await run_hash(get_password_hash, user.password)
 
     new_user = models.User(
         email=user.email,
@@ -101,23 +210,24 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_pw,
     )
 
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    # 書き込みの枠は insert の間だけ
+    async with write_session() as write_db:
+        if not await run_in_threadpool(_insert_user, write_db, new_user):
+            raise HTTPException(status_code=400, detail="Email already registered")
 
     return {"message": "User registered successfully"}
 
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db),
 ):
     """
     ログイン（アクセストークン発行）
     """
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -147,3 +257,14 @@ def read_me(current_user: models.User = Depends(get_current_user)):
     ログイン中のユーザー情報取得
     """
     return current_user
+
+
+@router.get("/stats")
+def auth_stats(current_user: models.User = Depends(get_current_user)):
+    """
+    認証まわりの内部統計（ハッシュプールの待ち行列・レイテンシ、ユーザーキャッシュ）
+    """
+    return {
+        "hash_pool": hash_pool.stats(),
+        "principal_cache": principal_cache.stats(),
+    }
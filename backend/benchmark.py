@@ -0,0 +1,492 @@
+# backend/benchmark.py
+# プロセス内ベンチマーク（httpx の ASGITransport で main.app を直接叩く。ネットワークもサーバーも不要）
+# 全シナリオを混ぜて --concurrency 本で同時に流し、全体のスループットとシナリオごとの p50/p95/p99 を出す
+# （シナリオは同じ時間に混ざって流れるので、rps は全体の分だけ出す）
+# 流さないのは一度きりの設定操作（登録・ログイン・フレンド申請/承認・チーム作成/参加/招待コード更新・種目の編集）と /metrics
+#
+#   cd backend
+#   python seed_data.py /tmp/bench.db
+#   python benchmark.py /tmp/bench.db --out baseline.json
+#   （変更後）
+#   python benchmark.py /tmp/bench.db --compare baseline.json
+#
+#   python benchmark.py /tmp/bench.db --serializers   # 一覧の JSON 化だけを旧経路と比べる
+#
+# DB はシナリオの書き込み（--writes）で変わるので、毎回 seed_data.py --force で作り直すと比べやすい
+# MUSCLE_DB_PROFILE / MUSCLE_DB_ASYNC / MUSCLE_FEED_FANOUT もそのまま効く（結果の meta に残る）
+# httpx が要る（アプリ本体は使わないので requirements.txt には入れていない: pip install httpx）
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+# p95 がこの割合より遅くなったら --compare で回帰とみなす
+DEFAULT_THRESHOLD = 0.2
+
+
+class Context:
+    """シナリオが使う、ベンチ対象ユーザーの情報（DB から1回だけ読む）"""
+
+    def __init__(self, users: List[dict], exercises: Dict[int, str], end: date, owner: Optional[dict]):
+        self.users = users
+        self.exercise_ids = sorted(exercises)
+        self.exercise_names = [exercises[ex_id] for ex_id in self.exercise_ids]
+        self.end = end
+        self.owner = owner  # チームのオーナー（チーム書き出し用。いなければ None）
+
+
+# ==== シナリオ ====
+# 名前 -> fn(ctx, user, rng) -> (method, path, params, json_body, headers)
+# user: {"id", "headers", "team_id", "friend_id", "etag"}
+
+class Upload(NamedTuple):
+    """json_body の代わりに渡すと multipart の file として送る"""
+    filename: str
+    content: bytes
+
+
+def _get(path: str, params: Optional[dict] = None, headers: Optional[dict] = None):
+    return "GET", path, params, None, headers
+
+
+def _import_csv(ctx: Context, rng: random.Random) -> Upload:
+    """1セッション3セットの取り込み用 CSV"""
+    lines = ["performed_at,exercise_name,weight_kg,reps"]
+    for name in rng.sample(ctx.exercise_names, 3):
+        lines.append(f"{ctx.end.isoformat()}T07:00:00,\"{name}\",{rng.choice([40, 60, 80])},{rng.randint(3, 10)}")
+    return Upload("history.csv", ("\n".join(lines) + "\n").encode())
+
+
+def _team_export(ctx: Context, fmt: str):
+    return _get(f"/teams/{ctx.owner['team_id']}/export", {"format": fmt}, ctx.owner["headers"])
+
+
+READ_SCENARIOS: Dict[str, Callable] = {
+    "auth_me": lambda ctx, u, rng: _get("/auth/me"),
+    "auth_stats": lambda ctx, u, rng: _get("/auth/stats"),
+    "records": lambda ctx, u, rng: _get("/records"),
+    "workouts": lambda ctx, u, rng: _get("/workouts"),
+    "workouts_304": lambda ctx, u, rng: _get("/workouts", headers={"If-None-Match": u["etag"]}),
+    "workouts_calendar": lambda ctx, u, rng: _get(
+        "/workouts/calendar", {"year": ctx.end.year, "month": rng.randint(1, 12)},
+    ),
+    "friend_workouts": lambda ctx, u, rng: _get(f"/users/{u['friend_id']}/workouts"),
+    "lift_series": lambda ctx, u, rng: _get("/lifts/series", {"exercise_id": rng.choice(ctx.exercise_ids)}),
+    "lift_series_columnar": lambda ctx, u, rng: _get(
+        "/lifts/series", {"exercise_id": rng.choice(ctx.exercise_ids), "format": "columnar"},
+    ),
+    "lift_series_binary": lambda ctx, u, rng: _get(
+        "/lifts/series", {"exercise_id": rng.choice(ctx.exercise_ids), "format": "binary"},
+    ),
+    "lift_series_many": lambda ctx, u, rng: _get(
+        "/lifts/series", {"exercise_ids": ",".join(map(str, ctx.exercise_ids)), "format": "columnar"},
+    ),
+    "team_series": lambda ctx, u, rng: _get(f"/teams/{u['team_id']}/series", {"metric": "level"}),
+    "team_series_columnar": lambda ctx, u, rng: _get(
+        f"/teams/{u['team_id']}/series", {"metric": "level", "format": "columnar"},
+    ),
+    "team_series_binary": lambda ctx, u, rng: _get(
+        f"/teams/{u['team_id']}/series", {"metric": "level", "format": "binary"},
+    ),
+    "team_leaderboard": lambda ctx, u, rng: _get(f"/teams/{u['team_id']}/leaderboard", {"metric": "level"}),
+    "team_leaderboard_1rm": lambda ctx, u, rng: _get(
+        f"/teams/{u['team_id']}/leaderboard", {"metric": "1rm", "exercise_id": rng.choice(ctx.exercise_ids)},
+    ),
+    "training_volume": lambda ctx, u, rng: _get(
+        "/analytics/volume", {"granularity": rng.choice(["day", "week", "month"]), "by": rng.choice(["exercise", "muscle_group"])},
+    ),
+    "prs": lambda ctx, u, rng: _get("/prs"),
+    "prs_recent": lambda ctx, u, rng: _get("/prs/recent"),
+    "export_ndjson": lambda ctx, u, rng: _get("/export", {"format": "ndjson"}),
+    "export_csv": lambda ctx, u, rng: _get("/export", {"format": "csv"}),
+    "team_export": lambda ctx, u, rng: _team_export(ctx, rng.choice(["ndjson", "csv"])),
+    "my_teams": lambda ctx, u, rng: _get("/teams/my"),
+    "friends": lambda ctx, u, rng: _get("/friends"),
+    "friend_requests_inbox": lambda ctx, u, rng: _get("/friends/requests/inbox"),
+    "feed": lambda ctx, u, rng: _get("/feed"),
+    "exercises": lambda ctx, u, rng: _get("/exercises"),
+    "exercises_search": lambda ctx, u, rng: _get("/exercises/search", {"q": rng.choice(["be", "sq", "de", "レッ"])}),
+    "presets": lambda ctx, u, rng: _get("/presets"),
+    "calc_level": lambda ctx, u, rng: (
+        "POST", "/calc_level", None,
+        {"height": 175, "weight": rng.uniform(60, 90), "fat": rng.uniform(8, 25), "preset_id": "goku"}, None,
+    ),
+    "calc_level_batch": lambda ctx, u, rng: (
+        "POST", "/calc_level/batch", None,
+        {
+            "height": [175.0] * 100,
+            "weight": [rng.uniform(60, 90) for _ in range(100)],
+            "fat": [rng.uniform(8, 25) for _ in range(100)],
+            "preset_id": ["goku"] * 100,
+        }, None,
+    ),
+}
+
+WRITE_SCENARIOS: Dict[str, Callable] = {
+    "create_record": lambda ctx, u, rng: (
+        "POST", "/records", None,
+        {
+            "preset_id": "athlete", "height": 175, "weight": round(rng.uniform(60, 90), 1),
+            "fat": round(rng.uniform(8, 25), 1), "performed_at": ctx.end.isoformat(),
+        }, None,
+    ),
+    "create_workout": lambda ctx, u, rng: (
+        "POST", "/workouts", None,
+        {
+            "performed_at": f"{ctx.end.isoformat()}T18:00:00",
+            "note": "bench",
+            "sets": [
+                {"exercise_id": ex, "set_no": i, "weight_kg": 60 + i * 2.5, "reps": 5}
+                for ex in rng.sample(ctx.exercise_ids, 3) for i in range(1, 4)
+            ],
+        }, None,
+    ),
+    "create_lift": lambda ctx, u, rng: (
+        "POST", "/lifts", None,
+        {
+            "exercise_id": rng.choice(ctx.exercise_ids), "performed_at": ctx.end.isoformat(),
+            "weight_kg": rng.choice([40, 60, 80, 100]), "reps": rng.randint(1, 10),
+        }, None,
+    ),
+    "import_workouts": lambda ctx, u, rng: ("POST", "/workouts/import", None, _import_csv(ctx, rng), None),
+}
+
+
+# ==== 集計 ====
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """nearest-rank"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies: List[float], errors: int, wall: Optional[float] = None) -> dict:
+    """wall: 全体の経過時間（全体の集計だけ rps を出す）"""
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)  # noqa: E731
+    out = {"requests": len(values), "errors": errors}
+    if wall is not None:
+        out["rps"] = round(len(values) / wall, 1) if wall else 0.0
+    return {
+        **out,
+        "mean_ms": ms(sum(values) / len(values)) if values else 0.0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1]) if values else 0.0,
+    }
+
+
+# ==== 実行 ====
+
+def load_context(n_users: int, rng: random.Random) -> Context:
+    from sqlalchemy import func
+
+    import feed
+    from auth import create_access_token
+    from db import SessionLocal
+    from models import Exercise, Measurement, Team, TeamMember
+
+    db = SessionLocal()
+    try:
+        candidates = [uid for (uid,) in db.query(TeamMember.user_id).order_by(TeamMember.user_id)]
+        if not candidates:
+            sys.exit("no team members in the database (run seed_data.py first)")
+        users = []
+        for uid in rng.sample(candidates, min(n_users, len(candidates))):
+            friends = [fid for (fid,) in db.execute(feed.friend_ids_stmt(uid))]
+            if not friends:
+                continue
+            token = create_access_token({"sub": str(uid)}, timedelta(hours=6))
+            users.append({
+                "id": uid,
+                "headers": {"Authorization": f"Bearer {token}"},
+                "team_id": db.query(TeamMember.team_id).filter(TeamMember.user_id == uid).scalar(),
+                "friend_id": rng.choice(sorted(friends)),
+                "etag": "",
+            })
+        exercises = dict(db.query(Exercise.id, Exercise.name))
+        end = db.query(func.max(Measurement.performed_at)).scalar() or date.today()
+        owner = None
+        team = db.query(Team.id, Team.owner_user_id).order_by(Team.id).first()
+        if team is not None:
+            token = create_access_token({"sub": str(team.owner_user_id)}, timedelta(hours=6))
+            owner = {"team_id": team.id, "headers": {"Authorization": f"Bearer {token}"}}
+    finally:
+        db.close()
+    return Context(users, exercises, end, owner)
+
+
+async def run(args) -> dict:
+    import httpx
+
+    import main
+
+    rng = random.Random(args.seed)
+    ctx = load_context(args.users, rng)
+    scenarios = dict(READ_SCENARIOS)
+    if args.writes:
+        scenarios.update(WRITE_SCENARIOS)
+    if ctx.owner is None:
+        scenarios.pop("team_export", None)
+    if args.only:
+        scenarios = {name: fn for name, fn in scenarios.items() if name in args.only}
+
+    # アプリの例外（500）もステータスとして数え、ベンチ自体は止めない
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+
+        async def call(name: str, user: dict):
+            method, path, params, body, headers = scenarios[name](ctx, user, rng)
+            kwargs = {"files": {"file": body}} if isinstance(body, Upload) else {"json": body}
+            started = time.perf_counter()
+            resp = await client.request(
+                method, path, params=params, headers={**user["headers"], **(headers or {})}, **kwargs,
+            )
+            elapsed = time.perf_counter() - started
+            # 304 は workouts_304 の期待どおりの応答
+            return resp, elapsed, resp.status_code >= 400
+
+        # ウォームアップ: 全ユーザー × 全シナリオを --warmup 回（キャッシュを温める）
+        for _ in range(args.warmup):
+            for user in ctx.users:
+                for name in scenarios:
+                    await call(name, user)
+        # 304 用の ETag（--writes だと計測中の書き込みで変わり、一部は 200 になる）
+        for user in ctx.users:
+            resp = await client.get("/workouts", headers=user["headers"])
+            user["etag"] = resp.headers.get("etag", "")
+
+        # シナリオ × 回数 のジョブを seed で混ぜ、--concurrency 本のワーカーで取り合う
+        jobs = [(name, rng.choice(ctx.users)) for name in scenarios for _ in range(args.requests)]
+        rng.shuffle(jobs)
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        errors: Dict[str, int] = defaultdict(int)
+        statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+        async def worker():
+            while True:
+                try:
+                    name, user = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                resp, elapsed, failed = await call(name, user)
+                latencies[name].append(elapsed)
+                statuses[name][resp.status_code] += 1
+                if failed:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - started
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "db": os.path.basename(args.db),
+            "profile": os.environ.get("MUSCLE_DB_PROFILE", "default"),
+            "async": os.environ.get("MUSCLE_DB_ASYNC", "0"),
+            "feed_fanout": os.environ.get("MUSCLE_FEED_FANOUT", "0"),
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "users": len(ctx.users),
+            "seed": args.seed,
+            "writes": args.writes,
+            "wall_seconds": round(wall, 3),
+        },
+        "total": summarize(all_latencies, sum(errors.values()), wall),
+        "scenarios": {
+            name: {**summarize(latencies[name], errors[name]),
+                   "status": {str(k): v for k, v in sorted(statuses[name].items())}}
+            for name in scenarios
+        },
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def print_report(result: dict) -> None:
+    print(f"{'scenario':<22}{'req':>6}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    rows = list(result["scenarios"].items()) + [("TOTAL", result["total"])]
+    for name, s in rows:
+        print(f"{name:<22}{s['requests']:>6}{s['errors']:>5}{s.get('rps', ''):>9}"
+              f"{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}")
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> List[str]:
+    """p50/p95/p99 を比べて表示し、p95 が threshold を超えて遅くなったシナリオ名を返す"""
+    regressions = []
+    print(f"\n{'vs baseline':<22}{'p50':>9}{'p95':>9}{'p99':>9}  (baseline {baseline['meta'].get('git_commit')})")
+    for name, s in list(result["scenarios"].items()) + [("TOTAL", result["total"])]:
+        base = baseline["total"] if name == "TOTAL" else baseline["scenarios"].get(name)
+        if base is None:
+            print(f"{name:<22}{'(new)':>9}")
+            continue
+        ratios = [s[k] / base[k] if base[k] else 1.0 for k in ("p50_ms", "p95_ms", "p99_ms")]
+        flag = ""
+        if ratios[1] > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<22}" + "".join(f"{r - 1:>+9.0%}" for r in ratios) + flag)
+    return regressions
+
+
+# ==== 一覧の JSON 化: 旧経路（ORM + response_model）と serializers.py の比較 ====
+
+def _orm_page(db, path: str, user_id: int, cursor: Optional[str], limit: int):
+    """serializers.py を入れる前の経路: ORM オブジェクト → 検証 → dump_json（FastAPI と同じ）"""
+    from datetime import datetime
+
+    from pydantic import TypeAdapter
+    from sqlalchemy.orm import selectinload
+
+    import pagination
+    from models import Measurement, WorkoutSession
+    from schemas import RecordOut, WorkoutSessionOut
+
+    if path == "records":
+        rows, next_cursor = pagination.keyset_page(
+            db.query(Measurement).filter(Measurement.user_id == user_id),
+            Measurement.performed_at, Measurement.id,
+            cursor, limit, date.fromisoformat, descending=False,
+        )
+        adapter = TypeAdapter(List[RecordOut])
+    else:
+        rows, next_cursor = pagination.keyset_page(
+            db.query(WorkoutSession)
+            .options(selectinload(WorkoutSession.sets))
+            .filter(WorkoutSession.user_id == user_id),
+            WorkoutSession.performed_at, WorkoutSession.id,
+            cursor, limit, datetime.fromisoformat,
+        )
+        adapter = TypeAdapter(List[WorkoutSessionOut])
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True)), next_cursor
+
+
+def _fast_page(db, path: str, user_id: int, cursor: Optional[str], limit: int):
+    import serializers
+
+    page = serializers.records_page if path == "records" else serializers.workouts_page
+    body, next_cursor = page(db, user_id, cursor, limit)
+    return body.encode(), next_cursor
+
+
+def compare_serializers(args) -> bool:
+    """
+    各ユーザーの全ページを両方の経路で作り、バイト列が同じことを確かめてから
+    --requests 回ずつ交互に流して 1ページあたりの時間を比べる（DB・HTTP の外側は同じなので除く）
+    戻り値: 全部一致したか
+    """
+    from db import SessionLocal
+
+    rng = random.Random(args.seed)
+    ctx = load_context(args.users, rng)
+    db = SessionLocal()
+    ok = True
+    print(f"{'endpoint':<14}{'limit':>6}{'pages':>7}{'orm ms':>9}{'fast ms':>9}{'speedup':>9}  bytes")
+    try:
+        for path in ("workouts", "records"):
+            for limit in (50, 200):
+                # 全ページの一致確認（カーソルも同じであること）
+                pages, same = [], True
+                for u in ctx.users:
+                    cursor = None
+                    while True:
+                        old, old_next = _orm_page(db, path, u["id"], cursor, limit)
+                        new, new_next = _fast_page(db, path, u["id"], cursor, limit)
+                        if old != new or old_next != new_next:
+                            same = ok = False
+                            print(f"MISMATCH {path} user={u['id']} cursor={cursor}")
+                        pages.append((u["id"], cursor))
+                        if not old_next:
+                            break
+                        cursor = old_next
+
+                timings = {_orm_page: [], _fast_page: []}
+                for _ in range(args.requests):
+                    uid, cursor = rng.choice(pages)
+                    for fn in rng.sample(list(timings), 2):
+                        started = time.perf_counter()
+                        fn(db, path, uid, cursor, limit)
+                        timings[fn].append(time.perf_counter() - started)
+                orm_ms, fast_ms = (
+                    percentile(sorted(timings[fn]), 50) * 1000 for fn in (_orm_page, _fast_page)
+                )
+                print(f"{'/' + path:<14}{limit:>6}{len(pages):>7}{orm_ms:>9.2f}{fast_ms:>9.2f}"
+                      f"{orm_ms / fast_ms:>8.1f}x  {'identical' if same else 'DIFFERENT'}")
+    finally:
+        db.close()
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="プロセス内ベンチマーク")
+    parser.add_argument("db", help="seed_data.py で作った SQLite ファイル")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="シナリオごとのリクエスト数")
+    parser.add_argument("--users", type=int, default=20, help="リクエストを投げるユーザー数")
+    parser.add_argument("--warmup", type=int, default=1, help="計測前に全シナリオを流す回数")
+    parser.add_argument("--writes", action="store_true", help="書き込みシナリオも混ぜる（DB が変わる）")
+    parser.add_argument("--only", nargs="*", help="このシナリオだけ流す")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="結果の JSON の書き出し先（次回の --compare に使う）")
+    parser.add_argument("--compare", help="比べる基準の JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--serializers", action="store_true",
+        help="HTTP は流さず、一覧の JSON 化を旧経路と比べる（出力が1バイトでも違えば終了コード 1）",
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"{args.db} not found (run seed_data.py first)")
+    # db / main は import 時に MUSCLE_DB_PATH を読む
+    os.environ["MUSCLE_DB_PATH"] = os.path.abspath(args.db)
+
+    if args.serializers:
+        sys.exit(0 if compare_serializers(args) else 1)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nwrote {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
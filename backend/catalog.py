@@ -0,0 +1,121 @@
+# backend/catalog.py
+# 種目カタログ（exercises 全件）のプロセス内キャッシュ
+# - 名前を正規化（全角半角・大文字小文字・空白のゆれを吸収）して重複登録を防ぐ
+# - 正規化した名前の前方一致トライで /exercises/search の候補を返す
+# カタログの版番号（versions.CATALOG_ALL）が変わったら作り直す（他プロセスの追加も拾える）
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import versions
+from models import Exercise
+
+# トライの各ノードに持っておく候補の上限（検索はここから limit 件を返す）
+NODE_CAP = 50
+SEARCH_LIMIT = 10
+
+
+def normalize_name(name: str) -> str:
+    """
+    NFKC（全角英数→半角、半角カナ→全角）→ casefold → 連続する空白を1つに
+    例: " Ｂｅｎｃｈ　 Press " → "bench press"
+    """
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+class _Node:
+    __slots__ = ("children", "items")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        # (語の途中から一致か, 名前の長さ, id, エントリ)。小さいほど上位
+        self.items: list = []
+
+
+class ExerciseCatalog:
+    """ある版の exercises 全件から作る読み取り専用の索引"""
+
+    def __init__(self, rows: List[Exercise], version: int):
+        self.version = version
+        self.entries = [
+            {"id": ex.id, "name": ex.name, "created_by": ex.created_by, "muscle_group": ex.muscle_group}
+            for ex in sorted(rows, key=lambda ex: ex.id)
+        ]
+        # 正規化名 → 代表のエントリ（既存の重複は id が一番小さいもの）
+        self.by_key: Dict[str, dict] = {}
+        self._root = _Node()
+
+        for entry in self.entries:
+            key = normalize_name(entry["name"])
+            if not key or key in self.by_key:
+                continue
+            self.by_key[key] = entry
+            # 名前の先頭と、各単語の先頭から引けるようにする（"press" → "bench press"）
+            starts = [0] + [i + 1 for i, ch in enumerate(key) if ch == " "]
+            for start in starts:
+                self._insert(key[start:], (start > 0, len(key), entry["id"], entry))
+
+        self._trim(self._root)
+
+    def _insert(self, text: str, item: tuple) -> None:
+        node = self._root
+        for ch in text:
+            node = node.children.setdefault(ch, _Node())
+            node.items.append(item)
+
+    def _trim(self, node: _Node) -> None:
+        node.items.sort(key=lambda item: item[:3])
+        del node.items[NODE_CAP:]
+        for child in node.children.values():
+            self._trim(child)
+
+    def find(self, name: str) -> Optional[dict]:
+        """表記ゆれを吸収して同じ種目を探す"""
+        return self.by_key.get(normalize_name(name))
+
+    def search(self, q: str, limit: int = SEARCH_LIMIT) -> List[dict]:
+        node = self._root
+        for ch in normalize_name(q):
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        if node is self._root:
+            return []
+
+        results, seen = [], set()
+        exact = self.find(q)
+        if exact is not None:
+            results.append(exact)
+            seen.add(exact["id"])
+        for _, _, ex_id, entry in node.items:
+            if len(results) >= limit:
+                break
+            if ex_id not in seen:
+                results.append(entry)
+                seen.add(ex_id)
+        return results
+
+
+class CatalogCache:
+    def __init__(self):
+        self._catalog: Optional[ExerciseCatalog] = None
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> ExerciseCatalog:
+        """版番号を1行読み、変わっていれば exercises を読み直して作り直す"""
+        version = versions.current(db, versions.CATALOG_ALL)
+        catalog = self._catalog
+        if catalog is not None and catalog.version == version:
+            return catalog
+        with self._lock:
+            if self._catalog is None or self._catalog.version != version:
+                self._catalog = ExerciseCatalog(db.query(Exercise).all(), version)
+            return self._catalog
+
+    def invalidate(self) -> None:
+        self._catalog = None
+
+
+catalog_cache = CatalogCache()
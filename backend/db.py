@@ -1,33 +1,221 @@
 # backend/db.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
-from typing import Generator
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncGenerator, Generator
+import asyncio
 import os
 
-# プロジェクト直下の muscle_app.db を使う
+from anyio import from_thread
+
+# プロジェクト直下の muscle_app.db を使う（MUSCLE_DB_PATH で差し替え可）
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_PATH = os.path.join(BASE_DIR, "muscle_app.db")
+DB_PATH = os.environ.get("MUSCLE_DB_PATH", os.path.join(BASE_DIR, "muscle_app.db"))
 
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-)
+# ==== ストレージプロファイル（MUSCLE_DB_PROFILE で選択）====
+# default    : 従来どおりの素の SQLite（読み書き同じエンジン）
+# production : WAL + pragma 調整。書き込みは1本の接続に直列化し、読み取りは別プール
+STORAGE_PROFILES = {
+    "default": {
+        "pragmas": {},
+        "busy_timeout_ms": 5000,
+        "split_read_write": False,
+    },
+    "production": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            # WAL なら NORMAL でもクラッシュで壊れない（commit ごとの fsync を省ける）
+            "synchronous": "NORMAL",
+            "cache_size": -64000,        # 約64MB（負数は KiB 指定）
+            "mmap_size": 268435456,      # 256MB
+            "temp_store": "MEMORY",
+            "wal_autocheckpoint": 1000,
+        },
+        "busy_timeout_ms": 10000,
+        "read_pool_size": 16,
+        "split_read_write": True,
+    },
+}
+
+DB_PROFILE = os.environ.get("MUSCLE_DB_PROFILE", "default")
+if DB_PROFILE not in STORAGE_PROFILES:
+    raise RuntimeError(f"Unknown MUSCLE_DB_PROFILE: {DB_PROFILE}")
+PROFILE = STORAGE_PROFILES[DB_PROFILE]
+
+
+def _apply_profile(engine, pragmas: dict, begin_sql: str) -> None:
+    """
+    接続ごとに pragma を流し、トランザクション開始を自前で発行する
+    （pysqlite の暗黙 BEGIN だと BEGIN IMMEDIATE が使えないため）
+    """
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        dbapi_conn.isolation_level = None
+        cur = dbapi_conn.cursor()
+        for key, value in pragmas.items():
+            cur.execute(f"PRAGMA {key}={value}")
+        cur.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql(begin_sql)
+
+
+def _connect_args() -> dict:
+    return {
+        "check_same_thread": False,
+        "timeout": PROFILE["busy_timeout_ms"] / 1000,
+    }
+
+
+if PROFILE["split_read_write"]:
+    # 書き込み: 接続1本だけのプール。commit は1本ずつ直列に流れる
+    # （SQLite のロック競合で database is locked にならない）
+    write_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args=_connect_args(),
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=PROFILE["busy_timeout_ms"] / 1000,
+    )
+    _apply_profile(write_engine, PROFILE["pragmas"], "BEGIN IMMEDIATE")
+
+    # 読み取り: WAL なので書き込み中でもブロックされない
+    # 上限を設けない（接続待ちのスレッドがレスポンス生成用のスレッドを塞いで詰まるため）
+    read_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args=_connect_args(),
+        pool_size=PROFILE["read_pool_size"],
+        max_overflow=-1,
+    )
+    _apply_profile(read_engine, {**PROFILE["pragmas"], "query_only": "ON"}, "BEGIN")
+else:
+    write_engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args=_connect_args(),
+        max_overflow=-1,
+    )
+    read_engine = write_engine
+
+# 単一ライターの待ち行列。スレッドを使わずイベントループ上で順番待ちさせる
+_writer_slot = asyncio.Semaphore(1) if PROFILE["split_read_write"] else None
+# 順番待ち中のリクエスト数（/metrics 用）
+writer_waiting = 0
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = write_engine
+
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+WriteSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=write_engine)
+
+# スクリプト等から使う汎用セッション（書き込み可）
+SessionLocal = WriteSessionLocal
+
+# ==== 非同期エンジン（MUSCLE_DB_ASYNC=1 で有効、読み取り専用）====
+# よく読まれる一覧系を async ルートで返し、待ち時間中にスレッドを占有しない
+ASYNC_ENABLED = os.environ.get("MUSCLE_DB_ASYNC", "0") == "1"
+
+if ASYNC_ENABLED:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{DB_PATH}",
+        connect_args={"timeout": PROFILE["busy_timeout_ms"] / 1000},
+    )
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _on_async_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for key, value in {**PROFILE["pragmas"], "query_only": "ON"}.items():
+            cur.execute(f"PRAGMA {key}={value}")
+        cur.close()
+
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+else:
+    async_engine = None
+    AsyncSessionLocal = None
 
 Base = declarative_base()
 
 
-def get_db() -> Generator:
-    db = SessionLocal()
+# 後始末（close で接続をプールへ返す）はスレッドを使わずイベントループ上で行う
+
+async def get_db() -> AsyncGenerator:
+    """読み取り用セッション"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def write_session() -> AsyncGenerator:
+    """
+    書き込み用セッション（production では単一ライターの順番待ちを通る）
+    重い前処理（bcrypt 等）のあとで書くところだけ枠を取りたいときに直接使う
+    """
+    if _writer_slot is not None:
+        await _acquire_writer_slot()
+    db = WriteSessionLocal()
     try:
         yield db
     finally:
         db.close()
+        if _writer_slot is not None:
+            _writer_slot.release()
+
+
+@contextmanager
+def write_session_blocking() -> Generator:
+    """
+    write_session の同期版（スレッドプールで動く def のエンドポイントから使う）
+    取り込みのように長い処理で、チャンクを書く間だけ枠を取りたいとき用
+    枠はイベントループ上のセマフォなので anyio.from_thread 経由で取る・返す
+    """
+    if _writer_slot is not None:
+        from_thread.run(_acquire_writer_slot)
+    db = WriteSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        if _writer_slot is not None:
+            from_thread.run_sync(_writer_slot.release)
+
+
+async def _acquire_writer_slot() -> None:
+    global writer_waiting
+    writer_waiting += 1
+    try:
+        await _writer_slot.acquire()
+    finally:
+        writer_waiting -= 1
+
+
+async def get_write_db() -> AsyncGenerator:
+    """書き込み用セッション（リクエストの間ずっと単一ライターの枠を持つ）"""
+    async with write_session() as db:
+        yield db
+
+
+def writer_queue_depth() -> int:
+    return writer_waiting
+
+
+async def get_async_db() -> AsyncGenerator:
+    """非同期の読み取り用セッション（MUSCLE_DB_ASYNC=1 のときだけ使える）"""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("async database path is disabled (set MUSCLE_DB_ASYNC=1)")
+    async with AsyncSessionLocal() as db:
+        yield db
 
 
 def init_db() -> None:
     import models  # noqa: F401
-    Base.metadata.create_all(bind=engine)
+    from migrations import run_migrations
+
+    Base.metadata.create_all(bind=write_engine)
+    # 既存DBに後から足した列・索引
+    run_migrations(write_engine)
@@ -0,0 +1,209 @@
+# backend/export.py
+# 全履歴のエクスポート（体型記録・ワークアウト+セット・リフト記録）
+# StreamingResponse で少しずつ書き出し、DB からもキーセットで EXPORT_CHUNK 行ずつ読むので、
+# 何年分あってもメモリに載るのは数千行分だけ
+# 読み取りトランザクションはチャンクごとに閉じる（既定のロールバックジャーナルでは、開いている間
+# ずっと書き込みを止めてしまう。遅いクライアントのダウンロード中も書き込みは待たされない）
+# そのため1つのスナップショットではない: 書き出し中に追加された行は入ることも入らないこともある
+import csv
+import io
+import json
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from db import ReadSessionLocal, read_engine
+from models import Exercise, LiftLog, Measurement, TeamMember, WorkoutSession, WorkoutSet
+
+# DB から一度に取ってくる行数
+EXPORT_CHUNK = 1000
+# この程度たまったらクライアントへ書き出す
+FLUSH_BYTES = 64 * 1024
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# CSV は全種類を1つの表にする（type 列で区別し、関係ない列は空）
+# type=workout_set の行はそのまま importer.py で取り込める
+CSV_COLUMNS = [
+    "type", "user_id", "id", "performed_at",
+    "preset_id", "height", "weight", "fat", "level", "bmi",
+    "session_id", "note", "set_no", "exercise_id", "exercise_name", "weight_kg", "reps",
+    "created_at",
+]
+
+
+def team_member_ids_stmt(team_id: int):
+    return select(TeamMember.user_id).where(TeamMember.team_id == team_id)
+
+
+def _read(db: Session, stmt) -> list:
+    """1回分を読み切って、すぐ読み取りトランザクションを閉じる（SHARED ロックを持ったまま返さない）"""
+    try:
+        return db.execute(stmt).all()
+    finally:
+        db.rollback()
+
+
+def _chunks(db: Session, stmt, time_col, id_col, key: Callable) -> Iterator[list]:
+    """
+    stmt を (time_col, id_col) 順に EXPORT_CHUNK 行ずつ（pagination.py と同じキーセット）
+    key: 行 → (time, id)
+    """
+    last = None
+    while True:
+        page = stmt
+        if last is not None:
+            t, rid = last
+            # time_col >= t は索引の範囲を絞るため（or_ だけだとユーザーの先頭から読み直す）
+            page = page.where(time_col >= t, or_(time_col > t, and_(time_col == t, id_col > rid)))
+        rows = _read(db, page.order_by(time_col, id_col).limit(EXPORT_CHUNK))
+        if rows:
+            yield rows
+        if len(rows) < EXPORT_CHUNK:
+            return
+        last = key(rows[-1])
+
+
+def _member_ids(db: Session, user_ids) -> List[int]:
+    if isinstance(user_ids, (list, tuple, set)):
+        return sorted(user_ids)
+    return sorted(uid for (uid,) in _read(db, user_ids))
+
+
+def _rows(db: Session, user_ids) -> Iterator[dict]:
+    """エクスポートする行を種類ごとに順に流す（ユーザー → 日付順）"""
+    # ユーザーごとに (user_id, performed_at) 索引を等価条件＋範囲で読む
+    user_ids = _member_ids(db, user_ids)
+
+    for uid in user_ids:
+        for chunk in _chunks(db, (
+            select(
+                Measurement.user_id, Measurement.id, Measurement.performed_at,
+                Measurement.preset_id, Measurement.height, Measurement.weight,
+                Measurement.fat, Measurement.level, Measurement.bmi, Measurement.created_at,
+            ).where(Measurement.user_id == uid)
+        ), Measurement.performed_at, Measurement.id, lambda m: (m.performed_at, m.id)):
+            for m in chunk:
+                yield {"type": "measurement", **m._asdict()}
+
+    # セッションをキーセットで区切り、そのチャンクのセッションのセットをまとめて読む
+    # セッションごとにセットが連続して並ぶ（セットの無いセッションも1行出る）
+    for uid in user_ids:
+        for sessions in _chunks(db, (
+            select(WorkoutSession.performed_at, WorkoutSession.id).where(WorkoutSession.user_id == uid)
+        ), WorkoutSession.performed_at, WorkoutSession.id, tuple):
+            for w in _read(db, (
+                select(
+                    WorkoutSession.user_id, WorkoutSession.id.label("session_id"),
+                    WorkoutSession.performed_at, WorkoutSession.note,
+                    WorkoutSet.set_no, WorkoutSet.exercise_id, Exercise.name.label("exercise_name"),
+                    WorkoutSet.weight_kg, WorkoutSet.reps,
+                )
+                .outerjoin(WorkoutSet, WorkoutSet.session_id == WorkoutSession.id)
+                .outerjoin(Exercise, Exercise.id == WorkoutSet.exercise_id)
+                .where(WorkoutSession.id.in_([session_id for _, session_id in sessions]))
+                .order_by(WorkoutSession.performed_at, WorkoutSession.id, WorkoutSet.set_no)
+            )):
+                yield {"type": "workout_set", **w._asdict()}
+
+    for uid in user_ids:
+        for chunk in _chunks(db, (
+            select(
+                LiftLog.user_id, LiftLog.id, LiftLog.performed_at,
+                LiftLog.exercise_id, Exercise.name.label("exercise_name"),
+                LiftLog.weight_kg, LiftLog.reps, LiftLog.created_at,
+            )
+            .join(Exercise, Exercise.id == LiftLog.exercise_id)
+            .where(LiftLog.user_id == uid)
+        ), LiftLog.performed_at, LiftLog.id, lambda lift: (lift.performed_at, lift.id)):
+            for lift in chunk:
+                yield {"type": "lift", **lift._asdict()}
+
+
+def _json_default(value):
+    # date / datetime
+    return value.isoformat()
+
+
+def _ndjson_lines(rows: Iterable[dict]) -> Iterator[str]:
+    """workout_set の行はセッション単位にまとめ、sets を入れ子にして1行で出す"""
+    session: Optional[dict] = None
+    for row in rows:
+        if row["type"] != "workout_set":
+            if session is not None:
+                yield json.dumps(session, ensure_ascii=False, default=_json_default) + "\n"
+                session = None
+            yield json.dumps(row, ensure_ascii=False, default=_json_default) + "\n"
+            continue
+
+        if session is None or session["id"] != row["session_id"]:
+            if session is not None:
+                yield json.dumps(session, ensure_ascii=False, default=_json_default) + "\n"
+            session = {
+                "type": "workout",
+                "user_id": row["user_id"],
+                "id": row["session_id"],
+                "performed_at": row["performed_at"],
+                "note": row["note"],
+                "sets": [],
+            }
+        if row["set_no"] is not None:
+            session["sets"].append({
+                key: row[key]
+                for key in ("set_no", "exercise_id", "exercise_name", "weight_kg", "reps")
+            })
+    if session is not None:
+        yield json.dumps(session, ensure_ascii=False, default=_json_default) + "\n"
+
+
+def _csv_lines(rows: Iterable[dict]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            key: value.isoformat() if hasattr(value, "isoformat") else value
+            for key, value in row.items()
+        })
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+
+def _generate(user_ids, fmt: str) -> Iterator[bytes]:
+    # リクエストのセッションはレスポンス送信前に閉じられることがあるので、自前で開く
+    # 接続は最後まで持ったまま、トランザクションだけチャンクごとに閉じる（_read）
+    # （チャンクごとにプールへ返すと、混んでいるときに毎回接続待ちの列に並ぶことになる）
+    conn = read_engine.connect()
+    db = ReadSessionLocal(bind=conn)
+    try:
+        lines = _ndjson_lines(_rows(db, user_ids)) if fmt == "ndjson" else _csv_lines(_rows(db, user_ids))
+        pending, size = [], 0
+        for line in lines:
+            pending.append(line)
+            size += len(line)
+            if size >= FLUSH_BYTES:
+                yield "".join(pending).encode()
+                pending, size = [], 0
+        if pending:
+            yield "".join(pending).encode()
+    finally:
+        db.close()
+        conn.close()
+
+
+def export_response(user_ids, fmt: str, filename: str) -> StreamingResponse:
+    """user_ids: ユーザー id のリスト、または team_member_ids_stmt などの select 文"""
+    if fmt not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    return StreamingResponse(
+        _generate(user_ids, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
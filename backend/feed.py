@@ -0,0 +1,270 @@
+# backend/feed.py
+# フレンドのアクティビティ（ワークアウト・体型記録）を新しい順に1本にしたフィード
+#
+# 通常: フレンドごとに (user_id, performed_at) 索引をカーソルから後ろへ最大 ページ件数 だけ読み、
+#       それを (at, kind, id) の降順にマージする（1ページで読むのは フレンド数×2×ページ件数 行まで。
+#       過去の履歴がどれだけ長くても増えない）
+# MUSCLE_FEED_FANOUT=1: 書き込み時に各フレンドの feed_entries へ配っておき、
+#       読み取りは自分の行を索引順に読むだけにする（フレンドが多いユーザー向け）
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import String, case, delete, func, literal, or_, select, true, tuple_, type_coerce, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased, selectinload
+
+import pagination
+from models import FeedEntry, Friendship, Measurement, User, WorkoutSession
+
+KIND_WORKOUT = "workout"
+KIND_RECORD = "record"
+_MODELS = {KIND_WORKOUT: WorkoutSession, KIND_RECORD: Measurement}
+
+FANOUT_ENABLED = os.environ.get("MUSCLE_FEED_FANOUT", "0") == "1"
+# 友達になったとき、相手のタイムラインへ遡って配る件数
+FANOUT_BACKFILL = 200
+
+_ENTRY_COLUMNS = ["owner_user_id", "actor_user_id", "kind", "item_id", "at"]
+
+
+def friend_ids_stmt(user_id: int):
+    """user_id のフレンドの id 一覧（Friendship は正規化した1行なので両方向を見る）"""
+    return select(
+        case(
+            (Friendship.user_id == user_id, Friendship.friend_user_id),
+            else_=Friendship.user_id,
+        ).label("friend_id")
+    ).where(or_(Friendship.user_id == user_id, Friendship.friend_user_id == user_id))
+
+
+def _events(kind: str, user_ids, after: Optional[tuple]):
+    model = _MODELS[kind]
+    # Date と DateTime を同じ並びで比べるため、DB に入っている文字列のまま扱う
+    at = type_coerce(model.performed_at, String)
+    stmt = select(
+        literal(kind).label("kind"),
+        model.id.label("id"),
+        model.user_id.label("user_id"),
+        at.label("at"),
+    )
+    if user_ids is not None:
+        stmt = stmt.where(model.user_id.in_(user_ids))
+    if after is not None:
+        stmt = stmt.where(tuple_(at, literal(kind), model.id) < tuple_(*after))
+    return stmt
+
+
+def _recent_events(kind: str, friends, after: Optional[tuple], per_friend: int):
+    """
+    friends（friend_id 列の副問い合わせ）の各人について、after より古い最新 per_friend 件
+    相関副問い合わせの LIMIT で、フレンドごとに索引を範囲で読んで止める
+    """
+    model = _MODELS[kind]
+    recent = aliased(model)
+    recent_at = type_coerce(recent.performed_at, String)
+    ids = select(recent.id).where(recent.user_id == friends.c.friend_id)
+    if after is not None:
+        # at <= の単純な条件で索引の範囲を絞り、同じ at の中の (kind, id) は行値比較で
+        ids = ids.where(
+            recent_at <= after[0],
+            tuple_(recent_at, literal(kind), recent.id) < tuple_(*after),
+        )
+    # 1種類の中では (at, id) の降順 = 全体の (at, kind, id) の降順
+    ids = ids.order_by(recent.performed_at.desc(), recent.id.desc()).limit(per_friend)
+
+    at = type_coerce(model.performed_at, String)
+    return select(
+        literal(kind).label("kind"),
+        model.id.label("id"),
+        model.user_id.label("user_id"),
+        at.label("at"),
+    ).join_from(friends, model, model.id.in_(ids))
+
+
+def friend_events_stmt(user_id: int, after: Optional[tuple], limit: int):
+    """
+    フィード1ページ分（(at, kind, id) の降順に limit 件）
+    どのフレンド・種類もページに入るのは最新 limit 件までなので、それだけを読んでマージする
+    """
+    friends = friend_ids_stmt(user_id).subquery()
+    events = union_all(*(
+        _recent_events(kind, friends, after, limit) for kind in (KIND_WORKOUT, KIND_RECORD)
+    )).subquery()
+    return (
+        select(events.c.kind, events.c.id, events.c.user_id, events.c.at)
+        .order_by(events.c.at.desc(), events.c.kind.desc(), events.c.id.desc())
+        .limit(limit)
+    )
+
+
+def events_stmt(user_ids=None, after: Optional[tuple] = None, limit: Optional[int] = None):
+    """
+    user_ids（リスト or select 文。None なら全員）のイベントを (at, kind, id) の降順で
+    after: 前ページ最後の (at, kind, id)
+    （全履歴を並べ直すので fan-out の配布・作り直し用。フィードのページは friend_events_stmt）
+    """
+    events = union_all(
+        _events(KIND_WORKOUT, user_ids, after),
+        _events(KIND_RECORD, user_ids, after),
+    ).subquery()
+    stmt = select(events.c.kind, events.c.id, events.c.user_id, events.c.at).order_by(
+        events.c.at.desc(), events.c.kind.desc(), events.c.id.desc()
+    )
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+def timeline_stmt(user_id: int, after: Optional[tuple] = None, limit: Optional[int] = None):
+    """fan-out 済みの自分のタイムライン（events_stmt と同じ列・同じ並び）"""
+    stmt = select(
+        FeedEntry.kind,
+        FeedEntry.item_id.label("id"),
+        FeedEntry.actor_user_id.label("user_id"),
+        FeedEntry.at,
+    ).where(FeedEntry.owner_user_id == user_id)
+    if after is not None:
+        stmt = stmt.where(tuple_(FeedEntry.at, FeedEntry.kind, FeedEntry.item_id) < tuple_(*after))
+    stmt = stmt.order_by(FeedEntry.at.desc(), FeedEntry.kind.desc(), FeedEntry.item_id.desc())
+    return stmt.limit(limit) if limit is not None else stmt
+
+
+def _decode_cursor(cursor: str) -> tuple:
+    at, kind, item_id = pagination.decode_key(cursor, 3)
+    if kind not in _MODELS or not item_id.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return at, kind, int(item_id)
+
+
+def _hydrate(db: Session, rows: list) -> List[dict]:
+    """(kind, id, user_id, at) の行に本体（セッション+セット / 記録）とユーザー名を付ける"""
+    ids = {KIND_WORKOUT: [], KIND_RECORD: []}
+    for row in rows:
+        ids[row.kind].append(row.id)
+
+    sessions = {}
+    if ids[KIND_WORKOUT]:
+        sessions = {
+            s.id: s for s in
+            db.query(WorkoutSession)
+            .options(selectinload(WorkoutSession.sets))
+            .filter(WorkoutSession.id.in_(ids[KIND_WORKOUT]))
+        }
+    records = {}
+    if ids[KIND_RECORD]:
+        records = {
+            m.id: m for m in
+            db.query(Measurement).filter(Measurement.id.in_(ids[KIND_RECORD]))
+        }
+    names = dict(
+        db.query(User.id, User.username).filter(User.id.in_({row.user_id for row in rows}))
+    )
+
+    items = []
+    for row in rows:
+        body = (sessions if row.kind == KIND_WORKOUT else records).get(row.id)
+        if body is None:
+            continue  # fan-out 後に消えた行
+        items.append({
+            "kind": row.kind,
+            "id": row.id,
+            "user_id": row.user_id,
+            "username": names.get(row.user_id, ""),
+            "at": datetime.fromisoformat(row.at),
+            row.kind: body,
+        })
+    return items
+
+
+def feed_page(
+    db: Session,
+    user_id: int,
+    cursor: Optional[str],
+    limit: Optional[int],
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    フレンドのイベントを新しい順に1ページ分
+    戻り値: (イベントのリスト, 次ページのカーソル or None)
+    """
+    limit = pagination.clamp_limit(limit)
+    after = _decode_cursor(cursor) if cursor else None
+
+    if FANOUT_ENABLED:
+        stmt = timeline_stmt(user_id, after, limit + 1)
+    else:
+        stmt = friend_events_stmt(user_id, after, limit + 1)
+    rows = db.execute(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = pagination.encode_key(last.at, last.kind, last.id)
+    return _hydrate(db, rows), next_cursor
+
+
+# ==== fan-out-on-write（commit は呼び出し側。元の書き込みと同じトランザクション）====
+
+def _insert_entries(db: Session, select_stmt) -> None:
+    # INSERT ... SELECT に ON CONFLICT を付けるとき、SQLite は SELECT 側に WHERE が要る
+    # （JOIN の ON と構文上紛らわしいため）
+    db.execute(
+        sqlite_insert(FeedEntry)
+        .from_select(_ENTRY_COLUMNS, select_stmt)
+        .on_conflict_do_nothing(index_elements=["owner_user_id", "kind", "item_id"])
+    )
+
+
+def fan_out(db: Session, actor_user_id: int, kind: str, item_id: int) -> None:
+    """actor の新しいイベントを、フレンド全員のタイムラインへ1行ずつ配る"""
+    fan_out_many(db, actor_user_id, kind, [item_id])
+
+
+def fan_out_many(db: Session, actor_user_id: int, kind: str, item_ids: List[int]) -> None:
+    """まとめて書いたイベント（一括インポート等）を1本の INSERT ... SELECT で配る"""
+    if not FANOUT_ENABLED or not item_ids:
+        return
+    model = _MODELS[kind]
+    friends = friend_ids_stmt(actor_user_id).subquery()
+    _insert_entries(db, (
+        select(
+            friends.c.friend_id,
+            model.user_id,
+            literal(kind),
+            model.id,
+            type_coerce(model.performed_at, String),
+        )
+        .join_from(friends, model, model.id.in_(item_ids))
+        .where(true())
+    ))
+
+
+def fan_out_friendship(db: Session, a: int, b: int) -> None:
+    """友達になった2人の最近のイベントを、お互いのタイムラインへ配る"""
+    if not FANOUT_ENABLED:
+        return
+    for owner, actor in ((a, b), (b, a)):
+        events = events_stmt([actor], limit=FANOUT_BACKFILL).subquery()
+        _insert_entries(db, select(
+            literal(owner), events.c.user_id, events.c.kind, events.c.id, events.c.at,
+        ).where(true()))
+
+
+def rebuild_feed_entries(db: Session) -> int:
+    """feed_entries を全フレンド・全履歴から作り直す（fan-out 無効なら何もしない）"""
+    if not FANOUT_ENABLED:
+        return 0
+    db.execute(delete(FeedEntry))
+
+    # 正規化された Friendship を (owner, フレンド) の両方向に展開する
+    pairs = union_all(
+        select(Friendship.user_id.label("owner"), Friendship.friend_user_id.label("actor")),
+        select(Friendship.friend_user_id, Friendship.user_id),
+    ).subquery()
+    events = events_stmt().subquery()
+    _insert_entries(db, (
+        select(pairs.c.owner, events.c.user_id, events.c.kind, events.c.id, events.c.at)
+        .join_from(pairs, events, events.c.user_id == pairs.c.actor)
+        .where(true())
+    ))
+    return db.query(func.count(FeedEntry.id)).scalar()
@@ -0,0 +1,82 @@
+# backend/hashing.py
+# bcrypt 専用のワーカープール
+# ログインが集中しても、DB を読むだけの API 用スレッドプールを食いつぶさないように分離する
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+
+class HashingPoolSaturated(Exception):
+    """実行中 + 待ち行列が上限に達しているときに投げる（呼び出し側で 503 にする）"""
+
+
+class HashingPool:
+    """
+    bcrypt はC実装で GIL を離すので、少数のスレッドで CPU コア分だけ並列に回す
+    実行中 + 待ちの合計が workers + max_queue を超えたら待たずに拒否する
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 32):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+
+        self.queued = 0       # 投入済みでまだ始まっていない
+        self.running = 0      # 実行中
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.run_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def run(self, fn: Callable, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingPoolSaturated()
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def task():
+            started = time.perf_counter()
+            waited = started - submitted
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.run_seconds_total += time.perf_counter() - started
+
+        try:
+            return await asyncio.wrap_future(self._executor.submit(task))
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_seconds_total": self.wait_seconds_total,
+                "run_seconds_total": self.run_seconds_total,
+                "wait_ms_avg": round(self.wait_seconds_total / done * 1000, 2),
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 2),
+                "run_ms_avg": round(self.run_seconds_total / done * 1000, 2),
+            }
@@ -0,0 +1,353 @@
+# backend/importer.py
+# スプレッドシート等の過去のトレーニング記録（CSV）の一括取り込み
+#
+# CSV の列（1行 = 1セット。export.py の CSV の workout_set 行もそのまま読める）:
+#   performed_at   必須。2024-01-02 or 2024-01-02T10:00:00
+#   exercise_name  必須。カタログの種目名（表記ゆれは catalog.normalize_name で吸収）
+#   weight_kg      必須
+#   reps           必須
+#   session_id     任意。同じ値の行を1つのセッションにまとめる（ファイル内だけの番号）
+#                  無ければ performed_at が同じ行を1セッションにする
+#   set_no         任意。無ければセッション内で上から 1, 2, 3...
+#   note           任意。セッションの最初の行の値を使う
+#   type           任意。あれば workout_set 以外の行（export の体型記録など）は読み飛ばす
+# exercise_name / weight_kg / reps が全部空の行は「セット無しのセッション」
+#
+#   cd backend
+#   python importer.py history.csv --user-id 1 [--create-exercises] [--dry-run]
+import argparse
+import csv
+import io
+import math
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from functools import partial
+from typing import Callable, ContextManager, Dict, List, Optional, TextIO, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+import catalog
+import feed
+import leaderboard
+import prs
+import rollups
+import versions
+from models import Exercise, LiftLog, WorkoutSession, WorkoutSet
+
+# 1トランザクションで書くセット数
+IMPORT_CHUNK = 5000
+# レスポンスに載せるエラー行の上限（件数は error_count に全部数える）
+MAX_ERRORS = 100
+
+REQUIRED_COLUMNS = ("performed_at", "exercise_name", "weight_kg", "reps")
+_SET_COLUMNS = ("exercise_name", "weight_kg", "reps")
+
+
+# 書き込み用セッションを開くコンテキストマネージャを返す関数（書くところだけ1回ずつ呼ぶ）
+WriteSessionFactory = Callable[[], ContextManager[Session]]
+
+
+class ImportFormatError(ValueError):
+    """ファイル全体が読めない（列が足りない・文字コード違いなど）"""
+
+
+def _cell(row: dict, key: str) -> str:
+    return (row.get(key) or "").strip()
+
+
+def _ignored(row: dict) -> bool:
+    return _cell(row, "type") not in ("", "workout_set")
+
+
+def _positive(value: str, cast, label: str):
+    try:
+        v = cast(value)
+    except ValueError:
+        raise ValueError(f"{label} must be a number") from None
+    # float は "nan" / "inf" も読めてしまう（nan <= 0 も inf <= 0 も偽なので別に弾く）
+    if not math.isfinite(v):
+        raise ValueError(f"{label} must be a finite number")
+    if v <= 0:
+        raise ValueError(f"{label} must be > 0")
+    return v
+
+
+def _reader(f: TextIO) -> csv.DictReader:
+    f.seek(0)
+    reader = csv.DictReader(f)
+    missing = [c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ImportFormatError(f"Missing columns: {', '.join(missing)}")
+    return reader
+
+
+def _resolve_exercises(
+    db: Session,
+    writing: WriteSessionFactory,
+    user_id: int,
+    names: Dict[str, str],
+    create: bool,
+    dry_run: bool,
+) -> Tuple[Dict[str, Optional[int]], int]:
+    """
+    正規化名 → exercise_id（カタログに1回当てるだけ。行ごとに DB を引かない）
+    create: 無い種目は作る（dry_run なら作ったことにして None を入れる）
+    戻り値: (正規化名 → id, 作った種目の数)
+    """
+    known = catalog.catalog_cache.get(db).by_key
+    ids = {key: known[key]["id"] for key in names if key in known}
+    missing = [key for key in names if key not in known]
+    if not (create and missing):
+        return ids, 0
+    if dry_run:
+        ids.update(dict.fromkeys(missing))
+        return ids, len(missing)
+
+    with writing() as write_db:
+        created = write_db.execute(
+            insert(Exercise).returning(Exercise.id, sort_by_parameter_order=True),
+            [{"name": names[key], "created_by": user_id} for key in missing],
+        ).scalars().all()
+        versions.bump(write_db, versions.CATALOG_ALL)
+        write_db.commit()
+    ids.update(zip(missing, created))
+    catalog.catalog_cache.invalidate()
+    return ids, len(missing)
+
+
+class _Writer:
+    """パース済みの行をためて、IMPORT_CHUNK 件ごとに executemany で書く"""
+
+    def __init__(self, writing: WriteSessionFactory, user_id: int, chunk: int, dry_run: bool):
+        self.writing = writing
+        self.user_id = user_id
+        self.chunk = chunk
+        self.dry_run = dry_run
+        # ファイル内のセッションのキー → (DB の id, performed_at)
+        self.sessions: Dict[tuple, tuple] = {}
+        self.new_sessions: Dict[tuple, dict] = {}
+        self.sets: List[tuple] = []
+        self.session_count = 0
+        self.set_count = 0
+
+    def has_session(self, key: tuple) -> bool:
+        return key in self.sessions or key in self.new_sessions
+
+    def add_session(self, key: tuple, performed_at: datetime, note: str) -> None:
+        self.new_sessions[key] = {
+            "user_id": self.user_id,
+            "performed_at": performed_at,
+            "note": note,
+        }
+        self.session_count += 1
+        if len(self.new_sessions) >= self.chunk:
+            self.flush()
+
+    def add_set(self, key: tuple, exercise_id: int, set_no: int, weight_kg: float, reps: int) -> None:
+        self.sets.append((key, exercise_id, set_no, weight_kg, reps))
+        self.set_count += 1
+        if len(self.sets) >= self.chunk:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.dry_run:
+            self.sessions.update((key, (None, None)) for key in self.new_sessions)
+            self.new_sessions, self.sets = {}, []
+            return
+        if not self.new_sessions and not self.sets:
+            return
+
+        # チャンクごとに書き込み用セッションを開く（単一ライターの枠はこの間だけ持つ）
+        lifts = []
+        with self.writing() as db:
+            # 先に書き込み（ETag の更新）をして書き込みロックを取る。commit まで他の接続は
+            # 書けないので、max(id) の続きの id を自分で振ってセッションを executemany できる
+            # （RETURNING で id を受け取ると SQLite では1行ずつの INSERT になって遅い）
+            versions.bump_user(db, self.user_id)
+            new_ids = []
+            if self.new_sessions:
+                table = WorkoutSession.__table__
+                last_id = db.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+                new_ids = list(range(last_id + 1, last_id + 1 + len(self.new_sessions)))
+                db.execute(insert(table), [
+                    {"id": session_id, **session}
+                    for session_id, session in zip(new_ids, self.new_sessions.values())
+                ])
+                for session_id, (key, session) in zip(new_ids, self.new_sessions.items()):
+                    self.sessions[key] = (session_id, session["performed_at"])
+
+            if self.sets:
+                rows = []
+                for key, exercise_id, set_no, weight_kg, reps in self.sets:
+                    session_id, performed_at = self.sessions[key]
+                    rows.append({
+                        "session_id": session_id,
+                        "exercise_id": exercise_id,
+                        "set_no": set_no,
+                        "weight_kg": weight_kg,
+                        "reps": reps,
+                    })
+                    lifts.append({
+                        "user_id": self.user_id,
+                        "exercise_id": exercise_id,
+                        "performed_at": performed_at.date(),
+                        "weight_kg": weight_kg,
+                        "reps": reps,
+                    })
+                # ORM の一括 insert は行ごとの前処理が重いので、テーブルへ直接 executemany
+                db.execute(insert(WorkoutSet.__table__), rows)
+                db.execute(insert(LiftLog.__table__), lifts)
+                rollups.add_lift_sets(db, lifts)
+                rollups.add_training_volume(db, lifts)
+                # 前のチャンクから続くセッションも、そのセッションの全セットで総挙上量を比べ直す
+                prs.add_sets(db, self.user_id, lifts, {row["session_id"] for row in rows})
+
+            # create_workout と同じ集計・フィードの更新をチャンク単位でまとめて
+            rollups.mark_active_days(
+                db, self.user_id, [s["performed_at"].date() for s in self.new_sessions.values()]
+            )
+            feed.fan_out_many(db, self.user_id, feed.KIND_WORKOUT, new_ids)
+            db.commit()
+        if lifts:
+            leaderboard.boards.lifts_added(self.user_id, lifts)
+
+        self.new_sessions, self.sets = {}, []
+
+
+def import_workouts(
+    db: Session,
+    user_id: int,
+    f: TextIO,
+    create_exercises: bool = False,
+    dry_run: bool = False,
+    chunk: int = IMPORT_CHUNK,
+    writing: Optional[WriteSessionFactory] = None,
+) -> dict:
+    """
+    db: 読み取り用（カタログの突き合わせ）
+    writing: 書き込み用セッションの開き方。None なら db でそのまま書く（CLI）
+    f: シーク可能なテキストファイル（2回読む）
+      1回目: 種目名を集めてカタログと突き合わせる（文字コード・列の不備もここで弾く）
+      2回目: 行を検証しながら chunk 件ごとに書く
+    おかしい行は飛ばして、行番号と理由を errors に返す（それ以外の行は取り込む）
+    """
+    names: Dict[str, str] = {}
+    try:
+        for row in _reader(f):
+            name = _cell(row, "exercise_name")
+            if name and not _ignored(row):
+                names.setdefault(catalog.normalize_name(name), name)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFormatError(f"Could not read CSV: {e}") from None
+
+    if writing is None:
+        writing = partial(nullcontext, db)
+    exercise_ids, exercises_created = _resolve_exercises(
+        db, writing, user_id, names, create_exercises, dry_run
+    )
+    # 取り込みの間、読み取りのトランザクションを開いたままにしない
+    db.rollback()
+
+    writer = _Writer(writing, user_id, chunk, dry_run)
+    next_set_no: Dict[tuple, int] = {}
+    name_keys: Dict[str, str] = {}   # 同じ表記の正規化は1回だけ
+    errors: List[dict] = []
+    error_count = ignored = 0
+
+    reader = _reader(f)
+    for row in reader:
+        if _ignored(row):
+            ignored += 1
+            continue
+        try:
+            raw_at = _cell(row, "performed_at")
+            if not raw_at:
+                raise ValueError("performed_at is required")
+            try:
+                performed_at = datetime.fromisoformat(raw_at)
+            except ValueError:
+                raise ValueError(f"Invalid performed_at: {raw_at}") from None
+
+            session_id = _cell(row, "session_id")
+            key = ("id", session_id) if session_id else ("at", performed_at)
+
+            if not any(_cell(row, c) for c in _SET_COLUMNS):
+                # セット無しのセッション
+                if not writer.has_session(key):
+                    writer.add_session(key, performed_at, _cell(row, "note"))
+                continue
+
+            name = _cell(row, "exercise_name")
+            if not name:
+                raise ValueError("exercise_name is required")
+            name_key = name_keys.get(name)
+            if name_key is None:
+                name_key = name_keys[name] = catalog.normalize_name(name)
+            if name_key not in exercise_ids:
+                raise ValueError(f"Unknown exercise: {name}")
+            weight_kg = _positive(_cell(row, "weight_kg"), float, "weight_kg")
+            reps = _positive(_cell(row, "reps"), int, "reps")
+            raw_set_no = _cell(row, "set_no")
+            set_no = _positive(raw_set_no, int, "set_no") if raw_set_no else next_set_no.get(key, 1)
+        except ValueError as e:
+            error_count += 1
+            if len(errors) < MAX_ERRORS:
+                errors.append({"line": reader.line_num, "error": str(e)})
+            continue
+
+        if not writer.has_session(key):
+            writer.add_session(key, performed_at, _cell(row, "note"))
+        next_set_no[key] = set_no + 1
+        writer.add_set(key, exercise_ids[name_key], set_no, weight_kg, reps)
+
+    writer.flush()
+    return {
+        "dry_run": dry_run,
+        "sessions": writer.session_count,
+        "sets": writer.set_count,
+        "exercises_created": exercises_created,
+        "ignored": ignored,
+        "error_count": error_count,
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="トレーニング記録 CSV の一括取り込み")
+    parser.add_argument("path")
+    parser.add_argument("--user-id", type=int, required=True)
+    parser.add_argument("--encoding", default="utf-8-sig", help="Excel の CSV なら cp932")
+    parser.add_argument("--create-exercises", action="store_true", help="カタログに無い種目を作る")
+    parser.add_argument("--dry-run", action="store_true", help="検証だけして書き込まない")
+    parser.add_argument("--chunk", type=int, default=IMPORT_CHUNK)
+    args = parser.parse_args()
+
+    from db import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        with io.open(args.path, encoding=args.encoding, newline="") as f:
+            result = import_workouts(
+                db, args.user_id, f, args.create_exercises, args.dry_run, args.chunk
+            )
+    except ImportFormatError as e:
+        parser.exit(1, f"{e}\n")
+    finally:
+        db.close()
+
+    for err in result["errors"]:
+        print(f"line {err['line']}: {err['error']}")
+    print(
+        f"sessions: {result['sessions']}, sets: {result['sets']}, "
+        f"exercises created: {result['exercises_created']}, "
+        f"ignored: {result['ignored']}, errors: {result['error_count']}"
+    )
+    print(f"done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
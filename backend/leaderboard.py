@@ -0,0 +1,266 @@
+# backend/leaderboard.py
+# チーム内ランキング
+# メンバーごとの値をソート済みリストで持ち、順位は二分探索で引く（毎回全員を並べ直さない）
+# 記録の書き込み時に差分で更新し、未ロード・期限切れのボードは次の参照時に DB から作り直す
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from models import LiftDailyBest, Measurement, TeamMember, User, epley_1rm
+
+# metric -> (Measurement の列, 大きいほど上位か)
+RECORD_METRICS = {
+    "level": (Measurement.level, True),
+    "weight": (Measurement.weight, True),
+    "fat": (Measurement.fat, False),  # 体脂肪率は低いほど上位
+}
+ONE_RM = "1rm"
+METRICS = (*RECORD_METRICS, ONE_RM)
+
+# ワーカープロセスが複数あると他プロセスの書き込みは届かないので、一定時間で作り直す
+LEADERBOARD_MAX_AGE_SECONDS = 300
+
+
+class Board:
+    """
+    1チーム・1指標分のランキング
+    _keys は (並び順キー, user_id) の昇順リストで、先頭が1位
+    """
+
+    def __init__(self, higher_is_better: bool, usernames: Dict[int, str]):
+        self.higher_is_better = higher_is_better
+        self.usernames = usernames  # メンバー全員（値が無い人も含む）
+        self.built_at = time.monotonic()
+        self._keys: list = []
+        # user_id -> (値, as_of)。as_of が大きい値ほど新しい/良い記録
+        self._entries: dict = {}
+
+    def _sort_key(self, value: float) -> float:
+        return -value if self.higher_is_better else value
+
+    def set(self, user_id: int, value: float, as_of) -> None:
+        """今持っている値より as_of が新しいときだけ置き換える"""
+        current = self._entries.get(user_id)
+        if current is not None:
+            if as_of < current[1]:
+                return
+            self._keys.pop(bisect.bisect_left(self._keys, (self._sort_key(current[0]), user_id)))
+        self._entries[user_id] = (value, as_of)
+        bisect.insort(self._keys, (self._sort_key(value), user_id))
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """同じ値は同順位（1, 2, 2, 4 ...）"""
+        current = self._entries.get(user_id)
+        if current is None:
+            return None
+        return bisect.bisect_left(self._keys, (self._sort_key(current[0]),)) + 1
+
+    def entry(self, user_id: int) -> Optional[dict]:
+        current = self._entries.get(user_id)
+        if current is None:
+            return None
+        return {
+            "rank": self.rank(user_id),
+            "user_id": user_id,
+            "username": self.usernames.get(user_id, ""),
+            "value": round(current[0], 1),
+        }
+
+    def top(self, limit: int) -> List[dict]:
+        return [self.entry(user_id) for _, user_id in self._keys[:limit]]
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def _build(db: Session, team_id: int, metric: str, exercise_id: Optional[int]) -> Board:
+    members = db.execute(
+        select(TeamMember.user_id, User.username)
+        .join(User, User.id == TeamMember.user_id)
+        .where(TeamMember.team_id == team_id)
+    ).all()
+
+    if metric == ONE_RM:
+        board = Board(True, dict(members))
+        rows = db.execute(
+            select(LiftDailyBest.user_id, func.max(LiftDailyBest.best_1rm))
+            .join(TeamMember, and_(TeamMember.user_id == LiftDailyBest.user_id, TeamMember.team_id == team_id))
+            .where(LiftDailyBest.exercise_id == exercise_id)
+            .group_by(LiftDailyBest.user_id)
+        )
+        for user_id, best in rows:
+            # 1RM は「大きいほど良い記録」なので値そのものを as_of にする
+            board.set(user_id, best, best)
+        return board
+
+    col, higher_is_better = RECORD_METRICS[metric]
+    board = Board(higher_is_better, dict(members))
+    # メンバーごとに、その指標が入っている最新の記録1件
+    latest = (
+        select(
+            Measurement.user_id,
+            col.label("value"),
+            Measurement.performed_at,
+            Measurement.id,
+            func.row_number().over(
+                partition_by=Measurement.user_id,
+                order_by=(Measurement.performed_at.desc(), Measurement.id.desc()),
+            ).label("rn"),
+        )
+        .join(TeamMember, and_(TeamMember.user_id == Measurement.user_id, TeamMember.team_id == team_id))
+        .where(col.isnot(None))
+        .subquery()
+    )
+    rows = db.execute(
+        select(latest.c.user_id, latest.c.value, latest.c.performed_at, latest.c.id)
+        .where(latest.c.rn == 1)
+    )
+    for user_id, value, performed_at, record_id in rows:
+        board.set(user_id, float(value), (performed_at, record_id))
+    return board
+
+
+class LeaderboardCache:
+    """
+    (team_id, metric, exercise_id) -> Board
+    書き込み側からはユーザー単位で「その人が載っているボード」を引けるようにしておく
+    """
+
+    def __init__(self, max_age_seconds: float = LEADERBOARD_MAX_AGE_SECONDS):
+        self.max_age_seconds = max_age_seconds
+        self._boards: Dict[tuple, Board] = {}
+        self._by_user: Dict[int, set] = {}
+        # 辞書とボードの読み書きだけを守る（DB は読まないので短い）
+        self._lock = threading.Lock()
+        # キーごとの作り直しの順番待ち（同じボードを同時に2回作らない。他のキーは待たせない）
+        self._build_locks: Dict[tuple, threading.Lock] = {}
+        # 作り直し中のキー -> その間に届いた (user_id, metric, 値, as_of)
+        # DB の読み取り後のコミット分を取りこぼさないよう、できあがったボードに足してから差し替える
+        # None: 作り直し中にメンバーが変わった（できたボードはキャッシュしない）
+        self._pending: Dict[tuple, Optional[list]] = {}
+
+    def _fresh(self, key: tuple) -> Optional[Board]:
+        board = self._boards.get(key)
+        if board is None or time.monotonic() - board.built_at > self.max_age_seconds:
+            return None
+        return board
+
+    def _board(self, db: Session, key: tuple) -> Board:
+        """未ロード・期限切れなら DB から作り直す（DB の読み取りは self._lock の外）"""
+        with self._lock:
+            board = self._fresh(key)
+            if board is not None:
+                return board
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                # 待っている間に他のスレッドが作り終えていればそれを使う
+                board = self._fresh(key)
+                if board is not None:
+                    return board
+                self._pending[key] = []
+            try:
+                board = _build(db, *key)
+            except BaseException:
+                with self._lock:
+                    self._pending.pop(key, None)
+                raise
+
+            with self._lock:
+                updates = self._pending.pop(key)
+                if updates is None:
+                    return board
+                for user_id, _, value, as_of in updates:
+                    if user_id in board.usernames:
+                        board.set(user_id, value, as_of)
+                self._drop(key)
+                self._boards[key] = board
+                for user_id in board.usernames:
+                    self._by_user.setdefault(user_id, set()).add(key)
+            return board
+
+    def _notify(self, user_id: int, values: dict, as_of_for) -> None:
+        """
+        その人が載っているボードと作り直し中のボードへ値を反映する（self._lock の中で呼ぶ）
+        values: {(metric, exercise_id): 値}、as_of_for: 値 -> as_of
+        """
+        for key in self._by_user.get(user_id, ()):
+            value = values.get(key[1:])
+            if value is not None:
+                self._boards[key].set(user_id, value, as_of_for(value))
+        for key, updates in self._pending.items():
+            value = values.get(key[1:])
+            if updates is not None and value is not None:
+                updates.append((user_id, key[1], value, as_of_for(value)))
+
+    def _drop(self, key: tuple) -> None:
+        board = self._boards.pop(key, None)
+        if board is None:
+            return
+        for user_id in board.usernames:
+            keys = self._by_user.get(user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[user_id]
+
+    def standings(
+        self,
+        db: Session,
+        team_id: int,
+        metric: str,
+        exercise_id: Optional[int],
+        user_id: int,
+        limit: int,
+    ) -> dict:
+        board = self._board(db, (team_id, metric, exercise_id))
+        with self._lock:
+            return {
+                "team_id": team_id,
+                "metric": metric,
+                "exercise_id": exercise_id,
+                "members": len(board.usernames),
+                "ranked": len(board),
+                "entries": board.top(limit),
+                "me": board.entry(user_id),
+            }
+
+    # ---- 書き込み後のフック（コミット後に呼ぶ）----
+
+    def record_added(self, user_id: int, record_id: int, performed_at, values: dict) -> None:
+        """values: {"level": ..., "weight": ..., "fat": ...}"""
+        by_key = {
+            (metric, None): float(value)
+            for metric, value in values.items()
+            if metric in RECORD_METRICS and value is not None
+        }
+        with self._lock:
+            self._notify(user_id, by_key, lambda _: (performed_at, record_id))
+
+    def lifts_added(self, user_id: int, lifts: List[dict]) -> None:
+        """lifts: create_lift / create_workout で書いた LiftLog の行"""
+        best: Dict[int, float] = {}
+        for row in lifts:
+            one_rm = epley_1rm(row["weight_kg"], row["reps"])
+            best[row["exercise_id"]] = max(best.get(row["exercise_id"], 0.0), one_rm)
+
+        with self._lock:
+            # 1RM は値そのものが as_of
+            self._notify(user_id, {(ONE_RM, ex_id): v for ex_id, v in best.items()}, lambda v: v)
+
+    def invalidate_team(self, team_id: int) -> None:
+        """メンバーが変わったチームのボードを捨てる（次の参照で作り直す）"""
+        with self._lock:
+            for key in [k for k in self._boards if k[0] == team_id]:
+                self._drop(key)
+            for key in self._pending:
+                if key[0] == team_id:
+                    self._pending[key] = None
+
+
+boards = LeaderboardCache()
@@ -0,0 +1,162 @@
+# backend/levels.py
+# 体型データ → BMI・達成度レベルの計算
+# /calc_level（1件）も /calc_level/batch（まとめて）も記録の保存も同じ score_levels を通す
+#
+# presets.py の目標を変えたら、保存済みの level を計算し直す:
+#   cd backend
+#   python levels.py recompute
+import argparse
+import hashlib
+import json
+import time
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, bindparam, or_, select, update
+from sqlalchemy.engine import Engine
+
+from presets import PRESET_TARGETS
+
+# 1リクエストで受け付ける最大件数
+MAX_BATCH_SIZE = 10000
+
+# recompute で1回に読み書きする行数（メモリに載るのはこの件数分だけ）
+RECOMPUTE_CHUNK = 5000
+
+
+def _preset_version(preset: dict) -> str:
+    # レベル計算に効く目標値だけからハッシュを作る（タイトル等の変更では変わらない）
+    raw = json.dumps([preset["target_bmi"], preset["target_fat"]])
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+# preset_id -> 今の目標値のバージョン（Measurement.preset_version と比べる）
+PRESET_VERSIONS = {pid: _preset_version(p) for pid, p in PRESET_TARGETS.items()}
+
+
+def score_levels(
+    heights: Sequence[float],
+    weights: Sequence[float],
+    fats: Sequence[float],
+    preset_ids: Sequence[str],
+) -> Dict[str, List]:
+    """
+    列ごとの配列を受け取り、同じ長さの level / bmi / error の配列を返す
+    行ごとに dict を引いたり分岐したりせず、列単位で一気に計算する
+    （numpy は入れていないので、リスト内包表記で列ごとに回す）
+    """
+    # プリセットの目標値を先に列へ展開しておく
+    targets = {pid: PRESET_TARGETS.get(pid) for pid in set(preset_ids)}
+    known = [targets[pid] is not None for pid in preset_ids]
+    target_bmi = [targets[pid]["target_bmi"] if ok else None for pid, ok in zip(preset_ids, known)]
+    target_fat = [targets[pid]["target_fat"] if ok else None for pid, ok in zip(preset_ids, known)]
+
+    # 現在の BMI
+    # （DB の古い行は height 等が NULL のこともある）
+    bmi = [
+        w / (h / 100) ** 2 if ok and h is not None and w is not None and h > 0 else None
+        for h, w, ok in zip(heights, weights, known)
+    ]
+
+    # 目標との差分が小さいほどレベルが高くなるように 0〜100 に正規化（かなりざっくりなモデル）
+    level = [
+        max(0.0, min(100.0, 100 - (abs(tb - b) * 10 + abs(f - tf) * 2)))
+        if b is not None and f is not None and tb is not None and tf is not None else None
+        for b, f, tb, tf in zip(bmi, fats, target_bmi, target_fat)
+    ]
+
+    error: List[Optional[str]] = [
+        "Invalid preset" if not ok
+        else "Invalid height" if b is None
+        else "No target for this preset" if tb is None or tf is None
+        else "Invalid fat" if lv is None
+        else None
+        for ok, b, lv, tb, tf in zip(known, bmi, level, target_bmi, target_fat)
+    ]
+
+    return {
+        "level": [round(v, 1) if v is not None else None for v in level],
+        "bmi": [round(v, 1) if v is not None else None for v in bmi],
+        "error": error,
+    }
+
+
+def score_level(height: float, weight: float, fat: float, preset_id: str) -> dict:
+    """1件分（score_levels の1行目を取り出すだけ）"""
+    cols = score_levels([height], [weight], [fat], [preset_id])
+    return {key: values[0] for key, values in cols.items()}
+
+
+def recompute_stale(engine: Engine, chunk: int = RECOMPUTE_CHUNK) -> Dict[str, int]:
+    """
+    preset_version が今のプリセットと違う（NULL 含む）記録の level / bmi を計算し直す
+    id 順に chunk 件ずつ読み、executemany でまとめて書き戻してチャンクごとに commit する
+    （テーブル全体を読み込まない。途中で止めても、次回は残りの行から続く）
+    戻り値: preset_id -> 更新した件数
+    """
+    from models import Measurement
+
+    table = Measurement.__table__
+    write_back = (
+        update(table)
+        .where(table.c.id == bindparam("_id"))
+        .values(
+            level=bindparam("_level"),
+            bmi=bindparam("_bmi"),
+            preset_version=bindparam("_version"),
+        )
+    )
+
+    counts = {}
+    for preset_id, version in PRESET_VERSIONS.items():
+        stale = and_(
+            table.c.preset_id == preset_id,
+            or_(table.c.preset_version.is_(None), table.c.preset_version != version),
+        )
+        last_id, done = 0, 0
+        while True:
+            # チャンクごとに短いトランザクションにして、API の書き込みを長く待たせない
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    select(table.c.id, table.c.height, table.c.weight, table.c.fat)
+                    .where(stale, table.c.id > last_id)
+                    .order_by(table.c.id)
+                    .limit(chunk)
+                ).all()
+                if not rows:
+                    break
+                ids, heights, weights, fats = zip(*rows)
+                scored = score_levels(heights, weights, fats, [preset_id] * len(rows))
+                conn.execute(write_back, [
+                    {"_id": row_id, "_level": lv, "_bmi": b, "_version": version}
+                    for row_id, lv, b in zip(ids, scored["level"], scored["bmi"])
+                ])
+            last_id = ids[-1]
+            done += len(rows)
+        counts[preset_id] = done
+
+    if any(counts.values()):
+        import versions
+
+        # 記録の一覧・チームの時系列の ETag を全部変える
+        with engine.begin() as conn:
+            versions.bump_scope(conn, versions.USER, versions.TEAM)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="保存済みレベルの再計算")
+    parser.add_argument("command", choices=["recompute"])
+    parser.add_argument("--chunk", type=int, default=RECOMPUTE_CHUNK)
+    args = parser.parse_args()
+
+    from db import init_db, write_engine
+
+    init_db()
+    started = time.perf_counter()
+    for preset_id, n in recompute_stale(write_engine, args.chunk).items():
+        print(f"{preset_id}: {n} rows")
+    print(f"done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
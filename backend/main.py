@@ -1,14 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, File, HTTPException, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+import codecs
+import io
 import os
 
 from sqlalchemy.orm import Session
 
+import analytics
 import auth
+import catalog
+import feed
+import importer
+import levels
+import metrics
+import pagination
+import prs
+import schemas
+import serializers
+import versions
 from auth import get_current_user
-from db import init_db, get_db
+from db import ASYNC_ENABLED, init_db, get_db, get_write_db, write_session_blocking
+from db import async_engine, read_engine, write_engine, writer_queue_depth
 from pydantic import BaseModel
 
 
@@ -20,12 +34,13 @@ from schemas import (
 )
 
 from presets import PRESET_TARGETS
-from typing import List
+from typing import List, Optional, Union
 from datetime import datetime
 from datetime import date
 from sqlalchemy import Date
 from models import WorkoutSession, WorkoutSet, Friendship
 from schemas import WorkoutSessionCreate, WorkoutSessionOut
+from schemas import NewPersonalRecordOut, PersonalRecordOut, VolumeOut, WorkoutCreatedOut
 
 
 app = FastAPI()
@@ -33,6 +48,11 @@ app = FastAPI()
 #DB 初期化
 init_db()
 
+# 非同期DBモードでは、よく読まれる GET を async 版で先に登録する（同じパスを上書き）
+if ASYNC_ENABLED:
+    import async_routes
+    app.include_router(async_routes.router)
+
 
 # ====== モデル ======
 class BodyData(BaseModel):
@@ -42,40 +62,36 @@ class BodyData(BaseModel):
     preset_id: str  # "goku" など
 
 
+class BodyDataBatch(BaseModel):
+    # 列ごとの配列（同じ長さ）
+    height: List[float]
+    weight: List[float]
+    fat: List[float]
+    preset_id: List[str]
+
+
 # ====== レベル計算 API ======
 @app.post("/calc_level")
 def calc_level(body: BodyData):
-    preset = PRESET_TARGETS.get(body.preset_id)
-    if not preset:
-        return {"level": None, "bmi": None, "error": "Invalid preset"}
-
-    # 現在の BMI
-    height_m = body.height / 100
-    bmi = body.weight / (height_m ** 2)
-
-    # 目標との差分（かなりざっくりなモデル）
-    target_bmi = preset["target_bmi"]
-    target_fat = preset["target_fat"]
-
-    if target_bmi is None or target_fat is None:
-        # カスタム目標など、基準が無い場合
-        return {
-            "level": None,
-            "bmi": round(bmi, 1),
-            "error": "No target for this preset",
-        }
+    result = levels.score_level(body.height, body.weight, body.fat, body.preset_id)
+    if result["error"] is None:
+        del result["error"]
+    return result
 
-    bmi_progress = target_bmi - bmi        # BMI の差
-    fat_progress = body.fat - target_fat   # 体脂肪率の差
 
-    # 差が小さいほどレベルが高くなるように 0〜100 に正規化
-    level = 100 - (abs(bmi_progress) * 10 + abs(fat_progress) * 2)
-    level = max(0, min(100, level))
+@app.post("/calc_level/batch")
+def calc_level_batch(body: BodyDataBatch):
+    """
+    列ごとの配列でまとめて計算する（i 番目の結果は i 番目の入力に対応）
+    計算できなかった行は level=None と error に理由が入る
+    """
+    n = len(body.height)
+    if not (len(body.weight) == len(body.fat) == len(body.preset_id) == n):
+        raise HTTPException(status_code=400, detail="All arrays must have the same length")
+    if n > levels.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Too many rows (max {levels.MAX_BATCH_SIZE})")
 
-    return {
-        "level": round(level, 1),
-        "bmi": round(bmi, 1),
-    }
+    return levels.score_levels(body.height, body.weight, body.fat, body.preset_id)
 
 
 # ====== プリセット一覧 API（フロント側から fetch で取る用） ======
@@ -96,27 +112,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class RecordIn(BaseModel):
-    preset_id: str
-    height: float
-    weight: float
-    fat: float
-    level: float
-    performed_at: date 
-
-class RecordOut(BaseModel):
-    id: int
-    preset_id: str
-    height: float
-    weight: float
-    fat: float
-    level: float
-    created_at: datetime
-
-    class Config:
-        from_attributes = True
+# ====== メトリクス（/metrics、Prometheus 形式）======
+# 一番外側に付けて、CORS も含めたリクエスト全体の時間を測る
+metrics.setup(
+    app,
+    engines={"write": write_engine, "read": read_engine,
+             **({"async": async_engine.sync_engine} if async_engine is not None else {})},
+    stats={"hash_pool": auth.hash_pool.stats, "principal_cache": auth.principal_cache.stats},
+    gauges={"db_writer_waiting": ("Requests waiting for the single writer slot.",
+                                  writer_queue_depth)},
+)
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    # async にしておく（スレッドプールの空きを、スレッドプールを使わずに読む）
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 # ====== フロント配信設定 ======
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -137,40 +150,63 @@ app.include_router(auth.router)
 @app.post("/records")
 def create_record(
     record: RecordIn,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     current_user: User = Depends(get_current_user),
 ):
+    # BMI・レベルはクライアントの値を信用せず、ここで計算して保存する
+    scored = levels.score_level(record.height, record.weight, record.fat, record.preset_id)
+    if scored["error"] in ("Invalid preset", "Invalid height"):
+        raise HTTPException(status_code=400, detail=scored["error"])
+
     m = Measurement(
         user_id=current_user.id,
         preset_id=record.preset_id,
         height=record.height,
         weight=record.weight,
         fat=record.fat,
-        level=record.level,
+        level=scored["level"],
+        bmi=scored["bmi"],
+        preset_version=levels.PRESET_VERSIONS[record.preset_id],
         performed_at=record.performed_at,
     )
     db.add(m)
+    db.flush()
+    feed.fan_out(db, current_user.id, feed.KIND_RECORD, m.id)
+    # 体型記録はチームの時系列にも出るので所属チームの版も上げる
+    versions.bump_user(db, current_user.id, with_teams=True)
     db.commit()
     db.refresh(m)
+    leaderboard.boards.record_added(current_user.id, m.id, m.performed_at, {
+        "level": m.level, "weight": m.weight, "fat": m.fat,
+    })
     return {
         "id": m.id,
         "created_at": m.created_at,
         "level": m.level,
+        "bmi": m.bmi,
     }
 
 
 @app.get("/records", response_model=List[RecordOut])
 def list_records(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    records = (
-        db.query(Measurement)
-        .filter(Measurement.user_id == current_user.id)
-        .order_by(Measurement.performed_at.asc())
-        .all()
-    )
-    return records
+    # 前回から記録が増えていなければ 304（版番号を1行読むだけ）
+    cached = versions.not_modified(request, response, versions.etag(db, (versions.USER, current_user.id)))
+    if cached:
+        return cached
+
+    # 古い順に1ページずつ（次ページは X-Next-Cursor）
+    # 一覧は列タプルから直接 JSON にする（serializers.py。出力は response_model と同じ）
+    body, next_cursor = serializers.records_page(db, current_user.id, cursor, limit)
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return serializers.json_response(body, response)
 
 
 
@@ -180,7 +216,7 @@ def list_records(
 @app.post("/friends/requests", response_model=FriendRequestOut)
 def send_friend_request(
     body: FriendRequestCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     current_user: User = Depends(get_current_user),
 ):
     me = current_user.id
@@ -227,7 +263,7 @@ def inbox_friend_requests(
 @app.post("/friends/requests/{request_id}/accept")
 def accept_friend_request(
     request_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     current_user: User = Depends(get_current_user),
 ):
     me = current_user.id
@@ -244,6 +280,7 @@ def accept_friend_request(
         Friendship.friend_user_id == b
     ).first():
         db.add(Friendship(user_id=a, friend_user_id=b))
+        feed.fan_out_friendship(db, a, b)
 
     db.commit()
     return {"ok": True}
@@ -260,6 +297,23 @@ def list_friends(
     ).all()
 
 
+@app.get("/feed", response_model=list[schemas.FeedItemOut])
+def friend_feed(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    フレンド全員のワークアウト・体型記録を新しい順に（次ページは X-Next-Cursor）
+    """
+    items, next_cursor = feed.feed_page(db, current_user.id, cursor, limit)
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return items
+
+
 # --------------------
 # Team APIs
 # --------------------
@@ -278,7 +332,7 @@ def my_teams(
 @app.post("/teams", response_model=TeamOut)
 def create_team(
     body: TeamCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     current_user: User = Depends(get_current_user),
 ):
     me = current_user.id
@@ -289,6 +343,7 @@ def create_team(
 
     # 作成者を owner としてメンバー追加
     db.add(TeamMember(team_id=team.id, user_id=me, role="owner"))
+    versions.bump(db, (versions.TEAM, team.id))
     db.commit()
     return team
 
@@ -298,7 +353,7 @@ from schemas import TeamJoinByCode
 @app.post("/teams/join")
 def join_team_by_code(
     body: TeamJoinByCode,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     current_user: User = Depends(get_current_user),
 ):
     code = body.invite_code.strip()
@@ -317,7 +372,9 @@ def join_team_by_code(
         return {"ok": True, "team_id": team.id}
 
     db.add(TeamMember(team_id=team.id, user_id=current_user.id, role="member"))
+    versions.bump(db, (versions.TEAM, team.id))
     db.commit()
+    leaderboard.boards.invalidate_team(team.id)
     return {"ok": True, "team_id": team.id}
 
 import secrets
@@ -331,7 +388,7 @@ from auth import get_current_user  # あなたの実装に合わせて（JWTの
 @app.post("/teams/join_by_code", response_model=schemas.TeamJoinResult)
 def join_team_by_code(
     body: schemas.TeamJoinByCode,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     user: models.User = Depends(get_current_user),
 ):
     team = db.query(models.Team).filter(models.Team.invite_code == body.invite_code).first()
@@ -347,14 +404,16 @@ def join_team_by_code(
 
     tm = models.TeamMember(team_id=team.id, user_id=user.id, role="member")
     db.add(tm)
+    versions.bump(db, (versions.TEAM, team.id))
     db.commit()
+    leaderboard.boards.invalidate_team(team.id)
     return schemas.TeamJoinResult(team_id=team.id)
 
 
 @app.post("/teams/{team_id}/invite/rotate")
 def rotate_invite_code(
     team_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     current_user: User = Depends(get_current_user),
 ):
     team = db.query(Team).filter(Team.id == team_id).first()
@@ -370,59 +429,45 @@ def rotate_invite_code(
 
 
 
-from sqlalchemy import func
+from fastapi import Query
+import series as series_engine
 
 @app.get("/teams/{team_id}/series")
 def team_series(
+    request: Request,
+    response: Response,
     team_id: int,
     metric: str = "level",     # level / weight / fat など
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    fmt: str = Query("json", alias="format"),   # json / columnar / binary（serializers.py）
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    # チーム存在チェック
-    team = db.query(Team).filter(Team.id == team_id).first()
-    if not team:
-        raise HTTPException(status_code=404, detail="Team not found")
+    serializers.check_series_format(fmt)
 
-    # 自分がそのチームのメンバーか確認（覗き見防止）
-    me_member = db.query(TeamMember).filter(
-        TeamMember.team_id == team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
-    if not me_member:
+    # チーム存在 + 自分がメンバーか（覗き見防止）を1クエリで確認
+    team_exists, is_member = series_engine.team_access(db, team_id, current_user.id)
+    if not team_exists:
+        raise HTTPException(status_code=404, detail="Team not found")
+    if not is_member:
         raise HTTPException(status_code=403, detail="Not a team member")
 
-    # メンバー取得
-    members = (
-        db.query(User.id, User.username)
-        .join(TeamMember, TeamMember.user_id == User.id)
-        .filter(TeamMember.team_id == team_id)
-        .all()
-    )
-
     # metric の安全チェック（SQLインジェクション防止）
-    allowed = {"level": Measurement.level, "weight": Measurement.weight, "fat": Measurement.fat}
-    if metric not in allowed:
+    if metric not in series_engine.TEAM_METRICS:
         raise HTTPException(status_code=400, detail="Invalid metric")
-    col = allowed[metric]
-
-    # メンバーごとの時系列を作る
-    series = []
-    for uid, uname in members:
-        rows = (
-            db.query(Measurement.created_at, col)
-            .filter(Measurement.user_id == uid)
-            .order_by(Measurement.created_at.asc())
-            .all()
+
+    # メンバーの記録もメンバー構成も変わっていなければ 304
+    cached = versions.not_modified(request, response, versions.etag(db, (versions.TEAM, team_id)))
+    if cached:
+        return cached
+
+    # メンバー全員の時系列を1クエリで取得（from/to で表示範囲だけ）
+    series = series_engine.team_series(db, team_id, metric, date_from, date_to, columnar=fmt != "json")
+    if fmt != "json":
+        return serializers.grouped_series_response(
+            fmt, {"team_id": team_id, "metric": metric}, series, response
         )
-        series.append({
-            "user_id": uid,
-            "username": uname,
-            "points": [
-                {"t": dt.isoformat(), "v": float(val) if val is not None else None}
-                for dt, val in rows
-            ]
-        })
 
     return {
         "team_id": team_id,
@@ -430,69 +475,47 @@ def team_series(
         "series": series
     }
 
-from sqlalchemy import func
 
-def team_series(
+import leaderboard
+
+@app.get("/teams/{team_id}/leaderboard", response_model=schemas.LeaderboardOut)
+def team_leaderboard(
     team_id: int,
-    metric: str = "level",  # level / weight / fat
+    metric: str = "level",     # level / weight / fat / 1rm
+    exercise_id: Optional[int] = None,  # metric=1rm のときの種目
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    # チーム存在
-    team = db.query(Team).filter(Team.id == team_id).first()
-    if not team:
+    team_exists, is_member = series_engine.team_access(db, team_id, current_user.id)
+    if not team_exists:
         raise HTTPException(status_code=404, detail="Team not found")
-
-    # 自分がメンバーか（覗き見防止）
-    me_member = db.query(TeamMember).filter(
-        TeamMember.team_id == team_id,
-        TeamMember.user_id == current_user.id
-    ).first()
-    if not me_member:
+    if not is_member:
         raise HTTPException(status_code=403, detail="Not a team member")
 
-    # metric の安全チェック
-    allowed = {
-        "level": Measurement.level,
-        "weight": Measurement.weight,
-        "fat": Measurement.fat,
-    }
-    if metric not in allowed:
+    if metric not in leaderboard.METRICS:
         raise HTTPException(status_code=400, detail="Invalid metric")
-    col = allowed[metric]
-
-    # チームメンバー（ユーザー名含む）
-    members = (
-        db.query(User.id, User.username)
-        .join(TeamMember, TeamMember.user_id == User.id)
-        .filter(TeamMember.team_id == team_id)
-        .all()
+    if metric == leaderboard.ONE_RM:
+        if exercise_id is None:
+            raise HTTPException(status_code=400, detail="exercise_id is required for 1rm")
+        if db.get(models.Exercise, exercise_id) is None:
+            raise HTTPException(status_code=404, detail="Exercise not found")
+    else:
+        exercise_id = None
+
+    # 順位はメモリ上のソート済みボードから（未ロードならここで DB から作る）
+    return leaderboard.boards.standings(
+        db, team_id, metric, exercise_id, current_user.id, pagination.clamp_limit(limit)
     )
 
-    series = []
-    for uid, uname in members:
-        rows = (
-            db.query(Measurement.created_at, col)
-            .filter(Measurement.user_id == uid)
-            .order_by(Measurement.created_at.asc())
-            .all()
-        )
-        series.append({
-            "user_id": uid,
-            "username": uname,
-            "points": [{"t": dt.isoformat(), "v": float(val) if val is not None else None} for dt, val in rows]
-        })
-
-    return {"team_id": team_id, "metric": metric, "series": series}
-
-
 
 from fastapi import HTTPException
 from datetime import date
 from sqlalchemy import and_
 
 from models import Exercise, LiftLog
-from schemas import ExerciseCreate, ExerciseOut, LiftCreate, LiftOut, LiftSeriesOut, SeriesPoint
+import rollups
+from schemas import ExerciseCreate, ExerciseOut, ExerciseUpdate, LiftCreate, LiftOut, LiftSeriesListOut, LiftSeriesOut, SeriesPoint
 
 def epley_1rm(weight: float, reps: int) -> float:
     reps = max(1, reps)
@@ -503,32 +526,87 @@ def epley_1rm(weight: float, reps: int) -> float:
 # --------------------
 @app.get("/exercises", response_model=list[ExerciseOut])
 def list_exercises(
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
+    cached = versions.not_modified(request, response, versions.etag(db, versions.CATALOG_ALL))
+    if cached:
+        return cached
+
     # とりあえず全件（後で “共通種目 + 自分作成” にしたければここを調整）
-    return db.query(Exercise).order_by(Exercise.id.asc()).all()
+    # テーブルは読まず、プロセス内のカタログ（id 順）から返す
+    return catalog.catalog_cache.get(db).entries
+
+
+@app.get("/exercises/search", response_model=list[ExerciseOut])
+def search_exercises(
+    request: Request,
+    response: Response,
+    q: str = "",
+    limit: int = catalog.SEARCH_LIMIT,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    種目名の入力補完（表記ゆれを吸収した前方一致。単語の途中の先頭からも当たる）
+    """
+    cached = versions.not_modified(request, response, versions.etag(db, versions.CATALOG_ALL))
+    if cached:
+        return cached
+
+    return catalog.catalog_cache.get(db).search(q, max(1, min(limit, catalog.NODE_CAP)))
 
 
 @app.post("/exercises", response_model=ExerciseOut)
 def create_exercise(
     body: ExerciseCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     current_user: User = Depends(get_current_user),
 ):
     
     name = body.name.strip()
     if not name:
         raise HTTPException(status_code=400, detail="name is required")
+    muscle_group = analytics.check_muscle_group(body.muscle_group)
 
-    exist = db.query(Exercise).filter(Exercise.name == name).first()
+    # "Bench Press" / "bench  press" / "ＢＥＮＣＨ ＰＲＥＳＳ" は同じ種目として既存を返す
+    exist = catalog.catalog_cache.get(db).find(name)
     if exist:
         return exist
 
-    ex = Exercise(name=name, created_by=current_user.id)
+    ex = Exercise(name=name, created_by=current_user.id, muscle_group=muscle_group)
     db.add(ex)
+    versions.bump(db, versions.CATALOG_ALL)
+    db.commit()
+    db.refresh(ex)
+    catalog.catalog_cache.invalidate()
+    return ex
+
+
+@app.patch("/exercises/{exercise_id}", response_model=ExerciseOut)
+def update_exercise(
+    exercise_id: int,
+    body: ExerciseUpdate,
+    db: Session = Depends(get_write_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    種目の部位を設定する（作成者のみ）
+    集計は種目単位で持っているので、部位を変えても /analytics/volume の作り直しは要らない
+    """
+    ex = db.get(Exercise, exercise_id)
+    if not ex:
+        raise HTTPException(status_code=404, detail="Exercise not found")
+    if ex.created_by != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the creator can edit this exercise")
+
+    ex.muscle_group = analytics.check_muscle_group(body.muscle_group)
+    versions.bump(db, versions.CATALOG_ALL)
     db.commit()
     db.refresh(ex)
+    catalog.catalog_cache.invalidate()
     return ex
 
 # --------------------
@@ -537,7 +615,7 @@ def create_exercise(
 @app.post("/lifts", response_model=LiftOut)
 def create_lift(
     body: LiftCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     current_user: User = Depends(get_current_user),
 ):
     # 種目存在チェック
@@ -558,42 +636,71 @@ def create_lift(
         reps=body.reps,
     )
     db.add(log)
+    # 日別ベスト1RM・自己ベストも同じトランザクションで更新
+    lift = {
+        "user_id": current_user.id,
+        "exercise_id": body.exercise_id,
+        "performed_at": body.performed_at,
+        "weight_kg": body.weight_kg,
+        "reps": body.reps,
+    }
+    rollups.add_lift_sets(db, [lift])
+    prs.add_sets(db, current_user.id, [lift])
+    versions.bump_user(db, current_user.id)
     db.commit()
     db.refresh(log)
+    leaderboard.boards.lifts_added(current_user.id, [{
+        "exercise_id": log.exercise_id, "weight_kg": log.weight_kg, "reps": log.reps,
+    }])
     return log
 
-@app.get("/lifts/series", response_model=LiftSeriesOut)
+@app.get("/lifts/series", response_model=Union[LiftSeriesOut, LiftSeriesListOut])
 def lift_series(
-    exercise_id: int,
+    request: Request,
+    response: Response,
+    exercise_id: Optional[int] = None,
+    exercise_ids: Optional[str] = None,        # "1,2,3" でまとめて取る（結果は LiftSeriesListOut）
+    fmt: str = Query("json", alias="format"),   # json / columnar / binary（serializers.py）
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
+    serializers.check_series_format(fmt)
+    if (exercise_id is None) == (exercise_ids is None):
+        raise HTTPException(status_code=400, detail="Specify either exercise_id or exercise_ids")
+    ids = series_engine.parse_exercise_ids(exercise_ids) if exercise_ids is not None else None
+    cached = versions.not_modified(
+        request, response,
+        versions.etag(db, (versions.USER, current_user.id), versions.CATALOG_ALL),
+    )
+    if cached:
+        return cached
+
+    if ids is not None:
+        # 何種目でも1クエリ（種目ごとに uq_lift_daily_best の範囲を引く）
+        names = dict(db.execute(series_engine.exercise_names_stmt(ids)).all())
+        if len(names) < len(ids):
+            raise HTTPException(status_code=404, detail="Exercise not found")
+        rows = db.execute(series_engine.lift_series_many_stmt(current_user.id, ids))
+        return serializers.lift_series_many_response(
+            fmt, series_engine.group_lift_series(rows, ids), names, response
+        )
+
     ex = db.query(Exercise).filter(Exercise.id == exercise_id).first()
     if not ex:
         raise HTTPException(status_code=404, detail="Exercise not found")
 
-    logs = (
-        db.query(LiftLog)
-        .filter(
-            LiftLog.user_id == current_user.id,
-            LiftLog.exercise_id == exercise_id
-        )
-        .order_by(LiftLog.performed_at.asc(), LiftLog.id.asc())
-        .all()
-    )
-
-    from collections import defaultdict
-    best_by_day = defaultdict(float)
+    # 日別ベストは書き込み時に集計済み（uq_lift_daily_best の範囲スキャン）
+    rows = db.execute(series_engine.lift_series_stmt(current_user.id, exercise_id)).all()
 
-    for log in logs:
-        v = epley_1rm(log.weight_kg, log.reps)
-        if v > best_by_day[log.performed_at]:
-            best_by_day[log.performed_at] = v
+    if fmt != "json":
+        return serializers.lift_series_response(
+            fmt, {"exercise_id": exercise_id, "exercise_name": ex.name},
+            [series_engine.epoch_day(day) for day, _ in rows],
+            [round(val, 1) for _, val in rows],
+            response,
+        )
 
-    series = [
-        SeriesPoint(t=day, v=round(val, 1))
-        for day, val in sorted(best_by_day.items())
-    ]
+    series = [SeriesPoint(t=day, v=round(val, 1)) for day, val in rows]
 
     return LiftSeriesOut(
         exercise_id=exercise_id,
@@ -602,15 +709,64 @@ def lift_series(
     )
 
 
+@app.get("/prs", response_model=List[PersonalRecordOut])
+def list_personal_records(
+    request: Request,
+    response: Response,
+    exercise_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """自己ベスト一覧（種目ごとに 1〜12RM・推定1RM・1セッションの総挙上量。書き込み時に更新済み）"""
+    cached = versions.not_modified(
+        request, response,
+        versions.etag(db, (versions.USER, current_user.id), versions.CATALOG_ALL),
+    )
+    if cached:
+        return cached
+    return prs.list_records(db, current_user.id, exercise_id)
+
+
+@app.get("/prs/recent", response_model=List[PersonalRecordOut])
+def recent_personal_records(
+    request: Request,
+    response: Response,
+    limit: int = prs.RECENT_LIMIT,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """最近更新した自己ベスト（達成日の新しい順）"""
+    cached = versions.not_modified(
+        request, response,
+        versions.etag(db, (versions.USER, current_user.id), versions.CATALOG_ALL),
+    )
+    if cached:
+        return cached
+    return prs.recent_records(db, current_user.id, limit)
+
+
 from collections import defaultdict
+from sqlalchemy import insert
 
 
-@app.post("/workouts", response_model=WorkoutSessionOut)
+@app.post("/workouts", response_model=WorkoutCreatedOut)
 def create_workout(
     body: WorkoutSessionCreate,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_write_db),
     current_user: User = Depends(get_current_user),
 ):
+    # 種目存在チェック（全セット分を1クエリで）
+    exercise_ids = {s.exercise_id for s in body.sets}
+    names = dict(db.query(Exercise.id, Exercise.name).filter(Exercise.id.in_(exercise_ids)).all())
+    if exercise_ids - names.keys():
+        raise HTTPException(status_code=404, detail="Exercise not found")
+
+    for s in body.sets:
+        if s.weight_kg <= 0:
+            raise HTTPException(status_code=400, detail="weight_kg must be > 0")
+        if s.reps <= 0:
+            raise HTTPException(status_code=400, detail="reps must be > 0")
+
     session = WorkoutSession(
         user_id=current_user.id,
         performed_at=body.performed_at,
@@ -619,30 +775,156 @@ def create_workout(
     db.add(session)
     db.flush()  # session.id を先に作る
 
-    for s in body.sets:
-        db.add(WorkoutSet(
-            session_id=session.id,
-            exercise_id=s.exercise_id,
-            set_no=s.set_no,
-            weight_kg=s.weight_kg,
-            reps=s.reps,
-        ))
+    # セットと、グラフ用の LiftLog を同じトランザクションでまとめて insert
+    # （セット0件のセッションもある。空リストで insert すると DEFAULT VALUES になる）
+    if body.sets:
+        db.execute(insert(WorkoutSet), [
+            {
+                "session_id": session.id,
+                "exercise_id": s.exercise_id,
+                "set_no": s.set_no,
+                "weight_kg": s.weight_kg,
+                "reps": s.reps,
+            }
+            for s in body.sets
+        ])
+
+    lifts = [
+        {
+            "user_id": current_user.id,
+            "exercise_id": s.exercise_id,
+            "performed_at": body.performed_at.date(),
+            "weight_kg": s.weight_kg,
+            "reps": s.reps,
+        }
+        for s in body.sets
+    ]
+    new_prs = []
+    if lifts:
+        db.execute(insert(LiftLog), lifts)
+        rollups.add_lift_sets(db, lifts)
+        rollups.add_training_volume(db, lifts)
+        # 自己ベスト（このワークアウトで上回ったものをレスポンスで返す）
+        new_prs = prs.add_sets(db, current_user.id, lifts, [session.id])
+
+    # カレンダー用の日ビットマップ
+    rollups.mark_active_days(db, current_user.id, [body.performed_at.date()])
+    feed.fan_out(db, current_user.id, feed.KIND_WORKOUT, session.id)
+    versions.bump_user(db, current_user.id)
 
     db.commit()
     db.refresh(session)
-    return session
+    if lifts:
+        leaderboard.boards.lifts_added(current_user.id, lifts)
+
+    out = WorkoutCreatedOut.model_validate(session)
+    out.new_prs = [NewPersonalRecordOut(exercise_name=names[r["exercise_id"]], **r) for r in new_prs]
+    return out
+
+
+@app.post("/workouts/import")
+def import_workouts(
+    file: UploadFile = File(...),
+    encoding: str = "utf-8-sig",        # Excel で保存した CSV なら cp932
+    create_exercises: bool = False,     # カタログに無い種目を作るか（False ならその行はエラー）
+    dry_run: bool = False,              # 検証だけして書き込まない
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    過去のセッション・セットの CSV を一括で取り込む（列は importer.py を参照）
+    おかしい行は飛ばし、行番号と理由を errors で返す
+    単一ライターの枠は種目の追加とチャンクの書き込みの間だけ取る（CSV の検証中は他の書き込みを待たせない）
+    """
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        raise HTTPException(status_code=400, detail=f"Unknown encoding: {encoding}")
+
+    # UploadFile はディスクに退避された一時ファイルなので、全体をメモリに読まずに2回なめられる
+    text = io.TextIOWrapper(file.file, encoding=encoding, newline="")
+    try:
+        return importer.import_workouts(
+            db, current_user.id, text, create_exercises, dry_run,
+            writing=write_session_blocking,
+        )
+    except importer.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        text.detach()
 
 @app.get("/workouts", response_model=list[WorkoutSessionOut])
 def list_my_workouts(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    return (
-        db.query(WorkoutSession)
-        .filter(WorkoutSession.user_id == current_user.id)
-        .order_by(WorkoutSession.performed_at.desc())
-        .all()
+    cached = versions.not_modified(request, response, versions.etag(db, (versions.USER, current_user.id)))
+    if cached:
+        return cached
+    return workout_page(db, current_user.id, cursor, limit, response)
+
+
+@app.get("/workouts/calendar")
+def workout_calendar(
+    year: int = Query(..., ge=1, le=9999),
+    month: int = Query(..., ge=1, le=12),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    その月にトレーニングした日だけを返す（ビットマップ1行を読むだけ）
+    """
+    return {
+        "year": year,
+        "month": month,
+        "days": rollups.active_days(db, current_user.id, year, month),
+    }
+
+
+@app.get("/analytics/volume", response_model=VolumeOut)
+def training_volume(
+    request: Request,
+    response: Response,
+    granularity: str = "week",
+    date_from: Optional[date] = Query(None, alias="from"),
+    date_to: Optional[date] = Query(None, alias="to"),
+    by: str = "exercise",
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    日・ISO 週・月ごとのセット数・回数・総挙上量（種目別 or 部位別）
+    書き込み時に足し込んだ training_volumes だけを読む（analytics.py）
+    """
+    cached = versions.not_modified(
+        request, response,
+        versions.etag(db, (versions.USER, current_user.id), versions.CATALOG_ALL),
     )
+    if cached:
+        return cached
+    return analytics.volume(db, current_user.id, granularity, date_from, date_to, by)
+
+
+def workout_page(
+    db: Session,
+    user_id: int,
+    cursor: Optional[str],
+    limit: int,
+    response: Response,
+) -> Response:
+    """
+    新しい順に1ページ分のセッションを返す
+    sets はページ内のセッション分をまとめて1クエリで読む（N+1 防止）
+    ORM オブジェクトを作らず、列タプルから直接 JSON にする（serializers.py）
+    """
+    body, next_cursor = serializers.workouts_page(db, user_id, cursor, limit)
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return serializers.json_response(body, response)
 
 
 def is_friend(db: Session, me: int, other: int) -> bool:
@@ -656,19 +938,46 @@ def is_friend(db: Session, me: int, other: int) -> bool:
 @app.get("/users/{user_id}/workouts", response_model=list[WorkoutSessionOut])
 def list_friend_workouts(
     user_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = pagination.DEFAULT_PAGE_SIZE,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     if not is_friend(db, current_user.id, user_id):
         raise HTTPException(status_code=403, detail="Not friends")
 
-    return (
-        db.query(WorkoutSession)
-        .filter(WorkoutSession.user_id == user_id)
-        .order_by(WorkoutSession.performed_at.desc())
-        .all()
-    )
+    return workout_page(db, user_id, cursor, limit, response)
 
 
+# --------------------
+# Export APIs
+# --------------------
+import export
+
+@app.get("/export")
+def export_my_data(
+    fmt: str = Query("ndjson", alias="format"),   # ndjson / csv
+    current_user: User = Depends(get_current_user),
+):
+    """自分の全履歴（体型記録・ワークアウト・リフト記録）をストリームで返す"""
+    return export.export_response([current_user.id], fmt, f"muscle_export_user{current_user.id}")
 
 
+@app.get("/teams/{team_id}/export")
+def export_team_data(
+    team_id: int,
+    fmt: str = Query("ndjson", alias="format"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """チーム全員分（オーナーのみ）"""
+    team = db.query(Team).filter(Team.id == team_id).first()
+    if not team:
+        raise HTTPException(status_code=404, detail="Team not found")
+    if team.owner_user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only owner can export")
+
+    return export.export_response(
+        export.team_member_ids_stmt(team_id), fmt, f"muscle_export_team{team_id}"
+    )
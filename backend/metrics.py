@@ -0,0 +1,319 @@
+# backend/metrics.py
+# /metrics（Prometheus のテキスト形式）
+# - ASGI ミドルウェア: ルートごとのレイテンシ・ステータス・同時実行数、1リクエスト中の SQL 本数と時間
+# - SQLAlchemy のイベント: エンジンごとの SQL 本数・時間
+# - スクレイプ時に読むだけの値: 接続プール・スレッドプール・単一ライター待ち・bcrypt プール・認証キャッシュ
+# リクエスト中は dict の加算と bisect だけ（文字列の組み立てはスクレイプ時にまとめて）
+#
+# MUSCLE_METRICS=0 でミドルウェアもイベントも付けない
+import bisect
+import contextvars
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = os.environ.get("MUSCLE_METRICS", "1") == "1"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# ルートに当たらなかったリクエスト（404 など）は1つのラベルにまとめる（ラベルの種類を増やさない）
+UNMATCHED_ROUTE = "<unmatched>"
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in items:
+            lines.append(f"{self.name}{_label_str(self.label_names, labels)} {_fmt(value)}")
+        return lines
+
+
+class Gauge:
+    """同時実行数など、増減するもの"""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, labels: Labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in items:
+            lines.append(f"{self.name}{_label_str(self.label_names, labels)} {_fmt(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        # labels -> [バケットごとの件数（累積しない。最後は +Inf）, 合計, 件数]
+        self._values: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(c), s, n)) for labels, (c, s, n) in self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_fmt(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.label_names, labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.label_names, labels)} {n}")
+        return lines
+
+
+class Collector:
+    """スクレイプ時に fn() を呼んで値を読む（[(ラベル値, 値), ...] を返す）"""
+
+    def __init__(self, name: str, help_text: str, kind: str, label_names: Sequence[str],
+                 fn: Callable[[], Iterable[Tuple[Labels, float]]]):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in self.fn():
+            lines.append(f"{self.name}{_label_str(self.label_names, labels)} {_fmt(value)}")
+        return lines
+
+
+# ==== HTTP ====
+http_requests = Counter(
+    "http_requests_total", "HTTP requests by route and status code.", ("method", "route", "status"),
+)
+http_latency = Histogram(
+    "http_request_duration_seconds", "Time until the response finished, by route.",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+http_in_flight = Gauge(
+    "http_requests_in_flight", "Requests currently being handled.", ("method",),
+)
+http_sql_statements = Histogram(
+    "http_request_sql_statements", "SQL statements executed while handling one request.",
+    SQL_COUNT_BUCKETS, ("method", "route"),
+)
+http_sql_seconds = Histogram(
+    "http_request_sql_seconds", "Time spent in SQL while handling one request.",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+
+# ==== DB ====
+db_statements = Counter(
+    "db_statements_total", "SQL statements executed (executemany counts once).", ("engine",),
+)
+db_statement_seconds = Histogram(
+    "db_statement_duration_seconds", "SQL statement execution time.", LATENCY_BUCKETS, ("engine",),
+)
+
+REGISTRY: list = [
+    http_requests, http_latency, http_in_flight, http_sql_statements, http_sql_seconds,
+    db_statements, db_statement_seconds,
+]
+
+# 今のリクエストの [SQL 本数, SQL 秒数]
+# スレッドプールで動く同期エンドポイントにもコンテキストごと渡るので、中身の list を書き換えて集計する
+_request_sql: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("request_sql", default=None)
+
+
+def register(metric) -> None:
+    REGISTRY.append(metric)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    """engine の全 SQL の本数と時間を数える（async エンジンは .sync_engine を渡す）"""
+    labels = (name,)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        db_statements.inc(labels)
+        db_statement_seconds.observe(labels, elapsed)
+        current = _request_sql.get()
+        if current is not None:
+            current[0] += 1
+            current[1] += elapsed
+
+
+class MetricsMiddleware:
+    """素の ASGI ミドルウェア（BaseHTTPMiddleware はストリーミングを包み直すので使わない）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        sql = [0, 0.0]
+        token = _request_sql.set(sql)
+        http_in_flight.add((method,), 1)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.add((method,), -1)
+            _request_sql.reset(token)
+
+            # ルーティング後に scope["route"] が入る（パスのテンプレートでまとめる）
+            route = scope.get("route")
+            labels = (method, getattr(route, "path", UNMATCHED_ROUTE))
+            http_requests.inc(labels + (str(status[0]),))
+            http_latency.observe(labels, elapsed)
+            http_sql_statements.observe(labels, sql[0])
+            http_sql_seconds.observe(labels, sql[1])
+
+
+# ==== スクレイプ時に読む値 ====
+
+def _pool_stats(engines: Dict[str, Engine]):
+    for name, engine in engines.items():
+        pool = engine.pool
+        for stat in ("size", "checkedout", "overflow", "checkedin"):
+            fn = getattr(pool, stat, None)
+            if fn is not None:
+                yield (name, stat), fn()
+
+
+def _thread_limiter_stats():
+    from anyio.to_thread import current_default_thread_limiter
+
+    try:
+        limiter = current_default_thread_limiter()
+    except Exception:  # イベントループの外（テスト等）
+        return
+    yield ("total",), limiter.total_tokens
+    yield ("borrowed",), limiter.borrowed_tokens
+    yield ("waiting",), limiter.statistics().tasks_waiting
+
+
+def setup(
+    app,
+    engines: Dict[str, Engine],
+    stats: Dict[str, Callable[[], dict]],
+    gauges: Dict[str, Tuple[str, Callable[[], float]]],
+) -> None:
+    """
+    engines: ラベル名 -> エンジン（読み書き共用で同じエンジンなら最初の名前で1回だけ計測）
+    stats:   ラベル名 -> stats() の dict を返す関数（数値の項目だけ出す）
+    gauges:  メトリクス名 -> (説明, 値を返す関数)
+    """
+    if not METRICS_ENABLED:
+        return
+
+    unique: Dict[str, Engine] = {}
+    for name, engine in engines.items():
+        if all(engine is not e for e in unique.values()):
+            unique[name] = engine
+            instrument_engine(engine, name)
+
+    register(Collector(
+        "db_pool_connections", "Connection pool state (size / checkedout / overflow / checkedin).",
+        "gauge", ("engine", "state"), lambda: _pool_stats(unique),
+    ))
+    register(Collector(
+        "threadpool_tokens", "anyio default thread limiter used by sync endpoints.",
+        "gauge", ("state",), _thread_limiter_stats,
+    ))
+    for component, fn in stats.items():
+        register(Collector(
+            f"{component}_stat", f"Numeric values of {component}.stats().", "gauge", ("key",),
+            lambda fn=fn: [
+                ((key,), value) for key, value in fn().items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool)
+            ],
+        ))
+    for name, (help_text, fn) in gauges.items():
+        register(Collector(name, help_text, "gauge", (), lambda fn=fn: [((), fn())]))
+
+    app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,206 @@
+# backend/migrations.py
+# 既存DB向けのバージョン付きマイグレーション
+# create_all は「無いテーブルを作る」だけなので、列・索引の追加はここに積んでいく
+#
+#   python migrations.py                 # 未適用分を流す（init_db からも呼ばれる）
+#   python migrations.py --check-plans   # よく使うクエリが索引を使っているか確認
+import sys
+from datetime import date, datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.engine import Connection, Engine
+
+
+def _columns(conn: Connection, table: str) -> set:
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str) -> bool:
+    """列が無ければ足す（create_all で作られた新しいDBには最初からある）"""
+    if column in _columns(conn, table):
+        return False
+    conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return True
+
+
+def _m001_measurements_performed_at(conn: Connection) -> None:
+    # 初期のDBには performed_at が無い。既存行は作成日で埋める
+    if _add_column(conn, "measurements", "performed_at", "DATE"):
+        conn.exec_driver_sql(
+            "UPDATE measurements SET performed_at = date(created_at) WHERE performed_at IS NULL"
+        )
+
+
+def _m002_hot_query_indexes(conn: Connection) -> None:
+    # models.py の Index と同じ名前・列（新規DBは create_all で作成済み）
+    for sql in (
+        "CREATE INDEX IF NOT EXISTS ix_measurements_user_performed ON measurements (user_id, performed_at)",
+        "CREATE INDEX IF NOT EXISTS ix_measurements_user_created ON measurements (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_lift_logs_user_exercise_performed ON lift_logs (user_id, exercise_id, performed_at)",
+        "CREATE INDEX IF NOT EXISTS ix_workout_sessions_user_performed ON workout_sessions (user_id, performed_at)",
+        "CREATE INDEX IF NOT EXISTS ix_workout_sets_session ON workout_sets (session_id)",
+        "CREATE INDEX IF NOT EXISTS ix_team_members_user ON team_members (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_friendships_friend_user ON friendships (friend_user_id)",
+    ):
+        conn.exec_driver_sql(sql)
+
+
+def _m003_measurements_level_stamp(conn: Connection) -> None:
+    # 既存行は preset_version が NULL のまま = levels.py recompute の対象
+    _add_column(conn, "measurements", "bmi", "FLOAT")
+    _add_column(conn, "measurements", "preset_version", "VARCHAR")
+
+
+def _m004_exercises_muscle_group(conn: Connection) -> None:
+    # 既存の種目は部位未設定（NULL）のまま。PATCH /exercises/{id} で設定する
+    _add_column(conn, "exercises", "muscle_group", "VARCHAR")
+
+
+# (バージョン, 名前, 関数)。一度リリースしたものは書き換えず、後ろに足していく
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "measurements.performed_at", _m001_measurements_performed_at),
+    (2, "hot query indexes", _m002_hot_query_indexes),
+    (3, "measurements.bmi / preset_version", _m003_measurements_level_stamp),
+    (4, "exercises.muscle_group", _m004_exercises_muscle_group),
+]
+
+
+def applied_versions(conn: Connection) -> set:
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " name TEXT NOT NULL,"
+        " applied_at TEXT NOT NULL)"
+    )
+    return {v for (v,) in conn.exec_driver_sql("SELECT version FROM schema_migrations")}
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """
+    未適用のマイグレーションを1本ずつ別トランザクションで流す
+    戻り値: 今回適用したバージョン
+    """
+    done = []
+    for version, name, fn in MIGRATIONS:
+        with engine.begin() as conn:
+            # 複数プロセスが同時に起動しても二重に流さないよう、トランザクション内で確認する
+            if version in applied_versions(conn):
+                continue
+            fn(conn)
+            conn.exec_driver_sql(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, datetime.utcnow().isoformat()),
+            )
+        done.append(version)
+    return done
+
+
+# ==== クエリプランの確認 ====
+
+def _hot_queries() -> List[Tuple[str, object, str]]:
+    """(名前, 実際に使っている文, 使われるべき索引)"""
+    import analytics
+    import feed
+    import pagination
+    import prs
+    import series as series_engine
+    from models import Friendship, LiftLog, Measurement, PersonalRecord, TeamMember, WorkoutSession, WorkoutSet
+
+    records, _ = pagination.keyset_statement(
+        select(Measurement).where(Measurement.user_id == 1),
+        Measurement.performed_at, Measurement.id, None, None, str, descending=False,
+    )
+    workouts, _ = pagination.keyset_statement(
+        select(WorkoutSession).where(WorkoutSession.user_id == 1),
+        WorkoutSession.performed_at, WorkoutSession.id, None, None, str,
+    )
+    return [
+        ("records page", records, "ix_measurements_user_performed"),
+        ("team series", series_engine.team_series_stmt(1, "level"), "ix_measurements_user_created"),
+        ("workouts page", workouts, "ix_workout_sessions_user_performed"),
+        ("workout sets", select(WorkoutSet).where(WorkoutSet.session_id.in_([1, 2])), "ix_workout_sets_session"),
+        (
+            "lift logs",
+            select(LiftLog)
+            .where(LiftLog.user_id == 1, LiftLog.exercise_id == 1)
+            .order_by(LiftLog.performed_at),
+            "ix_lift_logs_user_exercise_performed",
+        ),
+        ("my teams", select(TeamMember).where(TeamMember.user_id == 1), "ix_team_members_user"),
+        (
+            "friends",
+            select(Friendship).where(or_(Friendship.user_id == 1, Friendship.friend_user_id == 1)),
+            "ix_friendships_friend_user",
+        ),
+        ("lift series", series_engine.lift_series_stmt(1, 1), "sqlite_autoindex_lift_daily_bests"),
+        ("lift series (many)", series_engine.lift_series_many_stmt(1, [1, 2, 3]), "sqlite_autoindex_lift_daily_bests"),
+        (
+            "recent PRs",
+            select(PersonalRecord).where(PersonalRecord.user_id == 1)
+            .order_by(PersonalRecord.achieved_on.desc(), PersonalRecord.id.desc()).limit(20),
+            "ix_personal_records_user_achieved",
+        ),
+        ("PR tonnage", prs.session_tonnage_stmt([1, 2]), "ix_workout_sets_session"),
+        (
+            "training volume",
+            analytics.volume_stmt(1, "week", date(2024, 1, 1), date(2024, 12, 31)),
+            "sqlite_autoindex_training_volumes",
+        ),
+        (
+            "training volume (muscle group)",
+            analytics.volume_stmt(1, "month", by="muscle_group"),
+            "sqlite_autoindex_training_volumes",
+        ),
+        (
+            "friend feed",
+            feed.friend_events_stmt(1, ("2024-06-01 00:00:00", feed.KIND_WORKOUT, 1), 51),
+            "ix_workout_sessions_user_performed",
+        ),
+        ("fan-out timeline", feed.timeline_stmt(1, None, 51), "ix_feed_entries_owner_at"),
+    ]
+
+
+# 索引の順のまま流すクエリ（プランに ORDER BY 用のソートが出たら NG）
+_INDEX_ORDERED = {
+    "records page", "team series", "workouts page", "lift logs",
+    "lift series", "lift series (many)", "recent PRs", "training volume", "fan-out timeline",
+}
+
+
+def explain(conn: Connection, stmt) -> List[str]:
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    # プランは値に依存しないので、バインド値は全部 NULL でよい
+    params = (None,) * len(compiled.positiontup or ())
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params)
+    return [row[3] for row in rows]
+
+
+def check_query_plans(engine: Engine) -> List[Tuple[str, bool, List[str]]]:
+    """よく使うクエリごとに (名前, 期待した索引を使っているか（ソート無しか）, プラン) を返す"""
+    results = []
+    with engine.connect() as conn:
+        for name, stmt, index in _hot_queries():
+            plan = explain(conn, stmt)
+            ok = any(index in line for line in plan)
+            if name in _INDEX_ORDERED:
+                ok = ok and not any("TEMP B-TREE FOR ORDER BY" in line for line in plan)
+            results.append((name, ok, plan))
+    return results
+
+
+if __name__ == "__main__":
+    from db import init_db, write_engine
+
+    init_db()
+    if "--check-plans" in sys.argv[1:]:
+        failed = 0
+        for name, ok, plan in check_query_plans(write_engine):
+            print(f"[{'ok' if ok else 'NG'}] {name}")
+            for line in plan:
+                print(f"    {line}")
+            failed += not ok
+        sys.exit(1 if failed else 0)
+
+    with write_engine.connect() as conn:
+        print("applied:", sorted(applied_versions(conn)))
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from datetime import date, datetime
 import secrets
 
 from db import Base
@@ -40,12 +40,22 @@ class Measurement(Base):
     weight = Column(Float)
     fat = Column(Float)
     level = Column(Float)
+    bmi = Column(Float)
+    # level を計算したときのプリセット目標のバージョン（levels.PRESET_VERSIONS）
+    # 目標が変わると一致しなくなるので、levels.py recompute で計算し直す
+    preset_version = Column(String)
     performed_at = Column(Date, nullable=False)
 
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="measurements")
 
+    # 既存DBへの追加は migrations.py（create_all は既存テーブルに索引を足さない）
+    __table_args__ = (
+        Index("ix_measurements_user_performed", "user_id", "performed_at"),
+        Index("ix_measurements_user_created", "user_id", "created_at"),
+    )
+
 
 class FriendRequest(Base):
     __tablename__ = "friend_requests"
@@ -54,7 +64,7 @@ class FriendRequest(Base):
     from_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     to_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     status = Column(String, default="pending")  # pending/accepted/rejected
-    performed_at = Column(Date, nullable=False)
+    performed_at = Column(Date, nullable=False, default=date.today)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     from_user = relationship("User", foreign_keys=[from_user_id])
@@ -81,6 +91,8 @@ class Friendship(Base):
 
     __table_args__ = (
         UniqueConstraint("user_id", "friend_user_id", name="uq_friendship_pair"),
+        # 「自分が friend_user_id 側」の逆引き用
+        Index("ix_friendships_friend_user", "friend_user_id"),
     )
 
 import secrets
@@ -125,6 +137,7 @@ class TeamMember(Base):
 
     __table_args__ = (
         UniqueConstraint("team_id", "user_id", name="uq_team_member"),
+        Index("ix_team_members_user", "user_id"),
     )
 
     from sqlalchemy import Date
@@ -135,6 +148,8 @@ class Exercise(Base):
     name = Column(String, nullable=False, index=True)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # 部位（analytics.MUSCLE_GROUPS のどれか。未設定なら None）
+    muscle_group = Column(String)
 
 class LiftLog(Base):
     __tablename__ = "lift_logs"
@@ -148,6 +163,10 @@ class LiftLog(Base):
 
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_lift_logs_user_exercise_performed", "user_id", "exercise_id", "performed_at"),
+    )
+
 def epley_1rm(weight: float, reps: int) -> float:
     reps = max(1, reps)
     return weight * (1 + reps / 30.0)
@@ -166,6 +185,10 @@ class WorkoutSession(Base):
 
     sets = relationship("WorkoutSet", back_populates="session", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_workout_sessions_user_performed", "user_id", "performed_at"),
+    )
+
 
 class WorkoutSet(Base):
     __tablename__ = "workout_sets"
@@ -179,3 +202,135 @@ class WorkoutSet(Base):
     reps = Column(Integer, nullable=False)
 
     session = relationship("WorkoutSession", back_populates="sets")
+
+    __table_args__ = (
+        Index("ix_workout_sets_session", "session_id"),
+    )
+
+
+class LiftDailyBest(Base):
+    """
+    (ユーザー, 種目, 日) ごとの推定1RM最大値・セット数・総挙上量(kg×回)
+    LiftLog を書き込むトランザクションの中で一緒に更新する（rollups.py）
+    """
+    __tablename__ = "lift_daily_bests"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=False)
+    day = Column(Date, nullable=False)
+
+    best_1rm = Column(Float, nullable=False)
+    set_count = Column(Integer, nullable=False, default=0)
+    tonnage = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # (user_id, exercise_id, day) の範囲スキャンでグラフを引く
+        UniqueConstraint("user_id", "exercise_id", "day", name="uq_lift_daily_best"),
+    )
+
+
+class PersonalRecord(Base):
+    """
+    (ユーザー, 種目, 記録の種類) ごとの自己ベスト（prs.py）
+    kind: "1RM"〜"12RM"（ちょうどその回数での最高重量）/ "e1RM"（推定1RM）/ "tonnage"（1セッションの総挙上量）
+    セットを書き込むトランザクションの中で、上回ったときだけ更新する
+    """
+    __tablename__ = "personal_records"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=False)
+    kind = Column(String, nullable=False)
+
+    value = Column(Float, nullable=False)
+    # 記録を出したセット（RM・e1RM のとき）/ セッション（tonnage のとき）
+    weight_kg = Column(Float)
+    reps = Column(Integer)
+    session_id = Column(Integer)
+    achieved_on = Column(Date, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "exercise_id", "kind", name="uq_personal_record"),
+        # /prs/recent（新しい順）
+        Index("ix_personal_records_user_achieved", "user_id", "achieved_on"),
+    )
+
+
+class TrainingVolume(Base):
+    """
+    (ユーザー, 種目, 期間) ごとのセット数・回数・総挙上量(kg×回)（workout_sets の集計）
+    granularity: "day" / "week"（ISO 週。period_start は月曜）/ "month"（period_start は1日）
+    ワークアウトを書き込むトランザクションの中で一緒に足し込む（rollups.py）
+    """
+    __tablename__ = "training_volumes"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    exercise_id = Column(Integer, ForeignKey("exercises.id"), nullable=False)
+    granularity = Column(String, nullable=False)
+    period_start = Column(Date, nullable=False)
+
+    set_count = Column(Integer, nullable=False, default=0)
+    reps = Column(Integer, nullable=False, default=0)
+    tonnage = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # /analytics/volume は (user_id, granularity, period_start) の範囲スキャン
+        UniqueConstraint("user_id", "granularity", "period_start", "exercise_id", name="uq_training_volume"),
+    )
+
+
+class ActivityMonth(Base):
+    """
+    ユーザーの「その月にトレーニングした日」を 31bit のビットマップで持つ
+    bit (日-1) が立っていればその日に workout がある（カレンダー表示用）
+    """
+    __tablename__ = "activity_months"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    year_month = Column(Integer, nullable=False)  # 例: 202401
+    days_mask = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "year_month", name="uq_activity_month"),
+    )
+
+
+class FeedEntry(Base):
+    """
+    フレンドフィードの fan-out-on-write 用タイムライン（MUSCLE_FEED_FANOUT=1 のときだけ書く）
+    owner のフレンド（actor）のワークアウト・記録を、書き込み時に1行ずつ配っておく
+    """
+    __tablename__ = "feed_entries"
+
+    id = Column(Integer, primary_key=True)
+    owner_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    actor_user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)      # workout / record
+    item_id = Column(Integer, nullable=False)  # workout_sessions.id / measurements.id
+    # 並び順のキー。元の performed_at を DB に入っている文字列のまま持つ
+    at = Column(String, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("owner_user_id", "kind", "item_id", name="uq_feed_entry"),
+        Index("ix_feed_entries_owner_at", "owner_user_id", "at", "kind", "item_id"),
+    )
+
+
+class DataVersion(Base):
+    """
+    データのバージョン番号（書き込みのたびに +1、versions.py）
+    一覧系 GET の ETag に使い、変わっていなければ 304 を返す
+    """
+    __tablename__ = "data_versions"
+
+    id = Column(Integer, primary_key=True)
+    scope = Column(String, nullable=False)    # user / team / catalog
+    ref_id = Column(Integer, nullable=False)  # user_id / team_id / 0
+    version = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("scope", "ref_id", name="uq_data_version"),
+    )
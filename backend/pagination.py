@@ -0,0 +1,108 @@
+# backend/pagination.py
+# (performed_at, id) のカーソルによるキーセットページング
+# OFFSET と違い、何ページ目でも「インデックスを途中から読む」だけで済む
+import base64
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 次ページのカーソルを返すレスポンスヘッダー
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_key(*parts) -> str:
+    """複数の値を1本のカーソル文字列にする"""
+    raw = "|".join(str(p) for p in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_key(cursor: str, count: int) -> list:
+    """encode_key の逆。要素数が合わなければ 400"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(parts) != count:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return parts
+
+
+def encode_cursor(t, row_id: int) -> str:
+    return encode_key(t.isoformat(), row_id)
+
+
+def decode_cursor(cursor: str, parse: Callable) -> tuple:
+    t_str, id_str = decode_key(cursor, 2)
+    try:
+        return parse(t_str), int(id_str)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    if not limit or limit <= 0:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def keyset_statement(
+    stmt,
+    time_col,
+    id_col,
+    cursor: Optional[str],
+    limit: Optional[int],
+    parse: Callable,
+    descending: bool = True,
+):
+    """
+    stmt（select() / Query）に「カーソルより後ろ・1ページ+1件」の条件を付ける
+    戻り値: (文, ページサイズ)
+    """
+    limit = clamp_limit(limit)
+
+    if cursor:
+        t, rid = decode_cursor(cursor, parse)
+        if descending:
+            stmt = stmt.filter(or_(time_col < t, and_(time_col == t, id_col < rid)))
+        else:
+            stmt = stmt.filter(or_(time_col > t, and_(time_col == t, id_col > rid)))
+
+    if descending:
+        stmt = stmt.order_by(time_col.desc(), id_col.desc())
+    else:
+        stmt = stmt.order_by(time_col.asc(), id_col.asc())
+
+    # 1件多く取って「次があるか」を判定する
+    return stmt.limit(limit + 1), limit
+
+
+def keyset_result(rows: list, limit: int, time_col, id_col) -> Tuple[list, Optional[str]]:
+    """取得した行をページ分に切り、次ページのカーソルを作る"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_col.key), getattr(last, id_col.key))
+    return rows, next_cursor
+
+
+def keyset_page(
+    query,
+    time_col,
+    id_col,
+    cursor: Optional[str],
+    limit: Optional[int],
+    parse: Callable,
+    descending: bool = True,
+) -> Tuple[list, Optional[str]]:
+    """
+    query を (time_col, id_col) 順に1ページ分だけ取得する
+    戻り値: (行のリスト, 次ページのカーソル or None)
+    """
+    query, limit = keyset_statement(query, time_col, id_col, cursor, limit, parse, descending)
+    return keyset_result(query.all(), limit, time_col, id_col)
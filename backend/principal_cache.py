@@ -0,0 +1,107 @@
+# backend/principal_cache.py
+# 検証済みトークン → ユーザーの対応を覚えておくキャッシュ
+# 同じトークンでの連続アクセスでは jwt.decode も users の SELECT も省略できる
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class PrincipalCache:
+    """
+    上限件数つきの LRU + TTL キャッシュ
+    値はユーザーごとにも索引しておき、ユーザー更新時にまとめて無効化できるようにする
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl_seconds: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+
+        # token -> (期限(monotonic), user_id, value)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # user_id -> そのユーザーのトークン集合
+        self._by_user: dict = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user_id, value = entry
+            if expires_at <= now:
+                self._drop(token, user_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return value
+
+    def put(self, token: str, user_id: int, value: Any, token_exp: Optional[float] = None) -> None:
+        """
+        token_exp: JWT の exp（UNIX 秒）。トークン自体の期限を超えては保持しない
+        """
+        ttl = self.ttl_seconds
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            old = self._entries.pop(token, None)
+            if old is not None:
+                self._unindex(token, old[1])
+
+            self._entries[token] = (time.monotonic() + ttl, user_id, value)
+            self._by_user.setdefault(user_id, set()).add(token)
+
+            while len(self._entries) > self.maxsize:
+                oldest, (_, oldest_user, _) = self._entries.popitem(last=False)
+                self._unindex(oldest, oldest_user)
+                self.evictions += 1
+
+    def invalidate_token(self, token: str) -> None:
+        """トークン失効（ログアウト・revocation）用"""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                self._drop(token, entry[1])
+
+    def invalidate_user(self, user_id: int) -> None:
+        """ユーザー情報の更新・削除時に、そのユーザーの全トークンを捨てる"""
+        with self._lock:
+            for token in self._by_user.pop(user_id, set()):
+                self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    # --- 以下はロックを持った状態で呼ぶ ---
+    def _drop(self, token: str, user_id: int) -> None:
+        self._entries.pop(token, None)
+        self._unindex(token, user_id)
+
+    def _unindex(self, token: str, user_id: int) -> None:
+        tokens = self._by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user_id]
@@ -0,0 +1,253 @@
+# backend/prs.py
+# 自己ベスト（種目ごとの 1〜12RM・推定1RM・1セッションの総挙上量）
+# personal_records に (ユーザー, 種目, 種類) ごとに1行だけ持ち、セットを書くたびに
+# 「書いたセットの種目の行を読む → 上回った行だけ upsert」する（過去のログは読まない）
+# ログは追記だけ（削除・編集が無い）なので、最大値を持ち回すだけで正しい
+#
+# 作り直し: python rollups.py backfill（REBUILDERS に入っている）
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import String, and_, cast, func, literal, null, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import Exercise, LiftLog, PersonalRecord, WorkoutSession, WorkoutSet, epley_1rm
+
+# この回数までの RM を持つ（それより多い回数のセットは推定1RM・総挙上量だけに効く）
+MAX_REP_MAX = 12
+E1RM = "e1RM"
+TONNAGE = "tonnage"
+REP_MAX_KINDS = [f"{n}RM" for n in range(1, MAX_REP_MAX + 1)]
+# /prs の並び順
+KINDS = (*REP_MAX_KINDS, E1RM, TONNAGE)
+_KIND_ORDER = {kind: i for i, kind in enumerate(KINDS)}
+
+RECENT_LIMIT = 20
+MAX_RECENT_LIMIT = 100
+
+_RECORD_COLUMNS = ["user_id", "exercise_id", "kind", "value", "weight_kg", "reps", "session_id", "achieved_on"]
+
+
+def _offer(best: dict, key: tuple, value: float, record: dict) -> None:
+    """key の候補より良ければ置き換える（同じ値なら古い日付を残す。rebuild と同じ選び方）"""
+    cur = best.get(key)
+    if cur is None or value > cur["value"] or (
+        value == cur["value"] and record["achieved_on"] < cur["achieved_on"]
+    ):
+        best[key] = {"value": value, **record}
+
+
+def session_tonnage_stmt(session_ids: Iterable[int]):
+    """セッション×種目ごとの総挙上量（ix_workout_sets_session でそのセッションのセットだけ読む）"""
+    return (
+        select(
+            WorkoutSet.session_id,
+            WorkoutSet.exercise_id,
+            func.sum(WorkoutSet.weight_kg * WorkoutSet.reps),
+            WorkoutSession.performed_at,
+        )
+        .join(WorkoutSession, WorkoutSession.id == WorkoutSet.session_id)
+        .where(WorkoutSet.session_id.in_(list(session_ids)))
+        .group_by(WorkoutSet.session_id, WorkoutSet.exercise_id)
+    )
+
+
+def add_sets(
+    db: Session, user_id: int, lifts: Iterable[dict], session_ids: Iterable[int] = ()
+) -> List[dict]:
+    """
+    書き込んだセットを自己ベストへ反映し、更新した記録を返す
+    lifts: rollups.add_lift_sets と同じ {"exercise_id", "performed_at"(date), "weight_kg", "reps"} の dict
+    session_ids: セットを書いたセッション（セットの insert 後に呼ぶ。種目ごとの総挙上量を比べる）
+    戻り値: [{"exercise_id", "kind", "value", ..., "previous"}]（previous は初記録なら None）
+    commit は呼び出し側
+    """
+    best: Dict[tuple, dict] = {}
+    for lift in lifts:
+        ex_id, weight, reps = lift["exercise_id"], lift["weight_kg"], lift["reps"]
+        record = {"weight_kg": weight, "reps": reps, "session_id": None, "achieved_on": lift["performed_at"]}
+        if 1 <= reps <= MAX_REP_MAX:
+            _offer(best, (ex_id, f"{reps}RM"), weight, record)
+        _offer(best, (ex_id, E1RM), epley_1rm(weight, reps), record)
+
+    session_ids = set(session_ids)
+    if session_ids:
+        for session_id, ex_id, tonnage, performed_at in db.execute(session_tonnage_stmt(session_ids)):
+            _offer(best, (ex_id, TONNAGE), tonnage, {
+                "weight_kg": None, "reps": None, "session_id": session_id,
+                "achieved_on": performed_at.date(),
+            })
+
+    if not best:
+        return []
+
+    # 触った種目の今の記録だけ読む（種目あたり最大 len(KINDS) 行）
+    current = {
+        (ex_id, kind): (value, achieved_on)
+        for ex_id, kind, value, achieved_on in db.execute(
+            select(
+                PersonalRecord.exercise_id, PersonalRecord.kind,
+                PersonalRecord.value, PersonalRecord.achieved_on,
+            ).where(
+                PersonalRecord.user_id == user_id,
+                PersonalRecord.exercise_id.in_({ex_id for ex_id, _ in best}),
+            )
+        )
+    }
+    improved, writes = [], []
+    for (ex_id, kind), cand in best.items():
+        previous, previous_on = current.get((ex_id, kind), (None, None))
+        row = {"user_id": user_id, "exercise_id": ex_id, "kind": kind, **cand}
+        if previous is None or cand["value"] > previous:
+            improved.append({"exercise_id": ex_id, "kind": kind, **cand, "previous": previous})
+            writes.append(row)
+        elif cand["value"] == previous and cand["achieved_on"] < previous_on:
+            # 過去の日付で同じ値を記録した（取り込み等）。新記録ではないが、初めて出した日に直す
+            writes.append(row)
+    if not writes:
+        return []
+
+    stmt = sqlite_insert(PersonalRecord)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "exercise_id", "kind"],
+        set_={c: stmt.excluded[c] for c in _RECORD_COLUMNS[3:]},
+        # 同時に書かれても悪い記録で上書きしない
+        where=or_(
+            stmt.excluded.value > PersonalRecord.value,
+            and_(
+                stmt.excluded.value == PersonalRecord.value,
+                stmt.excluded.achieved_on < PersonalRecord.achieved_on,
+            ),
+        ),
+    )
+    db.execute(stmt, writes)
+    improved.sort(key=lambda r: (r["exercise_id"], _KIND_ORDER[r["kind"]]))
+    return improved
+
+
+# ==== 読み取り ====
+
+def _records_stmt(user_id: int):
+    return (
+        select(PersonalRecord, Exercise.name)
+        .join(Exercise, Exercise.id == PersonalRecord.exercise_id)
+        .where(PersonalRecord.user_id == user_id)
+    )
+
+
+def _out(pr: PersonalRecord, name: str) -> dict:
+    return {
+        "exercise_id": pr.exercise_id,
+        "exercise_name": name,
+        "kind": pr.kind,
+        "value": pr.value,
+        "weight_kg": pr.weight_kg,
+        "reps": pr.reps,
+        "session_id": pr.session_id,
+        "achieved_on": pr.achieved_on,
+    }
+
+
+def list_records(db: Session, user_id: int, exercise_id: Optional[int] = None) -> List[dict]:
+    """種目順・種類順（1RM〜12RM, e1RM, tonnage）の全記録"""
+    stmt = _records_stmt(user_id)
+    if exercise_id is not None:
+        stmt = stmt.where(PersonalRecord.exercise_id == exercise_id)
+    rows = [_out(pr, name) for pr, name in db.execute(stmt)]
+    rows.sort(key=lambda r: (r["exercise_id"], _KIND_ORDER.get(r["kind"], len(KINDS))))
+    return rows
+
+
+def recent_records(db: Session, user_id: int, limit: int = RECENT_LIMIT) -> List[dict]:
+    """達成日の新しい順（ix_personal_records_user_achieved を後ろから読む）"""
+    if limit <= 0 or limit > MAX_RECENT_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be 1..{MAX_RECENT_LIMIT}")
+    stmt = (
+        _records_stmt(user_id)
+        .order_by(PersonalRecord.achieved_on.desc(), PersonalRecord.id.desc())
+        .limit(limit)
+    )
+    return [_out(pr, name) for pr, name in db.execute(stmt)]
+
+
+# ==== 作り直し ====
+
+def _insert_best(db: Session, ranked) -> None:
+    """ranked（rn 付きの副問い合わせ）の rn = 1 の行を personal_records へ"""
+    db.execute(
+        PersonalRecord.__table__.insert().from_select(
+            _RECORD_COLUMNS,
+            select(*(ranked.c[c] for c in _RECORD_COLUMNS)).where(ranked.c.rn == 1),
+        )
+    )
+
+
+def rebuild_personal_records(db: Session) -> int:
+    """
+    lift_logs / workout_sets から作り直す（初回投入・不整合時用）
+    (ユーザー, 種目, 種類) ごとに最大の1行（同じ値なら古い日）をウィンドウ関数で選ぶ
+    """
+    db.query(PersonalRecord).delete(synchronize_session=False)
+
+    def ranked(value, partition, where=None, **columns):
+        stmt = select(
+            LiftLog.user_id,
+            LiftLog.exercise_id,
+            value.label("value"),
+            LiftLog.weight_kg,
+            LiftLog.reps,
+            null().label("session_id"),
+            LiftLog.performed_at.label("achieved_on"),
+            func.row_number().over(
+                partition_by=partition,
+                order_by=(value.desc(), LiftLog.performed_at, LiftLog.id),
+            ).label("rn"),
+            *(col.label(name) for name, col in columns.items()),
+        )
+        if where is not None:
+            stmt = stmt.where(where)
+        return stmt.subquery()
+
+    # 1〜12RM（その回数ちょうどのセットの最高重量）
+    _insert_best(db, ranked(
+        LiftLog.weight_kg,
+        (LiftLog.user_id, LiftLog.exercise_id, LiftLog.reps),
+        LiftLog.reps.between(1, MAX_REP_MAX),
+        kind=cast(LiftLog.reps, String) + literal("RM"),
+    ))
+    # 推定1RM（epley_1rm と同じ式。reps は最低1として扱う）
+    _insert_best(db, ranked(
+        LiftLog.weight_kg * (1 + func.max(LiftLog.reps, 1) / 30.0),
+        (LiftLog.user_id, LiftLog.exercise_id),
+        kind=literal(E1RM),
+    ))
+
+    # 1セッションの総挙上量（セッション×種目で集計してから、ユーザー×種目ごとの最大）
+    per_session = (
+        select(
+            WorkoutSession.user_id,
+            WorkoutSet.exercise_id,
+            WorkoutSet.session_id,
+            func.sum(WorkoutSet.weight_kg * WorkoutSet.reps).label("value"),
+            func.date(WorkoutSession.performed_at).label("achieved_on"),
+        )
+        .join(WorkoutSession, WorkoutSession.id == WorkoutSet.session_id)
+        .group_by(WorkoutSet.session_id, WorkoutSet.exercise_id)
+        .subquery()
+    )
+    _insert_best(db, select(
+        per_session.c.user_id,
+        per_session.c.exercise_id,
+        literal(TONNAGE).label("kind"),
+        per_session.c.value,
+        null().label("weight_kg"),
+        null().label("reps"),
+        per_session.c.session_id,
+        per_session.c.achieved_on,
+        func.row_number().over(
+            partition_by=(per_session.c.user_id, per_session.c.exercise_id),
+            order_by=(per_session.c.value.desc(), per_session.c.achieved_on, per_session.c.session_id),
+        ).label("rn"),
+    ).subquery())
+    return db.query(func.count(PersonalRecord.id)).scalar()
@@ -0,0 +1,280 @@
+# backend/rollups.py
+# 書き込み時に一緒に更新する集計テーブル（読み取り時に生ログを全件なめないため）
+#
+# 既存DBへの初回投入:
+#   cd backend
+#   python rollups.py backfill
+import argparse
+from datetime import date, timedelta
+from typing import Iterable, List
+
+from sqlalchemy import Integer, cast, distinct, func, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import feed
+import prs
+import versions
+from models import ActivityMonth, LiftDailyBest, LiftLog, TrainingVolume, WorkoutSession, WorkoutSet, epley_1rm
+
+
+def add_lift_sets(db: Session, rows: Iterable[dict]) -> None:
+    """
+    LiftLog に書いたセットを日別ベスト1RMのロールアップへ反映する
+    rows: {"user_id", "exercise_id", "performed_at", "weight_kg", "reps"} の dict
+    commit は呼び出し側（LiftLog と同じトランザクション）
+    """
+    # 同じ日・同じ種目のセットは先にまとめて、キーごとに1回だけ upsert する
+    agg = {}
+    for r in rows:
+        key = (r["user_id"], r["exercise_id"], r["performed_at"])
+        est = epley_1rm(r["weight_kg"], r["reps"])
+        cur = agg.get(key)
+        if cur is None:
+            agg[key] = [est, 1, r["weight_kg"] * r["reps"]]
+        else:
+            cur[0] = max(cur[0], est)
+            cur[1] += 1
+            cur[2] += r["weight_kg"] * r["reps"]
+
+    if not agg:
+        return
+
+    stmt = sqlite_insert(LiftDailyBest)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "exercise_id", "day"],
+        set_={
+            # SQLite の2引数 max() はスカラー関数
+            "best_1rm": func.max(LiftDailyBest.best_1rm, stmt.excluded.best_1rm),
+            "set_count": LiftDailyBest.set_count + stmt.excluded.set_count,
+            "tonnage": LiftDailyBest.tonnage + stmt.excluded.tonnage,
+        },
+    )
+    db.execute(stmt, [
+        {
+            "user_id": uid,
+            "exercise_id": ex_id,
+            "day": day,
+            "best_1rm": best,
+            "set_count": count,
+            "tonnage": tonnage,
+        }
+        for (uid, ex_id, day), (best, count, tonnage) in agg.items()
+    ])
+
+
+def rebuild_lift_daily_bests(db: Session) -> int:
+    """
+    lift_logs から日別ベストを作り直す（初回投入・不整合時用）
+    1本の INSERT ... SELECT ... GROUP BY で済ませる
+    """
+    db.query(LiftDailyBest).delete(synchronize_session=False)
+
+    # epley_1rm と同じ式（reps は最低1として扱う）
+    est = LiftLog.weight_kg * (1 + func.max(LiftLog.reps, 1) / 30.0)
+    select_stmt = (
+        db.query(
+            LiftLog.user_id,
+            LiftLog.exercise_id,
+            LiftLog.performed_at,
+            func.max(est),
+            func.count(LiftLog.id),
+            func.sum(LiftLog.weight_kg * LiftLog.reps),
+        )
+        .group_by(LiftLog.user_id, LiftLog.exercise_id, LiftLog.performed_at)
+        .statement
+    )
+    db.execute(
+        LiftDailyBest.__table__.insert().from_select(
+            ["user_id", "exercise_id", "day", "best_1rm", "set_count", "tonnage"],
+            select_stmt,
+        )
+    )
+    return db.query(func.count(LiftDailyBest.id)).scalar()
+
+
+# ==== 期間別のトレーニング量（day / ISO week / month） ====
+
+VOLUME_GRANULARITIES = ("day", "week", "month")
+
+
+def period_start(d: date, granularity: str) -> date:
+    """d を含む期間の初日（week は ISO 週の月曜、month は1日）"""
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    return d
+
+
+def add_training_volume(db: Session, rows: Iterable[dict]) -> None:
+    """
+    ワークアウトのセットを期間別のトレーニング量へ足し込む（3粒度まとめて1回の executemany）
+    rows: add_lift_sets と同じ dict（workout_sets から作ったものだけ渡す。POST /lifts の単発ログは入れない）
+    commit は呼び出し側
+    """
+    agg = {}
+    for r in rows:
+        for granularity in VOLUME_GRANULARITIES:
+            key = (r["user_id"], r["exercise_id"], granularity, period_start(r["performed_at"], granularity))
+            cur = agg.setdefault(key, [0, 0, 0.0])
+            cur[0] += 1
+            cur[1] += r["reps"]
+            cur[2] += r["weight_kg"] * r["reps"]
+
+    if not agg:
+        return
+
+    stmt = sqlite_insert(TrainingVolume)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "granularity", "period_start", "exercise_id"],
+        set_={
+            "set_count": TrainingVolume.set_count + stmt.excluded.set_count,
+            "reps": TrainingVolume.reps + stmt.excluded.reps,
+            "tonnage": TrainingVolume.tonnage + stmt.excluded.tonnage,
+        },
+    )
+    db.execute(stmt, [
+        {
+            "user_id": uid,
+            "exercise_id": ex_id,
+            "granularity": granularity,
+            "period_start": start,
+            "set_count": count,
+            "reps": reps,
+            "tonnage": tonnage,
+        }
+        for (uid, ex_id, granularity, start), (count, reps, tonnage) in agg.items()
+    ])
+
+
+def rebuild_training_volumes(db: Session) -> int:
+    """workout_sets から期間別のトレーニング量を作り直す（粒度ごとに INSERT ... SELECT ... GROUP BY）"""
+    db.query(TrainingVolume).delete(synchronize_session=False)
+
+    # period_start と同じ区切り（'weekday 0' で次の日曜（日曜ならその日）→ 6日戻すと月曜）
+    starts = {
+        "day": func.date(WorkoutSession.performed_at),
+        "week": func.date(WorkoutSession.performed_at, "weekday 0", "-6 days"),
+        "month": func.date(WorkoutSession.performed_at, "start of month"),
+    }
+    for granularity, start in starts.items():
+        select_stmt = (
+            db.query(
+                WorkoutSession.user_id,
+                WorkoutSet.exercise_id,
+                literal(granularity),
+                start,
+                func.count(WorkoutSet.id),
+                func.sum(WorkoutSet.reps),
+                func.sum(WorkoutSet.weight_kg * WorkoutSet.reps),
+            )
+            .join(WorkoutSession, WorkoutSession.id == WorkoutSet.session_id)
+            .group_by(WorkoutSession.user_id, WorkoutSet.exercise_id, start)
+            .statement
+        )
+        db.execute(
+            TrainingVolume.__table__.insert().from_select(
+                ["user_id", "exercise_id", "granularity", "period_start", "set_count", "reps", "tonnage"],
+                select_stmt,
+            )
+        )
+    return db.query(func.count(TrainingVolume.id)).scalar()
+
+
+def year_month(d: date) -> int:
+    return d.year * 100 + d.month
+
+
+def mark_active_days(db: Session, user_id: int, days: Iterable[date]) -> None:
+    """
+    workout をした日をカレンダー用ビットマップに立てる（OR で足すだけ）
+    commit は呼び出し側
+    """
+    masks = {}
+    for d in days:
+        ym = year_month(d)
+        masks[ym] = masks.get(ym, 0) | (1 << (d.day - 1))
+
+    if not masks:
+        return
+
+    stmt = sqlite_insert(ActivityMonth)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "year_month"],
+        set_={"days_mask": ActivityMonth.days_mask.op("|")(stmt.excluded.days_mask)},
+    )
+    db.execute(stmt, [
+        {"user_id": user_id, "year_month": ym, "days_mask": mask}
+        for ym, mask in masks.items()
+    ])
+
+
+def active_days(db: Session, user_id: int, year: int, month: int) -> List[int]:
+    """その月にトレーニングした日（1〜31）のリスト"""
+    mask = (
+        db.query(ActivityMonth.days_mask)
+        .filter(
+            ActivityMonth.user_id == user_id,
+            ActivityMonth.year_month == year * 100 + month,
+        )
+        .scalar()
+    ) or 0
+    return [d + 1 for d in range(31) if mask >> d & 1]
+
+
+def rebuild_activity_months(db: Session) -> int:
+    """workout_sessions からカレンダー用ビットマップを作り直す"""
+    db.query(ActivityMonth).delete(synchronize_session=False)
+
+    ym = cast(func.strftime("%Y%m", WorkoutSession.performed_at), Integer)
+    day = cast(func.strftime("%d", WorkoutSession.performed_at), Integer)
+    bit = literal(1).op("<<")(day - 1)
+    # 同じ日の重複は DISTINCT で消えるので、SUM がそのまま OR になる
+    select_stmt = (
+        db.query(WorkoutSession.user_id, ym, func.sum(distinct(bit)))
+        .group_by(WorkoutSession.user_id, ym)
+        .statement
+    )
+    db.execute(
+        ActivityMonth.__table__.insert().from_select(
+            ["user_id", "year_month", "days_mask"],
+            select_stmt,
+        )
+    )
+    return db.query(func.count(ActivityMonth.id)).scalar()
+
+
+# backfill で作り直す集計テーブル（テーブル名, 再構築関数）
+REBUILDERS = [
+    ("lift_daily_bests", rebuild_lift_daily_bests),
+    ("activity_months", rebuild_activity_months),
+    ("training_volumes", rebuild_training_volumes),
+    ("personal_records", prs.rebuild_personal_records),
+    ("feed_entries", feed.rebuild_feed_entries),  # MUSCLE_FEED_FANOUT=1 のときだけ
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="集計テーブルの再構築")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+
+    from db import SessionLocal, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        for table, rebuild in REBUILDERS:
+            n = rebuild(db)
+            db.commit()
+            print(f"{table}: {n} rows")
+        # 集計から作るレスポンス（/lifts/series 等）の ETag を変える
+        versions.bump_scope(db, versions.USER)
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
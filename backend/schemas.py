@@ -35,7 +35,8 @@ class RecordIn(BaseModel):
     height: float
     weight: float
     fat: float
-    level: float
+    # level はサーバー側で計算して保存する（送られてきても使わない。古いクライアント向けに残している）
+    level: Optional[float] = None
     performed_at: date
 
 class RecordOut(BaseModel):
@@ -44,7 +45,8 @@ class RecordOut(BaseModel):
     height: float
     weight: float
     fat: float
-    level: float
+    level: Optional[float] = None   # 目標の無いプリセット（custom）では None
+    bmi: Optional[float] = None
     created_at: datetime
     performed_at: date
 
@@ -136,6 +138,24 @@ class WorkoutSessionOut(BaseModel):
     class Config:
         from_attributes = True
 
+# --- Personal records ---
+class PersonalRecordOut(BaseModel):
+    exercise_id: int
+    exercise_name: str
+    kind: str                          # "1RM"〜"12RM" / "e1RM" / "tonnage"
+    value: float                       # RM は重量、e1RM は推定1RM、tonnage は kg×回
+    weight_kg: Optional[float] = None  # 記録を出したセット（RM・e1RM）
+    reps: Optional[int] = None
+    session_id: Optional[int] = None   # 記録を出したセッション（tonnage）
+    achieved_on: date
+
+class NewPersonalRecordOut(PersonalRecordOut):
+    previous: Optional[float] = None   # 初記録なら None
+
+class WorkoutCreatedOut(WorkoutSessionOut):
+    """POST /workouts の結果（このワークアウトで更新した自己ベスト付き）"""
+    new_prs: List[NewPersonalRecordOut] = []
+
 from pydantic import BaseModel
 from datetime import date
 from typing import List
@@ -143,11 +163,16 @@ from typing import List
 # --- Exercise ---
 class ExerciseCreate(BaseModel):
     name: str
+    muscle_group: Optional[str] = None   # analytics.MUSCLE_GROUPS のどれか
+
+class ExerciseUpdate(BaseModel):
+    muscle_group: Optional[str] = None   # None / "" で未設定に戻す
 
 class ExerciseOut(BaseModel):
     id: int
     name: str
     created_by: int
+    muscle_group: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -178,3 +203,48 @@ class LiftSeriesOut(BaseModel):
     exercise_id: int
     exercise_name: str
     series: List[SeriesPoint]
+
+class LiftSeriesListOut(BaseModel):
+    """/lifts/series?exercise_ids=1,2,3 の結果（指定順）"""
+    series: List[LiftSeriesOut]
+
+# --- Training volume ---
+class VolumeRow(BaseModel):
+    period: date                          # 期間の初日（week は月曜、month は1日）
+    exercise_id: Optional[int] = None     # by=exercise のとき
+    exercise_name: Optional[str] = None
+    muscle_group: Optional[str] = None    # 未設定の種目は None
+    set_count: int
+    reps: int
+    tonnage: float                        # kg×回
+
+class VolumeOut(BaseModel):
+    granularity: str   # day / week / month
+    by: str            # exercise / muscle_group
+    rows: List[VolumeRow]
+
+# --- Team leaderboard ---
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: str
+    value: float
+
+class LeaderboardOut(BaseModel):
+    team_id: int
+    metric: str
+    exercise_id: Optional[int] = None
+    members: int   # チームの人数
+    ranked: int    # 値があって順位が付いた人数
+    entries: List[LeaderboardEntry]
+    me: Optional[LeaderboardEntry] = None
+
+# --- Friend feed ---
+class FeedItemOut(BaseModel):
+    kind: str   # workout / record
+    id: int
+    user_id: int
+    username: str
+    at: datetime
+    workout: Optional[WorkoutSessionOut] = None
+    record: Optional[RecordOut] = None
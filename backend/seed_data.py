@@ -0,0 +1,195 @@
+# backend/seed_data.py
+# ベンチマーク用の合成データを、使い捨ての SQLite ファイルへ直接書き込む
+# 同じ --seed・同じ引数なら毎回同じデータになる（日付も --end 基準で、実行日に依存しない）
+#
+#   cd backend
+#   python seed_data.py /tmp/bench.db --users 100 --years 1
+#   python benchmark.py /tmp/bench.db
+#
+# API を通さず Core の executemany で書き、集計テーブルは最後に rollups の再構築で作る
+# パスワードは全員 "password"
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+PASSWORD = "password"
+
+# (名前, 部位)。部位未設定の種目も混ぜる
+EXERCISES = [
+    ("Bench Press", "chest"), ("Squat", "legs"), ("Deadlift", "back"), ("Overhead Press", "shoulders"),
+    ("Barbell Row", "back"), ("Pull Up", "back"), ("Dip", None), ("Incline Bench Press", "chest"),
+    ("Front Squat", "legs"), ("Romanian Deadlift", "legs"), ("Lat Pulldown", "back"), ("Leg Press", "legs"),
+    ("ベンチプレス（ダンベル）", "chest"), ("レッグカール", None), ("サイドレイズ", "shoulders"),
+]
+
+# 1チームの人数の目安
+TEAM_SIZE = 20
+
+
+def _scratch(path: str, force: bool) -> None:
+    files = [path, path + "-wal", path + "-shm"]
+    if any(os.path.exists(f) for f in files):
+        if not force:
+            sys.exit(f"{path} already exists (use --force to overwrite)")
+        for f in files:
+            if os.path.exists(f):
+                os.remove(f)
+
+
+def seed(args) -> dict:
+    # db は import 時に MUSCLE_DB_PATH を読むので、ここで import する
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+
+    import levels
+    import rollups
+    from auth import get_password_hash
+    from db import init_db, write_engine
+    from models import (
+        Exercise, Friendship, LiftLog, Measurement, Team, TeamMember, User,
+        WorkoutSession, WorkoutSet,
+    )
+    from presets import PRESET_TARGETS
+
+    init_db()
+    rng = random.Random(args.seed)
+    end = args.end
+    start = end - timedelta(days=365 * args.years)
+    n_users = args.users
+    counts = {"users": n_users}
+
+    def write(conn, model, rows):
+        if rows:
+            conn.execute(insert(model.__table__), rows)
+
+    hashed = get_password_hash(PASSWORD)
+    presets = [pid for pid, p in PRESET_TARGETS.items() if p["target_bmi"] is not None]
+
+    with write_engine.begin() as conn:
+        write(conn, User, [
+            {"id": uid, "email": f"user{uid}@example.com", "username": f"user{uid}", "hashed_password": hashed}
+            for uid in range(1, n_users + 1)
+        ])
+        write(conn, Exercise, [
+            {"id": i, "name": name, "created_by": 1, "muscle_group": group}
+            for i, (name, group) in enumerate(EXERCISES, 1)
+        ])
+
+        # チーム: ユーザーを順に TEAM_SIZE 人ずつ割り当て、先頭の人がオーナー
+        n_teams = max(1, n_users // TEAM_SIZE)
+        teams, members = [], []
+        for uid in range(1, n_users + 1):
+            team_id = (uid - 1) % n_teams + 1
+            if team_id > len(teams):
+                teams.append({"id": team_id, "name": f"Team {team_id}", "owner_user_id": uid})
+            members.append({
+                "team_id": team_id, "user_id": uid,
+                "role": "owner" if teams[team_id - 1]["owner_user_id"] == uid else "member",
+            })
+        write(conn, Team, teams)
+        write(conn, TeamMember, members)
+        counts["teams"] = len(teams)
+
+        # フレンド: 1人あたり約 --friends 人（ペアは user_id < friend_user_id に正規化）
+        pairs = set()
+        for uid in range(1, n_users + 1):
+            for other in rng.sample(range(1, n_users + 1), min(args.friends, n_users)):
+                if other != uid:
+                    pairs.add((min(uid, other), max(uid, other)))
+        write(conn, Friendship, [{"user_id": a, "friend_user_id": b} for a, b in sorted(pairs)])
+        counts["friendships"] = len(pairs)
+
+    # ワークアウト・体型記録は1ユーザーずつ書く（メモリに載るのは1人分だけ）
+    session_id = 0
+    counts.update(workout_sessions=0, workout_sets=0, measurements=0)
+    days = (end - start).days
+    for uid in range(1, n_users + 1):
+        strength = rng.uniform(0.6, 1.6)
+        program = rng.sample(range(1, len(EXERCISES) + 1), 6)
+        height = rng.uniform(155, 190)
+        weight = rng.uniform(55, 95)
+        fat = rng.uniform(10, 28)
+        preset_id = rng.choice(presets)
+
+        sessions, sets, lifts, records = [], [], [], []
+        for offset in range(days + 1):
+            day = start + timedelta(days=offset)
+            progress = 1 + 0.3 * offset / max(days, 1)
+
+            if offset % 7 == 0:
+                weight += rng.uniform(-0.6, 0.5)
+                fat = min(40.0, max(5.0, fat + rng.uniform(-0.4, 0.3)))
+                records.append({
+                    "user_id": uid, "preset_id": preset_id, "height": round(height, 1),
+                    "weight": round(weight, 1), "fat": round(fat, 1), "performed_at": day,
+                    "preset_version": levels.PRESET_VERSIONS[preset_id],
+                })
+
+            if rng.random() >= args.sessions_per_week / 7:
+                continue
+            session_id += 1
+            sessions.append({
+                "id": session_id, "user_id": uid, "note": "",
+                "performed_at": datetime.combine(day, datetime.min.time()) + timedelta(hours=rng.randint(6, 21)),
+            })
+            for exercise_id in rng.sample(program, rng.randint(3, 5)):
+                base = 20 + exercise_id * 4
+                for set_no in range(1, rng.randint(3, 5) + 1):
+                    row = {
+                        "exercise_id": exercise_id,
+                        "weight_kg": round(base * strength * progress * rng.uniform(0.85, 1.0) / 2.5) * 2.5,
+                        "reps": rng.randint(3, 12),
+                    }
+                    sets.append({"session_id": session_id, "set_no": set_no, **row})
+                    lifts.append({"user_id": uid, "performed_at": day, **row})
+
+        scored = levels.score_levels(
+            [r["height"] for r in records], [r["weight"] for r in records],
+            [r["fat"] for r in records], [r["preset_id"] for r in records],
+        )
+        for r, lv, b in zip(records, scored["level"], scored["bmi"]):
+            r.update(level=lv, bmi=b)
+
+        with write_engine.begin() as conn:
+            write(conn, WorkoutSession, sessions)
+            write(conn, WorkoutSet, sets)
+            write(conn, LiftLog, lifts)
+            write(conn, Measurement, records)
+        counts["workout_sessions"] += len(sessions)
+        counts["workout_sets"] += len(sets)
+        counts["measurements"] += len(records)
+
+    # 集計テーブル（日別ベスト・カレンダー・fan-out 時のフィード）
+    with Session(write_engine) as db:
+        for table, rebuild in rollups.REBUILDERS:
+            counts[table] = rebuild(db)
+            db.commit()
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成データを作る")
+    parser.add_argument("db", help="書き込み先の SQLite ファイル（使い捨て）")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--friends", type=int, default=10, help="1人あたりのフレンド数の目安")
+    parser.add_argument("--sessions-per-week", type=float, default=3.0)
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2025, 12, 31), help="最終日")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--force", action="store_true", help="既存のファイルを消して作り直す")
+    args = parser.parse_args()
+
+    _scratch(args.db, args.force)
+    os.environ["MUSCLE_DB_PATH"] = os.path.abspath(args.db)
+
+    started = time.perf_counter()
+    for table, n in seed(args).items():
+        print(f"{table}: {n}")
+    print(f"done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
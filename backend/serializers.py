@@ -0,0 +1,283 @@
+# backend/serializers.py
+# 大きな一覧レスポンスの高速パス
+# ORM オブジェクト → response_model の検証 → JSON、をやめて、
+# 必要な列だけをタプルで読み、スキーマから作った専用関数で直接 JSON バイト列にする
+# 出力は FastAPI（pydantic の dump_json）と1バイトも違わないこと（benchmark.py --serializers で確認）
+#
+# グラフ用の時系列の軽い形式（format=columnar / binary）もここ
+import json
+import math
+import struct
+from collections import defaultdict
+from datetime import date, datetime
+from json.encoder import encode_basestring
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union, get_args, get_origin
+
+from fastapi import HTTPException, Response
+from sqlalchemy import select
+
+import pagination
+from models import Measurement, WorkoutSession, WorkoutSet
+from schemas import LiftSeriesListOut, LiftSeriesOut, RecordOut, SeriesPoint, WorkoutSessionOut, WorkoutSetOut
+from series import epoch_day
+
+MEDIA_TYPE = "application/json"
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+
+# ==== 値ごとのエンコーダ（pydantic の JSON 出力に合わせる）====
+
+def _int(v: int) -> str:
+    return str(v)
+
+
+def _float(v: float) -> str:
+    """
+    pydantic と同じ表記にする（repr とは小さい数の指数表記だけ違う）
+      1e-05 → 0.00001（指数 -5 までは小数で書く）、1.5e-07 → 1.5e-7（指数を0埋めしない）
+      NaN / Infinity → null
+    """
+    if not math.isfinite(v):
+        return "null"
+    r = repr(float(v))
+    if "e-" not in r:
+        return r
+    mantissa, exp = r.split("e-")
+    if exp == "05":
+        sign = "-" if mantissa[0] == "-" else ""
+        return f"{sign}0.0000{mantissa.lstrip('-').replace('.', '')}"
+    return f"{mantissa}e-{int(exp)}"
+
+
+def _iso(v: Union[date, datetime]) -> str:
+    return f'"{v.isoformat()}"'
+
+
+_ENCODERS: Dict[type, Callable] = {
+    int: _int,
+    float: _float,
+    str: encode_basestring,   # ensure_ascii=False 相当（C 実装）
+    date: _iso,
+    datetime: _iso,
+}
+
+
+def _optional_inner(annotation):
+    """Optional[X] なら X、それ以外は None"""
+    if get_origin(annotation) is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        if len(args) == 1 and len(get_args(annotation)) == 2:
+            return args[0]
+    return None
+
+
+def compile_encoder(model: type, raw: Sequence[str] = ()) -> Callable[[Sequence], str]:
+    """
+    model のフィールド順に並んだタプルを JSON オブジェクトにする関数を作る
+    （フィールドごとの分岐はここで済ませ、1行分の文字列連結だけの関数にして exec する）
+    raw: エンコード済みの JSON 文字列をそのまま埋め込むフィールド（入れ子のリストなど）
+    """
+    namespace: Dict[str, Callable] = {}
+    pieces = []
+    for i, (name, field) in enumerate(model.model_fields.items()):
+        prefix = ("{" if i == 0 else ",") + json.dumps(name) + ":"
+        if name in raw:
+            expr = f"r[{i}]"
+        else:
+            inner = _optional_inner(field.annotation)
+            base = inner or field.annotation
+            if base not in _ENCODERS:
+                raise TypeError(f"{model.__name__}.{name}: unsupported type {field.annotation!r}")
+            fn = f"_{base.__name__}"
+            namespace[fn] = _ENCODERS[base]
+            expr = f"{fn}(r[{i}])"
+            if inner is not None:
+                expr = f'("null" if r[{i}] is None else {expr})'
+        pieces.append(f"{prefix!r} + {expr}")
+    source = f"def encode(r):\n    return {' + '.join(pieces)} + '}}'\n"
+    exec(compile(source, f"<encoder {model.__name__}>", "exec"), namespace)
+    return namespace["encode"]
+
+
+def encode_list(encode: Callable, rows: Iterable) -> str:
+    return "[" + ",".join(map(encode, rows)) + "]"
+
+
+def columns(model: type, table, skip: Sequence[str] = ()) -> list:
+    """response_model のフィールド順に、ORM モデルの同名の列を並べる"""
+    return [getattr(table, name) for name in model.model_fields if name not in skip]
+
+
+def json_response(body: str, response: Response) -> Response:
+    """
+    エンコード済みの本体を返す
+    Response を直接返すと、引数の response に付けたヘッダー（ETag・X-Next-Cursor）は
+    FastAPI が移してくれないので、ここで写す
+    """
+    return Response(content=body.encode(), media_type=MEDIA_TYPE, headers=dict(response.headers))
+
+
+# ==== /records ====
+_record = compile_encoder(RecordOut)
+RECORD_COLUMNS = columns(RecordOut, Measurement)
+
+
+def records_page_stmt(user_id: int, cursor: Optional[str], limit: Optional[int]):
+    """古い順に1ページ（+1件）。戻り値: (文, ページサイズ)"""
+    return pagination.keyset_statement(
+        select(*RECORD_COLUMNS).where(Measurement.user_id == user_id),
+        Measurement.performed_at, Measurement.id,
+        cursor, limit, date.fromisoformat,
+        descending=False,
+    )
+
+
+def encode_records_page(rows: list, limit: int) -> Tuple[str, Optional[str]]:
+    rows, next_cursor = pagination.keyset_result(rows, limit, Measurement.performed_at, Measurement.id)
+    return encode_list(_record, rows), next_cursor
+
+
+# ==== /workouts, /users/{id}/workouts ====
+_set = compile_encoder(WorkoutSetOut)
+_session = compile_encoder(WorkoutSessionOut, raw=("sets",))
+SESSION_COLUMNS = columns(WorkoutSessionOut, WorkoutSession, skip=("sets",))
+SET_COLUMNS = columns(WorkoutSetOut, WorkoutSet)
+
+
+def workouts_page_stmt(user_id: int, cursor: Optional[str], limit: Optional[int]):
+    """新しい順に1ページ（+1件）のセッション。戻り値: (文, ページサイズ)"""
+    return pagination.keyset_statement(
+        select(*SESSION_COLUMNS).where(WorkoutSession.user_id == user_id),
+        WorkoutSession.performed_at, WorkoutSession.id,
+        cursor, limit, datetime.fromisoformat,
+    )
+
+
+def sets_stmt(session_ids: List[int]):
+    """ページ内のセッションのセットを1クエリで（並びは selectinload と同じ挿入順）"""
+    return (
+        select(WorkoutSet.session_id, *SET_COLUMNS)
+        .where(WorkoutSet.session_id.in_(session_ids))
+        .order_by(WorkoutSet.session_id, WorkoutSet.id)
+    )
+
+
+def page_session_ids(rows: list, limit: int) -> List[int]:
+    return [row.id for row in rows[:limit]]
+
+
+def encode_workouts_page(rows: list, limit: int, set_rows: Iterable) -> Tuple[str, Optional[str]]:
+    """rows: workouts_page_stmt の結果、set_rows: sets_stmt の結果"""
+    rows, next_cursor = pagination.keyset_result(rows, limit, WorkoutSession.performed_at, WorkoutSession.id)
+    sets = defaultdict(list)
+    for row in set_rows:
+        sets[row[0]].append(_set(row[1:]))
+    body = "[" + ",".join(
+        _session((*row, "[" + ",".join(sets.get(row.id, ())) + "]")) for row in rows
+    ) + "]"
+    return body, next_cursor
+
+
+# ==== 同期ルート用 ====
+
+def records_page(db, user_id: int, cursor: Optional[str], limit: Optional[int]) -> Tuple[str, Optional[str]]:
+    stmt, limit = records_page_stmt(user_id, cursor, limit)
+    return encode_records_page(db.execute(stmt).all(), limit)
+
+
+def workouts_page(db, user_id: int, cursor: Optional[str], limit: Optional[int]) -> Tuple[str, Optional[str]]:
+    stmt, limit = workouts_page_stmt(user_id, cursor, limit)
+    rows = db.execute(stmt).all()
+    ids = page_session_ids(rows, limit)
+    set_rows = db.execute(sets_stmt(ids)) if ids else ()
+    return encode_workouts_page(rows, limit, set_rows)
+
+
+# ==== グラフ用の時系列（/lifts/series, /teams/{id}/series）====
+# format=json     従来どおり（点ごとに {"t": ISO 文字列, "v": 値}）
+# format=columnar t[]（1970-01-01 からの日数）と v[] の平行配列の JSON
+# format=binary   columnar と同じ中身をリトルエンディアンで詰めたもの:
+#   uint32      メタ情報 JSON のバイト数 M
+#   M バイト     メタ情報 JSON（UTF-8。columnar から t / v を除き、系列ごとの点数 n を足したもの）
+#   0〜3 バイト  4 バイト境界までの詰め物（JS の Int32Array / Float32Array をそのまま被せられる）
+#   int32 × N   全系列の t を系列順に連結
+#   float32 × N 全系列の v を系列順に連結（値なしは NaN）
+SERIES_FORMATS = ("json", "columnar", "binary")
+
+
+def check_series_format(fmt: str) -> None:
+    if fmt not in SERIES_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be json, columnar or binary")
+
+
+def _compact_json(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def pack_series(meta: dict, t: List[int], v: List[Optional[float]]) -> bytes:
+    meta_bytes = _compact_json(meta)
+    n = len(t)
+    return b"".join((
+        struct.pack("<I", len(meta_bytes)),
+        meta_bytes,
+        b"\0" * (-(4 + len(meta_bytes)) % 4),
+        struct.pack(f"<{n}i", *t),
+        struct.pack(f"<{n}f", *(math.nan if x is None else x for x in v)),
+    ))
+
+
+def _series_response(content: bytes, media_type: str, response: Response) -> Response:
+    return Response(content=content, media_type=media_type, headers=dict(response.headers))
+
+
+def lift_series_response(
+    fmt: str, meta: dict, t: List[int], v: List[float], response: Response
+) -> Response:
+    """meta: exercise_id / exercise_name。columnar は {..., "t": [...], "v": [...]}"""
+    if fmt == "columnar":
+        return _series_response(_compact_json({**meta, "t": t, "v": v}), MEDIA_TYPE, response)
+    return _series_response(pack_series({**meta, "n": len(t)}, t, v), BINARY_MEDIA_TYPE, response)
+
+
+def grouped_series_response(fmt: str, meta: dict, series: List[dict], response: Response) -> Response:
+    """
+    複数の系列をまとめて返す（チーム: TeamSeriesBuilder(columnar=True).series、複数種目の 1RM）
+    columnar は {..., "series": [{"user_id", "username", "t": [...], "v": [...]}, ...]}
+    binary のメタ情報は系列ごとに t / v を n（点数）に置き換えたもの
+    """
+    if fmt == "columnar":
+        return _series_response(_compact_json({**meta, "series": series}), MEDIA_TYPE, response)
+    heads = [
+        {**{k: x for k, x in s.items() if k not in ("t", "v")}, "n": len(s["t"])} for s in series
+    ]
+    t = [x for s in series for x in s["t"]]
+    v = [x for s in series for x in s["v"]]
+    return _series_response(pack_series({**meta, "series": heads}, t, v), BINARY_MEDIA_TYPE, response)
+
+
+def lift_series_many_response(
+    fmt: str, grouped: Dict[int, list], names: Dict[int, str], response: Response
+):
+    """
+    /lifts/series?exercise_ids= の結果
+    grouped: series.group_lift_series の戻り値、names: exercise_id → 種目名
+    json は LiftSeriesListOut を返す（response_model でそのまま出る）
+    """
+    if fmt == "json":
+        return LiftSeriesListOut(series=[
+            LiftSeriesOut(
+                exercise_id=ex_id,
+                exercise_name=names[ex_id],
+                series=[SeriesPoint(t=day, v=round(val, 1)) for day, val in points],
+            )
+            for ex_id, points in grouped.items()
+        ])
+    return grouped_series_response(fmt, {}, [
+        {
+            "exercise_id": ex_id,
+            "exercise_name": names[ex_id],
+            "t": [epoch_day(day) for day, _ in points],
+            "v": [round(val, 1) for _, val in points],
+        }
+        for ex_id, points in grouped.items()
+    ], response)
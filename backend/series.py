@@ -0,0 +1,189 @@
+# backend/series.py
+# グラフ用の時系列を組み立てる処理（チーム比較など）
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, select
+from sqlalchemy.orm import Session
+
+from models import Exercise, LiftDailyBest, Measurement, Team, TeamMember, User
+
+# metric の安全チェック用（SQLインジェクション防止のためホワイトリストで持つ）
+TEAM_METRICS = {
+    "level": Measurement.level,
+    "weight": Measurement.weight,
+    "fat": Measurement.fat,
+}
+
+# 大きいチームでも一度に全行をメモリに載せないための取得単位
+STREAM_CHUNK = 500
+
+# /lifts/series?exercise_ids= で一度に取れる種目数
+MAX_SERIES_EXERCISES = 50
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def epoch_day(t) -> int:
+    """date / datetime → 1970-01-01 からの日数（format=columnar / binary の t）"""
+    return t.toordinal() - _EPOCH_ORDINAL
+
+
+# クエリは select() で組み立てて、同期セッション・非同期セッションの両方から使う
+
+def team_access_stmt(team_id: int, user_id: int):
+    """チームの存在と「自分がメンバーか」を1クエリで確認する文"""
+    return (
+        select(Team.id, TeamMember.id)
+        .outerjoin(
+            TeamMember,
+            and_(TeamMember.team_id == Team.id, TeamMember.user_id == user_id),
+        )
+        .where(Team.id == team_id)
+    )
+
+
+def team_access_result(row) -> Tuple[bool, bool]:
+    """戻り値: (チームが存在するか, メンバーか)"""
+    if row is None:
+        return False, False
+    return True, row[1] is not None
+
+
+def team_access(db: Session, team_id: int, user_id: int) -> Tuple[bool, bool]:
+    return team_access_result(db.execute(team_access_stmt(team_id, user_id)).first())
+
+
+def _window(date_from: Optional[date], date_to: Optional[date]) -> list:
+    # to は「その日を含む」ので翌日 0:00 未満で切る
+    cond = []
+    if date_from is not None:
+        cond.append(Measurement.created_at >= datetime.combine(date_from, time.min))
+    if date_to is not None:
+        cond.append(Measurement.created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+    return cond
+
+
+def team_series_stmt(
+    team_id: int,
+    metric: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    """
+    チーム全員の時系列を1本で取る文（user_id 順 → 時刻順）
+    記録が無いメンバーも1行出る（LEFT JOIN）
+    並びは team_members の (team_id, user_id) 索引と ix_measurements_user_created の順そのもの
+    （User.id で並べるとソートが入り、measurements 側の索引の選び方も DB ごとに揺れる）
+    """
+    col = TEAM_METRICS[metric]
+    return (
+        select(User.id, User.username, Measurement.created_at, col)
+        .join(TeamMember, TeamMember.user_id == User.id)
+        .outerjoin(Measurement, and_(Measurement.user_id == User.id, *_window(date_from, date_to)))
+        .where(TeamMember.team_id == team_id)
+        .order_by(TeamMember.user_id.asc(), Measurement.created_at.asc(), Measurement.id.asc())
+    )
+
+
+class TeamSeriesBuilder:
+    """
+    user_id 順に流れてくる行をユーザーごとのバケツに振り分ける
+    columnar=True なら points の代わりに t（epoch-day）/ v の平行配列にする
+    """
+
+    def __init__(self, columnar: bool = False):
+        self.series = []
+        self.columnar = columnar
+        self._bucket = None
+
+    def add(self, row) -> None:
+        uid, uname, dt, val = row
+        if self._bucket is None or self._bucket["user_id"] != uid:
+            self._bucket = {"user_id": uid, "username": uname}
+            if self.columnar:
+                self._bucket.update(t=[], v=[])
+            else:
+                self._bucket["points"] = []
+            self.series.append(self._bucket)
+        if dt is None:
+            return
+        v = float(val) if val is not None else None
+        if self.columnar:
+            self._bucket["t"].append(epoch_day(dt))
+            self._bucket["v"].append(v)
+        else:
+            self._bucket["points"].append({"t": dt.isoformat(), "v": v})
+
+
+def team_series(
+    db: Session,
+    team_id: int,
+    metric: str,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    columnar: bool = False,
+) -> list:
+    """
+    チーム全員の時系列を1本のクエリで取得し、ユーザーごとのバケツに振り分ける
+    """
+    stmt = team_series_stmt(team_id, metric, date_from, date_to)
+    builder = TeamSeriesBuilder(columnar)
+    for row in db.execute(stmt.execution_options(yield_per=STREAM_CHUNK)):
+        builder.add(row)
+    return builder.series
+
+
+def lift_series_stmt(user_id: int, exercise_id: int):
+    """日別ベスト1RM（書き込み時に集計済み）を日付順に読む文"""
+    return (
+        select(LiftDailyBest.day, LiftDailyBest.best_1rm)
+        .where(
+            LiftDailyBest.user_id == user_id,
+            LiftDailyBest.exercise_id == exercise_id,
+        )
+        .order_by(LiftDailyBest.day.asc())
+    )
+
+
+def parse_exercise_ids(raw: str) -> List[int]:
+    """"1,2,3" → [1, 2, 3]（重複は除き、並びは指定順のまま）"""
+    try:
+        ids = [int(x) for x in raw.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="exercise_ids must be comma-separated integers")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="exercise_ids is empty")
+    if len(ids) > MAX_SERIES_EXERCISES:
+        raise HTTPException(status_code=400, detail=f"Too many exercise_ids (max {MAX_SERIES_EXERCISES})")
+    return ids
+
+
+def exercise_names_stmt(exercise_ids: List[int]):
+    return select(Exercise.id, Exercise.name).where(Exercise.id.in_(exercise_ids))
+
+
+def lift_series_many_stmt(user_id: int, exercise_ids: List[int]):
+    """
+    複数種目の日別ベスト1RMを1本で読む文（種目順 → 日付順）
+    uq_lift_daily_best の (user_id, exercise_id) の範囲を種目ごとに引くだけで、ソートも要らない
+    """
+    return (
+        select(LiftDailyBest.exercise_id, LiftDailyBest.day, LiftDailyBest.best_1rm)
+        .where(
+            LiftDailyBest.user_id == user_id,
+            LiftDailyBest.exercise_id.in_(exercise_ids),
+        )
+        .order_by(LiftDailyBest.exercise_id.asc(), LiftDailyBest.day.asc())
+    )
+
+
+def group_lift_series(rows, exercise_ids: List[int]) -> Dict[int, list]:
+    """lift_series_many_stmt の行 → {exercise_id: [(day, 1RM), ...]}（記録の無い種目は空、指定順）"""
+    grouped = {ex_id: [] for ex_id in exercise_ids}
+    for ex_id, points in groupby(rows, key=lambda row: row[0]):
+        grouped[ex_id] = [(day, val) for _, day, val in points]
+    return grouped
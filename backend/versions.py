@@ -0,0 +1,118 @@
+# backend/versions.py
+# データのバージョン番号（ユーザー・チーム・種目カタログごと）と、それを使った ETag
+# 書き込みと同じトランザクションで番号を上げておき、一覧系 GET は番号を1行読むだけで
+# 「前回から変わっていない」（304 Not Modified）を返せるようにする
+from typing import Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import and_, literal, or_, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import DataVersion, TeamMember
+
+# scope: "user"（key=user_id）/ "team"（key=team_id）/ "catalog"（key=0, 種目一覧）
+# (scope, 0) はそのスコープ全体の版（一括処理で上げる）。user / team の ETag にも必ず含める
+USER = "user"
+TEAM = "team"
+CATALOG = "catalog"
+CATALOG_ALL = (CATALOG, 0)
+
+Key = Tuple[str, int]
+
+
+def _upsert_bump(stmt):
+    return stmt.on_conflict_do_update(
+        index_elements=["scope", "ref_id"],
+        set_={"version": DataVersion.version + 1},
+    )
+
+
+def bump(db: Session, *keys: Key) -> None:
+    """keys のバージョンを1つ上げる（commit は呼び出し側）"""
+    db.execute(_upsert_bump(sqlite_insert(DataVersion).values([
+        {"scope": scope, "ref_id": ref_id, "version": 1} for scope, ref_id in keys
+    ])))
+
+
+def bump_user(db: Session, user_id: int, with_teams: bool = False) -> None:
+    """
+    ユーザーのデータが変わった
+    with_teams: チーム画面に出るデータ（体型記録）なら、所属チーム全部も上げる
+    """
+    bump(db, (USER, user_id))
+    if with_teams:
+        db.execute(_upsert_bump(
+            sqlite_insert(DataVersion).from_select(
+                ["scope", "ref_id", "version"],
+                select(literal(TEAM), TeamMember.team_id, literal(1))
+                .where(TeamMember.user_id == user_id),
+            )
+        ))
+
+
+def bump_scope(db: Session, *scopes: str) -> None:
+    """
+    一括処理で全員分が変わったとき（recompute / backfill など）
+    スコープ全体の版 (scope, 0) を上げる。個別の行がまだ無いユーザー・チームの ETag も変わる
+    """
+    bump(db, *((scope, 0) for scope in scopes))
+
+
+def _with_scopes(keys: Iterable[Key]) -> list:
+    """keys と、その各スコープ全体の版 (scope, 0)"""
+    keys = list(keys)
+    return keys + [(scope, 0) for scope in dict.fromkeys(scope for scope, _ in keys) if (scope, 0) not in keys]
+
+
+def versions_stmt(keys: Iterable[Key]):
+    return select(DataVersion.scope, DataVersion.ref_id, DataVersion.version).where(
+        or_(*(
+            and_(DataVersion.scope == scope, DataVersion.ref_id == ref_id)
+            for scope, ref_id in _with_scopes(keys)
+        ))
+    )
+
+
+def current(db: Session, key: Key) -> int:
+    """1キー分の今のバージョン（行が無ければ 0）"""
+    for scope, ref_id, version in db.execute(versions_stmt([key])):
+        if (scope, ref_id) == key:
+            return version
+    return 0
+
+
+def etag_from_rows(keys: Iterable[Key], rows) -> str:
+    """行が無いキーはバージョン 0（まだ一度も書かれていない）"""
+    found = {(scope, ref_id): version for scope, ref_id, version in rows}
+    # ユーザーごとに別の値になるよう、キーそのものも含める（共有端末で他人の 304 を返さない）
+    parts = []
+    for scope, ref_id in keys:
+        part = f"{scope[0]}{ref_id}.{found.get((scope, ref_id), 0)}"
+        if ref_id != 0:
+            part += f".{found.get((scope, 0), 0)}"
+        parts.append(part)
+    return 'W/"' + "-".join(parts) + '"'
+
+
+def etag(db: Session, *keys: Key) -> str:
+    return etag_from_rows(keys, db.execute(versions_stmt(keys)))
+
+
+def not_modified(request: Request, response: Response, tag: str) -> Optional[Response]:
+    """
+    ETag をレスポンスに付け、If-None-Match が一致すれば 304 のレスポンスを返す
+    （一致しなければ None。呼び出し側はそのまま本体を作る）
+    """
+    response.headers["ETag"] = tag
+    # 毎回サーバーに確認させる（変わっていなければ 304 で本体は送らない）
+    response.headers["Cache-Control"] = "private, no-cache"
+
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    # 弱い比較（W/ の有無は無視）
+    candidates = {t.strip().removeprefix("W/") for t in header.split(",")}
+    if "*" in candidates or tag.removeprefix("W/") in candidates:
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
@@ -1,6 +1,6 @@
 // /static/app.js
-let cachedWorkoutDates = null;
-let cachedWorkoutDatesPromise = null;
+// カレンダー：月ごとのトレーニング日キャッシュ（"YYYY-MM" -> Promise<Set<"YYYY-MM-DD">>）
+const cachedWorkoutDates = new Map();
 
 document.addEventListener("DOMContentLoaded", () => {
   const token = localStorage.getItem("access_token");
@@ -91,18 +91,18 @@ document.addEventListener("DOMContentLoaded", () => {
     return `${y}-${mm}-${dd}`;
   }
 
-  async function loadWorkoutDates() {
-    if (cachedWorkoutDates) return cachedWorkoutDates;
-    if (cachedWorkoutDatesPromise) return cachedWorkoutDatesPromise;
+  async function loadWorkoutDates(year, month) {
+    const key = `${year}-${month}`;
+    if (cachedWorkoutDates.has(key)) return cachedWorkoutDates.get(key);
 
-    cachedWorkoutDatesPromise = (async () => {
-      const workouts = await api("/workouts");
-      const set = new Set((workouts || []).map(w => String(w.performed_at).slice(0, 10)));
-      cachedWorkoutDates = set;
-      return set;
+    const promise = (async () => {
+      const data = await api(`/workouts/calendar?year=${year}&month=${month}`);
+      return new Set((data?.days || []).map(d => ymd(year, month, d)));
     })();
+    cachedWorkoutDates.set(key, promise);
+    promise.catch(() => cachedWorkoutDates.delete(key));
 
-    return cachedWorkoutDatesPromise;
+    return promise;
   }
 
   function buildCalendar(year, month, doneSet) {
@@ -173,7 +173,7 @@ document.addEventListener("DOMContentLoaded", () => {
     if (!calendarEl) return;
 
     calendarEl.textContent = "読み込み中...";
-    const doneSet = await loadWorkoutDates();
+    const doneSet = await loadWorkoutDates(calYear, calMonth);
 
     calendarEl.innerHTML = "";
     const cal = buildCalendar(calYear, calMonth, doneSet);
@@ -182,64 +182,109 @@ document.addEventListener("DOMContentLoaded", () => {
     cal.querySelector("#cal-prev")?.addEventListener("click", () => {
       calMonth--;
       if (calMonth <= 0) { calMonth = 12; calYear--; }
-      cachedWorkoutDates = null;
-      cachedWorkoutDatesPromise = null;
       renderHome();
     });
 
     cal.querySelector("#cal-next")?.addEventListener("click", () => {
       calMonth++;
       if (calMonth >= 13) { calMonth = 1; calYear++; }
-      cachedWorkoutDates = null;
-      cachedWorkoutDatesPromise = null;
       renderHome();
     });
   }
 
   // ===== 履歴 =====
+  // 一覧はページング（次ページのカーソルは X-Next-Cursor ヘッダー）
+  async function apiPage(path, cursor) {
+    const sep = path.includes("?") ? "&" : "?";
+    const url = cursor ? `${path}${sep}cursor=${encodeURIComponent(cursor)}` : path;
+    const res = await fetch(url, {
+      headers: { Authorization: "Bearer " + token },
+    });
+
+    if (res.status === 401) {
+      localStorage.removeItem("access_token");
+      location.href = "/static/login.html";
+      return { items: [], next: null };
+    }
+
+    const text = await res.text().catch(() => "");
+    if (!res.ok) {
+      throw new Error(`${path} ${res.status}\n${text}`);
+    }
+    return {
+      items: text ? JSON.parse(text) : [],
+      next: res.headers.get("X-Next-Cursor"),
+    };
+  }
+
+  function workoutCard(w) {
+    const card = document.createElement("div");
+    card.style.border = "1px solid rgba(255,255,255,.10)";
+    card.style.borderRadius = "14px";
+    card.style.padding = "12px";
+    card.style.marginBottom = "10px";
+    card.style.background = "rgba(255,255,255,.03)";
+
+    const dateText = String(w.performed_at || "").slice(0, 10);
+    const noteText = w.note ? `📝 ${w.note}` : "";
+    const sets = Array.isArray(w.sets) ? w.sets : [];
+
+    const setsHtml = sets.map(s => `
+      <li style="margin:4px 0;">
+        <b>exercise_id=${s.exercise_id}</b>：${s.weight_kg}kg × ${s.reps}回（${s.set_no}）
+      </li>
+    `).join("");
+
+    card.innerHTML = `
+      <div style="display:flex; justify-content:space-between; align-items:center;">
+        <div style="font-weight:800;">${dateText}</div>
+        <div style="opacity:.7; font-size:12px;">id=${w.id}</div>
+      </div>
+      ${noteText ? `<div style="margin-top:6px; opacity:.9;">${noteText}</div>` : ""}
+      <ul style="margin:10px 0 0; padding-left:18px;">
+        ${setsHtml || `<li style="opacity:.7;">セットがありません</li>`}
+      </ul>
+    `;
+    return card;
+  }
+
   async function renderHistory() {
     const box = document.getElementById("history-list");
     if (!box) return;
 
     box.textContent = "読み込み中...";
-    const workouts = await api("/workouts");
-    if (!workouts || workouts.length === 0) {
+    const first = await apiPage("/workouts");
+    if (first.items.length === 0) {
       box.textContent = "まだ workout 記録がありません。";
       return;
     }
 
-    workouts.sort((a, b) => (b.performed_at || "").localeCompare(a.performed_at || ""));
     box.innerHTML = "";
+    const list = document.createElement("div");
+    box.appendChild(list);
+
+    const more = document.createElement("button");
+    more.textContent = "もっと見る";
+    more.style.cssText = "padding:6px 10px; border-radius:10px; background:transparent; color:#e5e7eb; border:1px solid rgba(255,255,255,.15); cursor:pointer;";
+    box.appendChild(more);
+
+    // サーバー側で新しい順に並んでいるので、そのまま後ろに足していく
+    let next = null;
+    function appendPage(page) {
+      page.items.forEach((w) => list.appendChild(workoutCard(w)));
+      next = page.next;
+      more.style.display = next ? "inline-block" : "none";
+    }
 
-    workouts.forEach((w) => {
-      const card = document.createElement("div");
-      card.style.border = "1px solid rgba(255,255,255,.10)";
-      card.style.borderRadius = "14px";
-      card.style.padding = "12px";
-      card.style.marginBottom = "10px";
-      card.style.background = "rgba(255,255,255,.03)";
-
-      const dateText = String(w.performed_at || "").slice(0, 10);
-      const noteText = w.note ? `📝 ${w.note}` : "";
-      const sets = Array.isArray(w.sets) ? w.sets : [];
-
-      const setsHtml = sets.map(s => `
-        <li style="margin:4px 0;">
-          <b>exercise_id=${s.exercise_id}</b>：${s.weight_kg}kg × ${s.reps}回（${s.set_no}）
-        </li>
-      `).join("");
-
-      card.innerHTML = `
-        <div style="display:flex; justify-content:space-between; align-items:center;">
-          <div style="font-weight:800;">${dateText}</div>
-          <div style="opacity:.7; font-size:12px;">id=${w.id}</div>
-        </div>
-        ${noteText ? `<div style="margin-top:6px; opacity:.9;">${noteText}</div>` : ""}
-        <ul style="margin:10px 0 0; padding-left:18px;">
-          ${setsHtml || `<li style="opacity:.7;">セットがありません</li>`}
-        </ul>
-      `;
-      box.appendChild(card);
+    appendPage(first);
+    more.addEventListener("click", async () => {
+      if (!next) return;
+      more.disabled = true;
+      try {
+        appendPage(await apiPage("/workouts", next));
+      } finally {
+        more.disabled = false;
+      }
     });
   }
 
@@ -264,15 +309,27 @@ async function initHistory1RM() {
     select.appendChild(opt);
   });
 
+  // 種目ごとの系列（t は 1970-01-01 からの日数、v は推定1RM の平行配列。format=columnar）
+  // 最初に全種目を1リクエストでまとめて取り、種目の切り替えではリクエストしない
+  const seriesById = new Map();
+  async function loadSeries(ids) {
+    for (let i = 0; i < ids.length; i += 50) {   // サーバー側の上限（MAX_SERIES_EXERCISES）ずつ
+      const chunk = ids.slice(i, i + 50);
+      const data = await api(`/lifts/series?exercise_ids=${chunk.join(",")}&format=columnar`);
+      (data?.series || []).forEach(s => seriesById.set(s.exercise_id, s));
+    }
+  }
+
   async function loadAndDraw(exerciseId) {
-    const data = await api(`/lifts/series?exercise_id=${exerciseId}`);
-    if (!data || !data.series) return;
+    if (!seriesById.has(exerciseId)) await loadSeries([exerciseId]);
+    const data = seriesById.get(exerciseId);
+    if (!data) return;
 
-    const labels = data.series.map(p => {
-      const d = new Date(p.t);
-      return `${d.getMonth()+1}/${d.getDate()}`;
+    const labels = data.t.map(t => {
+      const d = new Date(t * 86400000);
+      return `${d.getUTCMonth()+1}/${d.getUTCDate()}`;
     });
-    const values = data.series.map(p => p.v);
+    const values = data.v;
 
     const ctx = canvas.getContext("2d");
     if (historyChart) historyChart.destroy();
@@ -294,6 +351,7 @@ async function initHistory1RM() {
 
   // 最初の1回
   if (exercises.length > 0) {
+    await loadSeries(exercises.map(ex => ex.id));
     await loadAndDraw(exercises[0].id);
   }
 
@@ -45,14 +45,15 @@ async function loadExercises() {
   msg.textContent = list.length ? "" : "種目がありません。追加してください。";
 }
 
-function drawSeries(exerciseName, series) {
+// t: 1970-01-01 からの日数の配列、values: 推定1RM の配列（format=columnar）
+function drawSeries(exerciseName, t, values) {
   const ctx = document.getElementById("liftChart").getContext("2d");
 
-  const labels = series.map(p => {
-    const d = new Date(p.t);
-    return `${d.getMonth() + 1}/${d.getDate()}`;
+  const labels = t.map(day => {
+    const d = new Date(day * 86400000);
+    return `${d.getUTCMonth() + 1}/${d.getUTCDate()}`;
   });
-  const data = series.map(p => p.v);
+  const data = values;
 
   if (liftChart) liftChart.destroy();
 
@@ -87,11 +88,11 @@ async function loadSeries() {
 
   msg.textContent = "グラフ更新中...";
 
-  const res = await apiFetch(`/lifts/series?exercise_id=${exerciseId}`);
+  const res = await apiFetch(`/lifts/series?exercise_id=${exerciseId}&format=columnar`);
   const data = await res.json();
 
-  drawSeries(data.exercise_name, data.series || []);
-  msg.textContent = (data.series && data.series.length) ? "" : "この種目の記録がまだありません。";
+  drawSeries(data.exercise_name, data.t || [], data.v || []);
+  msg.textContent = (data.t && data.t.length) ? "" : "この種目の記録がまだありません。";
 }
 
 async function addExercise() {
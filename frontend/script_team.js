@@ -19,26 +19,27 @@ function setUserInfo() {
   }
 }
 
-function shortDate(iso) {
-  const d = new Date(iso);
-  const mm = String(d.getMonth() + 1).padStart(2, "0");
-  const dd = String(d.getDate()).padStart(2, "0");
+// t は 1970-01-01 からの日数（format=columnar）
+function shortDate(day) {
+  const d = new Date(day * 86400000);
+  const mm = String(d.getUTCMonth() + 1).padStart(2, "0");
+  const dd = String(d.getUTCDate()).padStart(2, "0");
   return `${mm}/${dd}`;
 }
 
-// 全員の日時をユニーク化して labels を作り、各人の欠損は null にする
+// 全員の日付をユニーク化して labels を作り、各人の欠損は null にする（同じ日に複数あれば最後の値）
 function alignSeries(seriesList) {
   const set = new Set();
-  seriesList.forEach(s => (s.points || []).forEach(p => set.add(p.t)));
+  seriesList.forEach(s => (s.t || []).forEach(t => set.add(t)));
 
-  const labelsISO = Array.from(set).sort((a, b) => new Date(a) - new Date(b));
-  const labels = labelsISO.map(shortDate);
+  const days = Array.from(set).sort((a, b) => a - b);
+  const labels = days.map(shortDate);
 
   const datasets = seriesList.map(s => {
-    const map = new Map((s.points || []).map(p => [p.t, p.v]));
+    const map = new Map((s.t || []).map((t, i) => [t, s.v[i]]));
     return {
       label: s.username,
-      data: labelsISO.map(t => (map.has(t) ? map.get(t) : null)),
+      data: days.map(t => (map.has(t) ? map.get(t) : null)),
       tension: 0.3,
       borderWidth: 2,
       pointRadius: 3,
@@ -207,7 +208,7 @@ async function loadTeamSeries() {
   setMsg("読み込み中...");
 
   try {
-    const res = await fetch(`/teams/${teamIdStr}/series?metric=${metric}`, {
+    const res = await fetch(`/teams/${teamIdStr}/series?metric=${metric}&format=columnar`, {
       headers: { Authorization: "Bearer " + token }
     });
 
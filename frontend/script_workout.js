@@ -236,6 +236,28 @@
     // ---- handlers
     addSetBtn.addEventListener("click", () => addSetLine());
 
+    // 既存の種目名を入力補完（打ち終わるまで少し待ってから /exercises/search）
+    const suggestEl = document.getElementById("ex-suggest");
+    let suggestTimer = null;
+    newExNameEl?.addEventListener("input", () => {
+      clearTimeout(suggestTimer);
+      const q = newExNameEl.value.trim();
+      if (!q || !suggestEl) return;
+      suggestTimer = setTimeout(async () => {
+        try {
+          const hits = await apiJson(`/exercises/search?q=${encodeURIComponent(q)}`);
+          suggestEl.innerHTML = "";
+          (hits || []).forEach(ex => {
+            const opt = document.createElement("option");
+            opt.value = ex.name;
+            suggestEl.appendChild(opt);
+          });
+        } catch (e) {
+          console.warn("exercise search failed", e);
+        }
+      }, 150);
+    });
+
     addExBtn.addEventListener("click", async () => {
       const exName = (newExNameEl?.value || "").trim();
       if (!exName) {
@@ -293,7 +315,7 @@
         sets.push({ exercise_id, set_no: i + 1, weight_kg, reps });
       }
 
-      // 1) workouts を保存
+      // workouts を保存（グラフ用の lifts もサーバー側で同じトランザクションで作られる）
       try {
         const data = await apiJson("/workouts", {
           method: "POST",
@@ -301,34 +323,6 @@
           body: JSON.stringify({ performed_at, note, sets }),
         });
 
-        // 2) 成功したら lifts も保存（グラフ用）
-        console.log("[DEBUG] posting lifts sets=", sets);
-
-        for (const s of sets) {
-          const liftRes = await fetch("/lifts", {
-            method: "POST",
-            headers: {
-              "Content-Type": "application/json",
-              Authorization: "Bearer " + token,
-            },
-            body: JSON.stringify({
-              exercise_id: s.exercise_id,
-              performed_at: performedDate,  // ★ date はこれ
-              weight_kg: s.weight_kg,
-              reps: s.reps,
-            }),
-          });
-
-          const liftText = await liftRes.text().catch(() => "");
-          console.log("[POST /lifts]", liftRes.status, liftText);
-
-          if (!liftRes.ok) {
-            alert("POST /lifts が失敗しました:\n" + liftText);
-            // workouts は保存済みなので、ここでは中断だけ
-            break;
-          }
-        }
-
         if (msgEl) msgEl.textContent = "保存しました！セッションID: " + data.id;
 
         // 入力クリア（weight / reps）